@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+
+"""
+Índice global (entre notícias) de assets já enviados ao destino.
+
+Chaves:
+- URL de origem -> objeto no destino (evita até o download)
+- (tipo, sha256 do conteúdo) -> objeto no destino (evita o upload de bytes
+  idênticos vindos de URLs diferentes)
+
+Persistência opcional em SQLite (pode ser o mesmo arquivo do ledger).
+"""
+
+import sqlite3
+import threading
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS assets (
+    source_url TEXT PRIMARY KEY,
+    kind       TEXT NOT NULL,
+    sha256     TEXT NOT NULL,
+    dest_url   TEXT NOT NULL,
+    width      INTEGER,
+    height     INTEGER
+);
+CREATE INDEX IF NOT EXISTS assets_sha256 ON assets (kind, sha256);
+"""
+
+
+class AssetIndex:
+    def __init__(self, path: str = ""):
+        self._lock = threading.Lock()
+        self._by_url = {}
+        self._by_sha = {}
+        self._conn = None
+        path = (path or "").strip()
+        if path:
+            self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(SCHEMA)
+            for url, kind, sha, dest, w, h in self._conn.execute(
+                "SELECT source_url, kind, sha256, dest_url, width, height FROM assets"
+            ):
+                self._remember(url, kind, sha, dest, w, h)
+
+    def _remember(self, url, kind, sha, dest_url, width, height):
+        self._by_url[url] = {"kind": kind, "sha256": sha, "dest_url": dest_url, "width": width, "height": height}
+        self._by_sha.setdefault((kind, sha), dest_url)
+
+    def by_url(self, source_url: str, kind: str):
+        with self._lock:
+            hit = self._by_url.get(source_url)
+        return hit if hit and hit["kind"] == kind else None
+
+    def by_sha(self, kind: str, sha256: str):
+        with self._lock:
+            return self._by_sha.get((kind, sha256))
+
+    def add(self, source_url: str, kind: str, sha256: str, dest_url: str, width=None, height=None) -> None:
+        with self._lock:
+            self._remember(source_url, kind, sha256, dest_url, width, height)
+            if self._conn is not None:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO assets (source_url, kind, sha256, dest_url, width, height) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (source_url, kind, sha256, dest_url, width, height),
+                )
+
+    def __len__(self) -> int:
+        return len(self._by_url)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
@@ -0,0 +1,383 @@
+# -*- coding: utf-8 -*-
+
+"""
+Servidores locais que imitam a origem (Zope, métodos v2_*) e o destino
+(plone.restapi) para medir os migradores sem tocar produção.
+
+Origem (http://127.0.0.1:<porta>):
+  /portal/v2_getNoticiasLista                 lista com N notícias
+  /portal/<uf>/noticias/nK/v2_getNoticias{Metadados,Corpo,Imagem}
+  <obj>/v2_getDocumentos{Metadados,Corpo}     páginas do bulk1
+  <obj>/v2_getMunicipio{Metadados,Corpo,Contato,Endereco,Localizacao,Imagem}
+  *.png / @@images/* / @@download/image       PNG; *.pdf e demais: binário
+                                              (com ETag/Last-Modified; 304 no GET condicional)
+
+Destino:
+  GET <obj>                       200 com @type se existe, senão 404
+  POST <container>                cria (JSON, inclusive base64); id em uso -> 400
+  PATCH <obj>                     204
+  POST <obj>/@workflow/<tr>       200
+  POST .../@tus-upload|@tus-replace, PATCH/HEAD /tus/<n>   TUS 1.0.0
+  DELETE <obj>                    204
+  GET /__stats, POST /__reset     contadores por método / estado inicial
+
+Latência e taxa de erro (503 com Retry-After) do destino são configuráveis.
+
+Uso avulso:
+  python bench/fake_servers.py --items 50 --latency-ms 20 --error-rate 0.01
+"""
+
+import argparse
+import io
+import json
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import unquote, urlparse
+
+UFS = ("ac", "pgr", "rn", "regiao1")
+
+
+def make_png(w: int = 300, h: int = 200) -> bytes:
+    try:
+        from PIL import Image
+    except ImportError:
+        # PNG 1x1 mínimo
+        return bytes.fromhex(
+            "89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+            "1f15c4890000000d49444154789c6360000002000100e221bc330000000049454e44ae426082"
+        )
+    buf = io.BytesIO()
+    Image.new("RGB", (w, h), (30, 90, 160)).save(buf, "PNG")
+    return buf.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # resposta inteira num write só e sem Nagle: evita as esperas de ~40 ms
+    # do delayed ACK com keep-alive, que dominariam as medições
+    wbufsize = 64 * 1024
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def reply(self, code: int, body=b"", ctype: str = "text/plain", headers: dict = None) -> None:
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(body)))
+        for k, v in (headers or {}).items():
+            self.send_header(k, v)
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+
+    def read_body(self) -> bytes:
+        if self.headers.get("Transfer-Encoding", "").lower() == "chunked":
+            out = bytearray()
+            while True:
+                size = int(self.rfile.readline().strip() or b"0", 16)
+                if size == 0:
+                    self.rfile.readline()
+                    break
+                out += self.rfile.read(size)
+                self.rfile.readline()
+            return bytes(out)
+        return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+
+
+class OriginHandler(_Handler):
+    """Site antigo. Conteúdo determinístico a partir da URL."""
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        srv = self.server
+        with srv.lock:
+            srv.stats[self.command] += 1
+        path = urlparse(self.path).path
+        base = self.base_url()
+
+        if path.endswith("/v2_getNoticiasLista"):
+            return self.reply(200, "\n".join(news_url(base, i) for i in range(srv.items)))
+
+        m = re.match(r"(.*)/(n\d+)/v2_getNoticias(\w+)$", path)
+        if m:
+            parent, nid, what = m.groups()
+            return self.news(base, parent, nid, what)
+
+        if path.endswith("/v2_getDocumentosMetadados"):
+            obj = path.rsplit("/", 2)[-2]
+            return self.reply(200, f"id = {obj}\ntitulo = Documento {obj}\ndescricao = d\nsubject = a#;#b\n")
+        if path.endswith("/v2_getDocumentosCorpo"):
+            return self.reply(200, "<p>" + "Corpo do documento. " * 200 + "</p>", "text/html")
+
+        m = re.match(r".*/v2_getMunicipio(\w+)$", path)
+        if m:
+            what = m.group(1)
+            if what == "Metadados":
+                return self.reply(200, f"titulo = Município {path.rsplit('/', 2)[-2]}\n")
+            if what == "Imagem":
+                return self.reply(200, f"{base}/img/municipio.png\nmunicipio.png\n")
+            return self.reply(200, f"<p>{what} " + "x" * 400 + "</p>", "text/html")
+
+        if path.endswith(".png") or "/@@images/" in path or path.endswith("/@@download/image"):
+            return self.reply(200, srv.png, "image/png")
+        validators = {"ETag": f'"blob-{len(srv.blob)}"', "Last-Modified": "Mon, 01 Jan 2024 00:00:00 GMT"}
+        if self.headers.get("If-None-Match") == validators["ETag"]:
+            return self.reply(304, headers=validators)
+        return self.reply(200, srv.blob, "application/pdf", validators)
+
+    def news(self, base: str, parent: str, nid: str, what: str):
+        srv = self.server
+        if what == "Metadados":
+            caminho = parent.replace("/noticias", "/sala-de-imprensa/noticias")
+            return self.reply(200, (
+                f"id = {nid}\ntitulo = Notícia {nid}\ndescricao = Descrição {nid}\n"
+                f"caminho = {caminho}/{nid}\nlocal = {'True' if int(nid[1:]) % 5 == 0 else 'False'}\n"
+                f"subject = tag1#;#tag2\neffectiveDate = 2024-01-01T10:00:00-03:00\n"
+            ))
+        if what == "Corpo":
+            k = int(nid[1:])
+            shared = k % srv.shared_every if srv.shared_every else k
+            return self.reply(200, (
+                "<!DOCTYPE html><html><body>"
+                + "<p>" + "Texto da notícia com <strong>ênfase</strong>. " * 60 + "</p>"
+                + f'<p><img src="/portal/imagens/foto-{k}.png" width="400" height="300"></p>'
+                + f'<p><img src="/portal/imagens/comum-{shared}.png"></p>'
+                + f'<p><a href="/portal/arquivos/doc-{k}.pdf">documento</a> '
+                + '<a href="https://www.gov.br/externo">externo</a></p>'
+                + "</body></html>"
+            ), "text/html")
+        if what == "Imagem":
+            return self.reply(200, f"{base}/portal/imagens/lead-{nid}.png\nlead-{nid}.png\nlegenda = Legenda\n")
+        return self.reply(404, "nf")
+
+
+class DestHandler(_Handler):
+    """plone.restapi mínimo, em memória."""
+
+    def count(self):
+        with self.server.lock:
+            self.server.stats[self.command] += 1
+
+    def maybe_fail(self) -> bool:
+        srv = self.server
+        if srv.latency:
+            time.sleep(srv.latency)
+        if srv.error_rate and random.random() < srv.error_rate:
+            self.read_body()
+            self.reply(503, json.dumps({"error": "busy"}), "application/json", {"Retry-After": "0"})
+            return True
+        return False
+
+    def obj_path(self) -> str:
+        return unquote(urlparse(self.path).path).rstrip("/")
+
+    def json_reply(self, code: int, obj) -> None:
+        self.reply(code, json.dumps(obj), "application/json")
+
+    def do_GET(self):
+        path = self.obj_path()
+        if path == "/__stats":
+            with self.server.lock:
+                return self.json_reply(200, dict(self.server.stats))
+        self.count()
+        if self.maybe_fail():
+            return
+        obj = self.server.objects.get(path)
+        if path == "" or obj is not None:
+            data = {"@id": self.base_url() + path, "@type": (obj or {}).get("@type", "Plone Site")}
+            if (obj or {}).get("field"):
+                data[obj["field"]] = {"size": obj.get("size", 0)}
+            return self.json_reply(200, data)
+        return self.json_reply(404, {"error": "NotFound"})
+
+    def do_HEAD(self):
+        self.count()
+        up = self.server.tus.get(self.obj_path())
+        if up is None:
+            return self.reply(404)
+        return self.reply(200, headers={"Upload-Offset": str(up["offset"]), "Upload-Length": str(up["length"]),
+                                        "Tus-Resumable": "1.0.0"})
+
+    def do_POST(self):
+        srv = self.server
+        path = self.obj_path()
+        if path == "/__reset":
+            self.read_body()
+            with srv.lock:
+                srv.stats.clear()
+                srv.objects = dict(srv.seed)
+                srv.tus.clear()
+            return self.json_reply(200, {})
+        self.count()
+        if self.maybe_fail():
+            return
+        raw = self.read_body()
+
+        if "/@workflow/" in path:
+            return self.json_reply(200, {"review_state": "published"})
+        if path.endswith("/@tus-upload") or path.endswith("/@tus-replace"):
+            with srv.lock:
+                uid = f"/tus/{len(srv.tus) + 1}"
+                srv.tus[uid] = {"length": int(self.headers.get("Upload-Length") or 0), "offset": 0,
+                                "target": path.rsplit("/", 1)[0]}
+            return self.reply(201, headers={"Location": self.base_url() + uid, "Tus-Resumable": "1.0.0"})
+
+        if path and path not in srv.objects:
+            return self.json_reply(404, {"error": "parent NotFound"})
+        try:
+            data = json.loads(raw or b"{}")
+        except ValueError:
+            return self.json_reply(400, {"message": "invalid JSON"})
+        oid = data.get("id") or re.sub(r"[^a-z0-9]+", "-", (data.get("title") or "obj").lower()).strip("-")
+        child = f"{path}/{oid}"
+        with srv.lock:
+            if child in srv.objects:
+                return self.json_reply(400, {"message": f'The id "{oid}" is already in use'})
+            srv.objects[child] = {"@type": data.get("@type", "Document")}
+            for field in ("file", "image"):
+                if isinstance(data.get(field), dict):
+                    srv.objects[child].update(field=field, size=blob_size(data[field]))
+        return self.json_reply(201, {"@id": self.base_url() + child, "id": oid})
+
+    def do_PATCH(self):
+        srv = self.server
+        path = self.obj_path()
+        self.count()
+        raw = self.read_body()
+        up = srv.tus.get(path)
+        if up is not None:
+            with srv.lock:
+                up["offset"] += len(raw)
+                target = srv.objects.get(up["target"])
+                if target is not None and up["offset"] >= up["length"]:
+                    target["size"] = up["length"]
+            return self.reply(204, headers={"Upload-Offset": str(up["offset"]), "Tus-Resumable": "1.0.0"})
+        if srv.latency:
+            time.sleep(srv.latency)
+        if path not in srv.objects:
+            return self.json_reply(404, {"error": "NotFound"})
+        try:
+            data = json.loads(raw or b"{}")
+        except ValueError:
+            data = {}
+        with srv.lock:
+            for field in ("file", "image"):
+                if isinstance(data.get(field), dict):
+                    srv.objects[path].update(field=field, size=blob_size(data[field]))
+        return self.reply(204)
+
+    def do_DELETE(self):
+        self.count()
+        with self.server.lock:
+            self.server.objects.pop(self.obj_path(), None)
+        return self.reply(204)
+
+
+def blob_size(field: dict) -> int:
+    """Tamanho do blob de um campo file/image enviado em base64 no JSON."""
+    data = field.get("data") or ""
+    return len(data) * 3 // 4 - data[-2:].count("=") if data else 0
+
+
+def news_url(base: str, i: int) -> str:
+    return f"{base}/portal/{UFS[i % len(UFS)]}/noticias/n{i}"
+
+
+class FakeServers:
+    """Sobe origem e destino em threads. Portas 0 = escolhidas pelo SO."""
+
+    DEST_SEED = ("/o-mpf", "/o-mpf/unidades", "/o-mpf/unidades/municipios")
+
+    def __init__(self, items: int = 20, latency_ms: float = 0.0, error_rate: float = 0.0,
+                 origin_port: int = 0, dest_port: int = 0, blob_kb: int = 100, shared_every: int = 10):
+        self.origin = ThreadingHTTPServer(("127.0.0.1", origin_port), OriginHandler)
+        self.origin.daemon_threads = True
+        self.origin.items = items
+        self.origin.png = make_png()
+        self.origin.blob = b"%PDF-1.4\n" + b"x" * (blob_kb * 1024)
+        self.origin.shared_every = shared_every
+        self.origin.lock = threading.Lock()
+        self.origin.stats = Counter()
+
+        self.dest = ThreadingHTTPServer(("127.0.0.1", dest_port), DestHandler)
+        self.dest.daemon_threads = True
+        self.dest.latency = latency_ms / 1000.0
+        self.dest.error_rate = error_rate
+        self.dest.lock = threading.Lock()
+        self.dest.stats = Counter()
+        self.dest.seed = {p: {"@type": "Folder"} for p in self.DEST_SEED}
+        self.dest.objects = dict(self.dest.seed)
+        self.dest.tus = {}
+        self._threads = []
+
+    @property
+    def origin_url(self) -> str:
+        return f"http://127.0.0.1:{self.origin.server_address[1]}"
+
+    @property
+    def dest_url(self) -> str:
+        return f"http://127.0.0.1:{self.dest.server_address[1]}"
+
+    def start(self) -> "FakeServers":
+        for srv in (self.origin, self.dest):
+            t = threading.Thread(target=srv.serve_forever, daemon=True)
+            t.start()
+            self._threads.append(t)
+        return self
+
+    def stop(self) -> None:
+        for srv in (self.origin, self.dest):
+            srv.shutdown()
+            srv.server_close()
+
+    def reset(self) -> None:
+        """Destino volta ao estado inicial; zera os contadores dos dois lados."""
+        with self.dest.lock:
+            self.dest.stats.clear()
+            self.dest.objects = dict(self.dest.seed)
+            self.dest.tus.clear()
+        with self.origin.lock:
+            self.origin.stats.clear()
+
+    def request_counts(self) -> tuple:
+        """(requisições na origem, requisições no destino) desde o último reset()."""
+        with self.origin.lock:
+            orig = sum(self.origin.stats.values())
+        with self.dest.lock:
+            dest = sum(self.dest.stats.values())
+        return orig, dest
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Origem/destino falsos para benchmark dos migradores.")
+    ap.add_argument("--items", type=int, default=20)
+    ap.add_argument("--latency-ms", type=float, default=0.0, help="latência por requisição no destino")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fração de 503 no destino")
+    ap.add_argument("--origin-port", type=int, default=18001)
+    ap.add_argument("--dest-port", type=int, default=18002)
+    args = ap.parse_args()
+
+    fake = FakeServers(args.items, args.latency_ms, args.error_rate, args.origin_port, args.dest_port).start()
+    print(f"origem  {fake.origin_url}  (lista: {fake.origin_url}/portal/v2_getNoticiasLista)")
+    print(f"destino {fake.dest_url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        fake.stop()
+
+
+if __name__ == "__main__":
+    main()
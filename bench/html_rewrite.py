@@ -0,0 +1,215 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark da reescrita de <img>/<a> em corpos de notícias.
+
+Compara o caminho antigo (BeautifulSoup "html.parser" + find_all("img") e
+find_all("a") em duas passadas) com rewrite_asset_refs (passada única com o
+tokenizador do html.parser, reescrevendo só as tags alteradas). Os callbacks
+são determinísticos (não tocam a rede): reescrevem src/href das referências
+migráveis para uma URL derivada da original.
+
+A saída nova não é igual byte a byte à antiga, de propósito: o caminho antigo
+reserializava o documento inteiro com str(soup) (entidades, aspas, <br/>,
+tags fechadas), alterando também texto que nenhuma referência tocava; o novo
+só reescreve as tags <img>/<a> alteradas. Para cada corpo com referências o
+benchmark confere a saída inteira:
+- equivalência: str(BeautifulSoup(novo)) == saída antiga (o mesmo documento
+  depois da normalização do bs4)
+- preservação: fora das tags <img>/<a>, o texto novo é o original byte a byte
+
+Uso:
+  # baixa N corpos reais (v2_getNoticiasCorpo) das URLs de LISTA_URL
+  python bench/html_rewrite.py --fetch 200
+
+  # roda o benchmark sobre bench/corpus/*.html
+  python bench/html_rewrite.py --repeat 5
+
+  # sem corpus: N corpos sintéticos (parágrafos, imagens, PDFs, <iframe>,
+  # <textarea>; um terço sem referências)
+  python bench/html_rewrite.py --synthetic 300
+"""
+
+import argparse
+import hashlib
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+from bs4 import BeautifulSoup
+
+import migrar_noticias_unificado as mig
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "corpus")
+
+
+def fake_dest(url: str) -> str:
+    return "https://destino.example/" + hashlib.sha1(url.encode("utf-8")).hexdigest()[:12]
+
+
+def on_img(img) -> None:
+    src = (img.get("src") or "").strip()
+    if not src or not mig.is_internal_or_local(src):
+        return
+    img["src"] = fake_dest(src) + "/@@images/image/large"
+
+
+def on_a(a) -> None:
+    href = (a.get("href") or "").strip()
+    if not href or not mig.is_internal_or_local(href) or not mig.looks_like_file_link(href):
+        return
+    a["href"] = fake_dest(href)
+
+
+def legacy_rewrite(html: str) -> str:
+    """Caminho anterior: parse completo + duas varreduras + str(soup) sempre."""
+    soup = BeautifulSoup(html or "", "html.parser")
+    for img in soup.find_all("img"):
+        on_img(img)
+    for a in soup.find_all("a"):
+        on_a(a)
+    return str(soup)
+
+
+def new_rewrite(html: str) -> str:
+    return mig.rewrite_asset_refs(html, on_img, on_a)
+
+
+def normalized(html: str) -> str:
+    return str(BeautifulSoup(html or "", "html.parser"))
+
+
+def outside_tags(html: str) -> list:
+    """Trechos do texto entre as tags <img>/<a> (o que a reescrita não pode tocar)."""
+    pieces, pos = [], 0
+    for tag in mig.scan_asset_tags(html):
+        pieces.append(html[pos:tag.start])
+        pos = tag.start + len(tag.raw)
+    pieces.append(html[pos:])
+    return pieces
+
+
+def synthetic_corpus(n: int, seed: int = 1) -> list[str]:
+    rnd = random.Random(seed)
+    para = "<p>Lorem ipsum dolor sit amet, <strong>consectetur</strong> adipiscing elit &amp; sed do eiusmod.</p>\n"
+    bodies = []
+    for i in range(n):
+        parts = [para * rnd.randint(5, 30)]
+        if i % 3:
+            for k in range(rnd.randint(1, 6)):
+                kind = rnd.choice(("img", "pdf", "ext", "edge", "iframe", "textarea"))
+                if kind == "img":
+                    parts.append(f'<p><img src="/portal/imagens/{i}-{k}.jpg" width="640" alt="foto {k}"></p>\n')
+                elif kind == "pdf":
+                    parts.append(f'<p><a href="../arquivos/{i}-{k}.pdf">anexo</a></p>\n')
+                elif kind == "ext":
+                    parts.append(f'<p><a href="https://externo.example/{i}/{k}" target="_blank">link</a></p>\n')
+                elif kind == "edge":
+                    parts.append(f'<p><IMG SRC=/portal/x/{i}-{k}.png ALT="a &amp; b" data-x=1 data-x=2 hidden/>'
+                                 f'<a href=\'/portal/d/{i}-{k}.pdf?a=1&amp;b=2\' download>p&eacute;s&nbsp;</a><br></p>\n')
+                elif kind == "iframe":
+                    parts.append(f'<iframe src="https://video.example/{k}"><img src="/portal/thumb/{i}.png"></iframe>\n')
+                else:
+                    parts.append(f'<textarea><a href="/portal/docs/{i}-{k}.pdf">doc</a></textarea>\n')
+                parts.append(para * rnd.randint(1, 5))
+        bodies.append("".join(parts))
+    return bodies
+
+
+def fetch_corpus(n: int) -> None:
+    os.makedirs(CORPUS_DIR, exist_ok=True)
+    session = requests.Session()
+    urls = mig.fetch_lista(session)[:n]
+    saved = 0
+    for i, url in enumerate(urls, 1):
+        try:
+            corpo = mig.fetch_corpo(session, url)
+        except Exception as e:
+            print(f"[{i}/{len(urls)}] ERRO {url}: {e}")
+            continue
+        name = hashlib.sha1(url.encode("utf-8")).hexdigest()[:16] + ".html"
+        with open(os.path.join(CORPUS_DIR, name), "w", encoding="utf-8") as f:
+            f.write(corpo)
+        saved += 1
+    print(f"{saved} corpos salvos em {CORPUS_DIR}")
+
+
+def load_corpus() -> list[str]:
+    if not os.path.isdir(CORPUS_DIR):
+        return []
+    bodies = []
+    for name in sorted(os.listdir(CORPUS_DIR)):
+        if name.endswith(".html"):
+            with open(os.path.join(CORPUS_DIR, name), "r", encoding="utf-8") as f:
+                bodies.append(f.read())
+    return bodies
+
+
+def timed(fn, bodies, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for b in bodies:
+            fn(b)
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark da reescrita de HTML das notícias.")
+    ap.add_argument("--fetch", type=int, default=0, help="Baixa N corpos reais para bench/corpus e sai.")
+    ap.add_argument("--repeat", type=int, default=3, help="Repetições (vale o melhor tempo).")
+    ap.add_argument("--synthetic", type=int, default=0, help="Usa N corpos sintéticos em vez de bench/corpus.")
+    args = ap.parse_args()
+
+    if args.fetch:
+        fetch_corpus(args.fetch)
+        return
+
+    bodies = synthetic_corpus(args.synthetic) if args.synthetic else load_corpus()
+    if not bodies:
+        print(f"Corpus vazio ({CORPUS_DIR}). Rode antes com --fetch N (ou use --synthetic N).")
+        sys.exit(1)
+
+    # Com referências: mesmo documento que o antigo e texto original fora das
+    # tags; sem nenhuma alteração, o corpo volta intacto (migrate_one nem faz o PATCH).
+    diffs = touched = identical = 0
+    with_refs, without = [], []
+    for b in bodies:
+        out = new_rewrite(b)
+        if out is b:
+            without.append(b)
+            continue
+        with_refs.append(b)
+        old = legacy_rewrite(b)
+        identical += out == old
+        if normalized(out) != old:
+            diffs += 1
+        if outside_tags(out) != outside_tags(b):
+            touched += 1
+
+    total_kb = sum(len(b) for b in bodies) / 1024
+    print(f"Corpos: {len(bodies)} ({total_kb:.0f} KiB) | com referências migráveis: {len(with_refs)}")
+    for label, group in (("com referências", with_refs), ("sem referências", without)):
+        if not group:
+            continue
+        t_old = timed(legacy_rewrite, group, args.repeat)
+        t_new = timed(new_rewrite, group, args.repeat)
+        print(f"[{label}: {len(group)}]")
+        print(f"  Antigo (bs4, 2 passadas): {t_old * 1000:.1f} ms ({t_old / len(group) * 1000:.2f} ms/corpo)")
+        print(f"  Novo   (passada única)  : {t_new * 1000:.1f} ms ({t_new / len(group) * 1000:.2f} ms/corpo)")
+        print(f"  Ganho: {t_old / t_new:.2f}x" if t_new else "  Ganho: -")
+    print(f"Saídas idênticas byte a byte às antigas: {identical} de {len(with_refs)} "
+          f"(o antigo reserializava o documento inteiro)")
+    print(f"Documentos diferentes do antigo (após normalizar com bs4): {diffs}")
+    print(f"Saídas com texto alterado fora das tags <img>/<a>: {touched}")
+    if diffs or touched:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+
+"""
+Benchmark dos três migradores contra origem/destino falsos (bench/fake_servers.py).
+
+Cada cenário roda em um subprocesso próprio (a configuração dos scripts é lida
+do env na importação), chamando <módulo>.main(). Para cada um:
+  itens/s, requisições por item (origem + destino) e pico de RSS do processo.
+
+Uso:
+  python bench/run.py                               # todos os cenários, 50 itens
+  python bench/run.py --items 200 --latency-ms 15 --error-rate 0.02
+  python bench/run.py --only noticias-workers bulk1-plan --json resultado.json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_servers import FakeServers  # noqa: E402
+
+# importa o módulo e chama main(); argv vai para main(argv) quando ele aceita
+RUNNER = """
+import importlib, inspect, sys
+mod = importlib.import_module(sys.argv[1])
+args = sys.argv[2:]
+sys.argv = [sys.argv[1] + ".py"] + args
+if inspect.signature(mod.main).parameters:
+    mod.main(args)
+else:
+    mod.main()
+"""
+
+# nome -> (módulo, argv extra, env extra)
+SCENARIOS = {
+    "noticias": ("migrar_noticias_unificado", [], {}),
+    "noticias-workers": ("migrar_noticias_unificado", ["--workers", "4"], {}),
+    "noticias-prefetch": ("migrar_noticias_unificado", ["--workers", "4", "--prefetch", "4"], {}),
+    "noticias-single-write": ("migrar_noticias_unificado", ["--single-write", "--defer-publish"], {}),
+    "noticias-dedup": ("migrar_noticias_unificado", ["--workers", "4"], {"ASSET_DEDUP": "1"}),
+    "bulk1": ("bulk1", ["--engine", "sync"], {}),
+    "bulk1-plan": ("bulk1", ["--engine", "plan", "--workers", "4"], {}),
+    "bulk1-stream": ("bulk1", ["--engine", "plan", "--workers", "4"], {"PLONE_STREAM_UPLOAD": "1"}),
+    "bulk1-tus": ("bulk1", ["--engine", "plan", "--workers", "4"], {"PLONE_UPLOAD_TUS_MIN_MB": "0.05"}),
+    "bulk1-async": ("bulk1", ["--engine", "async", "--max-per-host", "4"], {}),
+    "bulk1-async-tus": ("bulk1", ["--engine", "async", "--max-per-host", "4"], {"PLONE_UPLOAD_TUS_MIN_MB": "0.05"}),
+    "municipios": ("municipios", [], {}),
+}
+
+
+def write_inputs(workdir: str, fake: FakeServers, items: int) -> dict:
+    """CSV do bulk1 e pares do municipios; devolve {"bulk1": n, "municipios": n} itens."""
+    orig = fake.origin_url
+    dest = fake.dest_url
+    rows = ["tipo;url_origem;url_destino",
+            f"Folder;{orig}/portal/rn/bench;{dest}/o-mpf/unidades/bench"]
+    for k in range(max(1, items // 10)):
+        rows.append(f"Folder;{orig}/portal/rn/bench/pasta-{k};{dest}/o-mpf/unidades/bench/pasta-{k}")
+    folders = max(1, items // 10)
+    for i in range(items):
+        k = i % folders
+        rows.append(f"Document;{orig}/portal/rn/bench/pasta-{k}/pagina-{i};{dest}/o-mpf/unidades/bench/pasta-{k}/pagina-{i}")
+        rows.append(f"File;{orig}/portal/rn/bench/pasta-{k}/arquivo-{i}.pdf;{dest}/o-mpf/unidades/bench/pasta-{k}/arquivo-{i}.pdf")
+    with open(os.path.join(workdir, "bulk.csv"), "w", encoding="utf-8") as f:
+        f.write("\n".join(rows) + "\n")
+
+    with open(os.path.join(workdir, "municipios.txt"), "w", encoding="utf-8") as f:
+        for i in range(items):
+            f.write(f"{orig}/portal/municipios/m{i} -> https://novoportal.mpf.mp.br/municipios/m{i}\n")
+
+    return {"migrar_noticias_unificado": items, "bulk1": len(rows) - 1, "municipios": items}
+
+
+def scenario_env(fake: FakeServers, workdir: str, extra: dict) -> dict:
+    env = dict(os.environ)
+    env.update({
+        "PYTHONPATH": ROOT + os.pathsep + env.get("PYTHONPATH", ""),
+        # migrar_noticias_unificado
+        "LISTA_URL": f"{fake.origin_url}/portal/v2_getNoticiasLista",
+        "PLONE_URL": fake.dest_url,
+        "STATE_FILE": os.path.join(workdir, "import_state.json"),
+        "PUBLISH_STATE_FILE": os.path.join(workdir, "publish_pending.jsonl"),
+        # bulk1 / municipios
+        "PLONE_DEST_ROOT_URL": f"{fake.dest_url}/o-mpf/unidades/",
+        "PLONE_DEST_API_BASE": fake.dest_url,
+        "PLONE_DEST_API_PREFIX": "/o-mpf/unidades",
+    })
+    env.update(extra)
+    return env
+
+
+def run_scenario(name: str, fake: FakeServers, base_dir: str, n_items: dict) -> dict:
+    module, argv, extra = SCENARIOS[name]
+    workdir = tempfile.mkdtemp(prefix=name + "-", dir=base_dir)
+    if module == "bulk1":
+        argv = [os.path.join(base_dir, "bulk.csv")] + argv
+    elif module == "municipios":
+        argv = [os.path.join(base_dir, "municipios.txt")] + argv
+
+    fake.reset()
+    log_path = os.path.join(workdir, "saida.log")
+    t0 = time.perf_counter()
+    with open(log_path, "w", encoding="utf-8") as log:
+        proc = subprocess.Popen([sys.executable, "-c", RUNNER, module] + argv, cwd=workdir,
+                                env=scenario_env(fake, workdir, extra), stdout=log, stderr=subprocess.STDOUT)
+        _pid, status, rusage = os.wait4(proc.pid, 0)
+        proc.returncode = os.waitstatus_to_exitcode(status)
+    elapsed = time.perf_counter() - t0
+
+    items = n_items[module]
+    orig_reqs, dest_reqs = fake.request_counts()
+    return {
+        "cenario": name,
+        "ok": proc.returncode == 0,
+        "itens": items,
+        "segundos": round(elapsed, 2),
+        "itens_s": round(items / elapsed, 2) if elapsed else 0.0,
+        "req_origem_item": round(orig_reqs / items, 2),
+        "req_destino_item": round(dest_reqs / items, 2),
+        "rss_pico_mb": round(rusage.ru_maxrss / 1024, 1),  # Linux: KiB
+        "log": log_path,
+    }
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description="Benchmark offline dos migradores.")
+    ap.add_argument("--items", type=int, default=50, help="notícias / páginas+arquivos / municípios por cenário")
+    ap.add_argument("--latency-ms", type=float, default=5.0, help="latência por requisição no destino")
+    ap.add_argument("--error-rate", type=float, default=0.0, help="fração de 503 (Retry-After: 0) no destino")
+    ap.add_argument("--only", nargs="+", choices=sorted(SCENARIOS), help="roda só estes cenários")
+    ap.add_argument("--json", metavar="ARQUIVO", help="grava os resultados em JSON")
+    args = ap.parse_args()
+
+    fake = FakeServers(args.items, args.latency_ms, args.error_rate).start()
+    base_dir = tempfile.mkdtemp(prefix="bench-migracao-")
+    n_items = write_inputs(base_dir, fake, args.items)
+    print(f"origem {fake.origin_url} | destino {fake.dest_url} "
+          f"(latência {args.latency_ms} ms, erro {args.error_rate:.0%}) | arquivos em {base_dir}")
+
+    results = []
+    try:
+        for name in args.only or list(SCENARIOS):
+            res = run_scenario(name, fake, base_dir, n_items)
+            results.append(res)
+            marca = "" if res["ok"] else "  FALHOU (ver log)"
+            print(f"  {name:<24} {res['itens']:>5} itens {res['segundos']:>7.2f}s {res['itens_s']:>8.2f} it/s "
+                  f"req/item {res['req_origem_item']:>5.1f} + {res['req_destino_item']:>5.1f} "
+                  f"RSS {res['rss_pico_mb']:>6.1f} MB{marca}")
+    finally:
+        fake.stop()
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"items": args.items, "latency_ms": args.latency_ms,
+                       "error_rate": args.error_rate, "resultados": results}, f, ensure_ascii=False, indent=2)
+        print(f"Resultados em {args.json}")
+    if not all(r["ok"] for r in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
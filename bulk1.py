@@ -1,18 +1,35 @@
 #!/Users/lflrocha/Sistemas/v2.mpf.migracao/bin/python3
 # -*- coding: utf-8 -*-
 
+import argparse
 import csv
+import hashlib
 import json
+import math
+import mmap
 import os
+import random
 import re
 import sys
+import tempfile
+import threading
 import time
-import base64
-from dataclasses import dataclass
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, wait
+from dataclasses import dataclass, field
 from urllib.parse import urlparse, urlencode
 
 import requests
 
+from http_client import make_session, print_connection_stats
+from ledger import DONE_STATUSES, open_ledger
+from metrics import METRICS, human_bytes
+from path_cache import PathCache
+from payloads import BASE64, close_body, json_body
+from snapshot import use_snapshot
+from throttle import print_throttle_stats, throttle_enabled
+from uploads import blob_chunks, tus_fill, tus_min_bytes, tus_upload, use_tus
+
 # =========================
 # CONFIG
 # =========================
@@ -27,12 +44,51 @@ DEST_PASS = os.getenv("PLONE_DEST_PASS", "Q7!mR2@x#9Lp")
 
 TIMEOUT = int(os.getenv("PLONE_TIMEOUT", "60"))
 SLEEP_BETWEEN = float(os.getenv("PLONE_SLEEP_BETWEEN", "0.05"))
+# PLONE_THROTTLE=aimd: ritmo adaptativo no destino (throttle.py) no lugar do
+# sleep fixo acima; desligado por padrão (PLONE_THROTTLE=off usa PLONE_SLEEP_BETWEEN)
+THROTTLE = throttle_enabled("PLONE_")
+
+# Motor de execução: "sync" (requests, linha a linha), "async" (asyncio + httpx)
+# ou "plan" (árvore de pastas criada uma vez + threads para páginas/arquivos)
+ENGINE = os.getenv("PLONE_ENGINE", "sync").strip().lower()
+# Requisições simultâneas por host no motor async
+MAX_PER_HOST = int(os.getenv("PLONE_MAX_PER_HOST", "8"))
+# Transferência de arquivos em blocos (origem em stream -> TUS no destino),
+# sem carregar o arquivo inteiro em memória
+STREAM_UPLOAD = (os.getenv("PLONE_STREAM_UPLOAD", "0") or "").strip().lower() in ("1", "true", "yes", "sim")
+UPLOAD_CHUNK_SIZE = int(os.getenv("PLONE_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+# Arquivos a partir deste tamanho vão por TUS mesmo sem STREAM_UPLOAD (0 = sempre base64 no JSON)
+UPLOAD_TUS_MIN_BYTES = tus_min_bytes("PLONE_")
+
+# Cache de pastas existentes no destino (vazio = só em memória, sem persistir)
+PATH_CACHE_FILE = os.getenv("PLONE_PATH_CACHE_FILE", "")
+PATH_CACHE = PathCache(PATH_CACHE_FILE)
+
+# Ledger SQLite compartilhado (vazio = desligado). Linhas já concluídas
+# são puladas sem nenhuma requisição.
+LEDGER_FILE = os.getenv("PLONE_LEDGER_FILE", "")
+LEDGER = open_ledger(LEDGER_FILE)
+LEDGER_SCRIPT = "bulk1"
+
+# Sincronização incremental (--sync): arquivos já no ledger não são pulados,
+# e sim conferidos na origem com GET condicional (If-None-Match /
+# If-Modified-Since a partir do ETag/Last-Modified gravados no run anterior).
+# 304 ou mesmo sha256 -> "unchanged" (nada vai ao destino); conteúdo novo ->
+# substitui o arquivo do objeto existente ("updated"). Exige PLONE_LEDGER_FILE.
+SYNC = (os.getenv("PLONE_SYNC", "0") or "").strip().lower() in ("1", "true", "yes", "sim")
+
+# Snapshot da origem (snapshot.py): --snapshot-export só lê a origem e grava em
+# disco; --snapshot-import migra lendo a origem do disco (motores sync/plan)
+SNAPSHOT_EXPORT = os.getenv("PLONE_SNAPSHOT_EXPORT", "")
+SNAPSHOT_IMPORT = os.getenv("PLONE_SNAPSHOT_IMPORT", "")
+
+# Threads do motor "plan" (planejador por árvore de pastas)
+WORKERS = int(os.getenv("PLONE_WORKERS", "4"))
 
 JSON_HEADERS = {
     "Accept": "application/json",
     "Content-Type": "application/json",
 }
-UPLOAD_HEADERS = {"Accept": "application/json"}
 
 # Métodos Zope na ORIGEM para páginas
 ORIG_METHOD_BODY = os.getenv("PLONE_ORIG_METHOD_BODY", "v2_getDocumentosCorpo")
@@ -76,6 +132,17 @@ class PageData:
     subject: list = None
     corpo_html: str = ""
 
+@dataclass
+class Plan:
+    # pastas distintas do destino, pais antes dos filhos, agrupadas por profundidade
+    levels: list = field(default_factory=list)
+    # url da pasta -> (idx, Row) quando a pasta também é linha Folder do CSV
+    folder_rows: dict = field(default_factory=dict)
+    # url da pasta pai -> [(idx, Row)] páginas/arquivos liberados quando o pai existir
+    children: dict = field(default_factory=dict)
+    # linhas que não cabem na árvore (fora do root, tipo desconhecido): caminho normal
+    loose: list = field(default_factory=list)
+
 # =========================
 # HELPERS GERAIS
 # =========================
@@ -124,6 +191,7 @@ def setup_ssl_behavior():
         except Exception:
             pass
 
+@METRICS.timed("titulo origem")
 def fetch_origin_title(orig_sess: requests.Session, obj_url: str, orig_auth, fallback: str = "") -> str:
     """
     Tenta buscar o título original do objeto no site antigo usando o mesmo
@@ -150,6 +218,13 @@ def fetch_origin_title(orig_sess: requests.Session, obj_url: str, orig_auth, fal
 # DESTINO (REST API)
 # =========================
 
+def blob_body(payload: dict, blob):
+    """Corpo JSON com o blob no campo BASE64 (payloads.json_body): grandes são codificados em thread durante o envio."""
+    with METRICS.phase("base64"):
+        return json_body(payload, blob)
+
+
+@METRICS.timed("criar arquivo json")
 def dest_create_file_json(dest_sess, parent_url: str, file_id: str, filename: str,
                           blob: bytes, content_type: str, dest_auth,
                           title: str = "") -> bool:
@@ -158,21 +233,25 @@ def dest_create_file_json(dest_sess, parent_url: str, file_id: str, filename: st
         "id": file_id,
         "title": title or filename or file_id,
         "file": {
-            "data": base64.b64encode(blob).decode("ascii"),
+            "data": BASE64,
             "encoding": "base64",
             "filename": filename or file_id,
             "content-type": content_type or "application/octet-stream",
         },
     }
 
-    r = dest_sess.post(
-        parent_url.rstrip("/"),
-        auth=dest_auth,
-        headers=JSON_HEADERS,
-        data=json.dumps(payload),
-        timeout=TIMEOUT,
-        verify=SSL_VERIFY,
-    )
+    body = blob_body(payload, blob)
+    try:
+        r = dest_sess.post(
+            parent_url.rstrip("/"),
+            auth=dest_auth,
+            headers=JSON_HEADERS,
+            data=body,
+            timeout=TIMEOUT,
+            verify=SSL_VERIFY,
+        )
+    finally:
+        close_body(body)
 
     if r.status_code in (200, 201):
         return True
@@ -180,10 +259,119 @@ def dest_create_file_json(dest_sess, parent_url: str, file_id: str, filename: st
         return False
     if r.status_code == 400 and "already in use" in (r.text or ""):
         return False
+    if r.status_code == 404:
+        PATH_CACHE.invalidate(parent_url)
 
     raise RuntimeError(f"POST {parent_url} (File id={file_id}) -> {r.status_code} {r.text}")
 
 
+def hashing_chunks(chunks, info: dict):
+    """Repassa os blocos contando bytes e sha256 (gravados em info ao final)."""
+    h = hashlib.sha256()
+    n = 0
+    for chunk in chunks:
+        h.update(chunk)
+        n += len(chunk)
+        yield chunk
+    info["bytes"] = n
+    info["sha256"] = h.hexdigest()
+
+def dest_create_file(dest_sess, parent_url: str, file_id: str, filename: str,
+                     blob: bytes, content_type: str, dest_auth, title: str = "") -> bool:
+    """File com o blob já em memória: base64 no JSON abaixo de UPLOAD_TUS_MIN_BYTES, TUS acima."""
+    if not use_tus(len(blob), UPLOAD_TUS_MIN_BYTES):
+        return dest_create_file_json(dest_sess, parent_url, file_id, filename, blob, content_type,
+                                     dest_auth, title=title)
+    if not dest_create_file_json(dest_sess, parent_url, file_id, filename, b"", content_type,
+                                 dest_auth, title=title):
+        return False
+    tus_fill(dest_sess, parent_url.rstrip("/") + "/" + file_id, blob_chunks(blob, UPLOAD_CHUNK_SIZE), len(blob),
+             filename or file_id, content_type or "application/octet-stream", dest_auth, TIMEOUT, SSL_VERIFY)
+    return True
+
+@METRICS.timed("criar arquivo tus")
+def dest_create_file_streamed(dest_sess, parent_url: str, file_id: str, filename: str,
+                              resp: requests.Response, content_type: str, dest_auth,
+                              title: str = "", info: dict = None) -> bool:
+    """
+    Cria o File com conteúdo vazio (garante o id) e envia os bytes via
+    <arquivo>/@tus-replace (uploads.tus_fill), lendo a resposta da origem em blocos.
+    """
+    length = resp.headers.get("Content-Length") or ""
+    spool = None
+    if not length.isdigit() or resp.headers.get("Content-Encoding"):
+        # sem tamanho confiável: despeja em arquivo temporário (disco, não memória)
+        spool = tempfile.TemporaryFile()
+        for chunk in resp.iter_content(UPLOAD_CHUNK_SIZE):
+            spool.write(chunk)
+        length = spool.tell()
+        spool.seek(0)
+        chunks = iter(lambda: spool.read(UPLOAD_CHUNK_SIZE), b"")
+    else:
+        length = int(length)
+        chunks = resp.iter_content(UPLOAD_CHUNK_SIZE)
+    if info is not None:
+        chunks = hashing_chunks(chunks, info)
+
+    try:
+        if not dest_create_file_json(dest_sess, parent_url, file_id, filename, b"", content_type,
+                                     dest_auth, title=title):
+            return False
+        if not length:
+            return True
+
+        tus_fill(dest_sess, parent_url.rstrip("/") + "/" + file_id, chunks, length,
+                 filename or file_id, content_type or "application/octet-stream",
+                 dest_auth, TIMEOUT, SSL_VERIFY)
+        return True
+    finally:
+        if spool is not None:
+            spool.close()
+
+
+@METRICS.timed("substituir arquivo")
+def dest_replace_file(dest_sess, file_url: str, filename: str, spool, length: int,
+                      content_type: str, dest_auth) -> bool:
+    """
+    Troca o conteúdo de um File existente: @tus-replace em blocos (STREAM_UPLOAD ou
+    a partir de UPLOAD_TUS_MIN_BYTES) ou PATCH com o arquivo em base64.
+    False se o objeto não existe mais no destino.
+    """
+    content_type = content_type or "application/octet-stream"
+    if (STREAM_UPLOAD or use_tus(length, UPLOAD_TUS_MIN_BYTES)) and length:
+        if not dest_exists(dest_sess, file_url, dest_auth):
+            return False
+        tus_upload(dest_sess, file_url.rstrip("/") + "/@tus-replace",
+                   iter(lambda: spool.read(UPLOAD_CHUNK_SIZE), b""), length,
+                   filename, content_type, dest_auth, TIMEOUT, SSL_VERIFY)
+        return True
+
+    payload = {"file": {"data": BASE64, "encoding": "base64",
+                        "filename": filename, "content-type": content_type}}
+    # o spool é lido por mmap: o base64 sai direto do arquivo, sem cópia no heap
+    spool.flush()
+    blob = mmap.mmap(spool.fileno(), 0, access=mmap.ACCESS_READ) if length else b""
+    body = blob_body(payload, blob)
+    try:
+        r = dest_sess.patch(
+            file_url.rstrip("/"),
+            auth=dest_auth,
+            headers=JSON_HEADERS,
+            data=body,
+            timeout=TIMEOUT,
+            verify=SSL_VERIFY,
+        )
+    finally:
+        close_body(body)
+        if length:
+            blob.close()
+    if r.status_code in (200, 204):
+        return True
+    if r.status_code == 404:
+        return False
+    raise RuntimeError(f"PATCH {file_url} (file) -> {r.status_code} {r.text}")
+
+
 def dest_get_type(dest_sess, url: str, dest_auth):
     r = dest_sess.get(
         url.rstrip("/"),
@@ -202,6 +390,23 @@ def normalize_url(u: str) -> str:
     return (u or "").rstrip("/")
 
 def dest_exists(dest_sess: requests.Session, url: str, dest_auth) -> bool:
+    return dest_object(dest_sess, url, dest_auth) is not None
+
+def dest_file_size(dest_sess: requests.Session, url: str, dest_auth):
+    """
+    Tamanho do File em url: None se não existe; 0 se foi criado vazio e o
+    envio por TUS não terminou (o processo caiu entre a criação e o tus_fill).
+    Outro tipo no caminho (Folder, Document, Image...) é conflito: RuntimeError.
+    """
+    data = dest_object(dest_sess, url, dest_auth)
+    if data is None:
+        return None
+    if data.get("@type") != "File":
+        raise RuntimeError(f"Destino {normalize_url(url)} já existe como {data.get('@type')} (esperado File)")
+    return int((data.get("file") or {}).get("size") or 0)
+
+def dest_object(dest_sess: requests.Session, url: str, dest_auth):
+    """JSON do objeto em url, ou None se ele não existe exatamente nesse caminho."""
     wanted = normalize_url(url)
 
     try:
@@ -215,11 +420,11 @@ def dest_exists(dest_sess: requests.Session, url: str, dest_auth) -> bool:
         )
 
         if r.status_code != 200:
-            return False
+            return None
 
         ctype = (r.headers.get("Content-Type") or "").lower()
         if "application/json" not in ctype:
-            return False
+            return None
 
         data = r.json()
 
@@ -227,17 +432,18 @@ def dest_exists(dest_sess: requests.Session, url: str, dest_auth) -> bool:
         returned_type = data.get("@type")
 
         if not returned_id or not returned_type:
-            return False
+            return None
 
         # só considera existente se o caminho retornado for exatamente o pedido
         if returned_id != wanted:
-            return False
+            return None
 
-        return True
+        return data
 
     except Exception:
-        return False
+        return None
 
+@METRICS.timed("criar pasta")
 def dest_create_folder(dest_sess, parent_url, folder_id, title, dest_auth):
     payload = {"@type": "Folder", "id": folder_id, "title": title or folder_id}
     r = dest_sess.post(
@@ -249,13 +455,19 @@ def dest_create_folder(dest_sess, parent_url, folder_id, title, dest_auth):
         verify=SSL_VERIFY,
     )
     if r.status_code in (200, 201):
+        PATH_CACHE.add(parent_url.rstrip("/") + "/" + folder_id)
         return True
     if r.status_code == 409:
+        PATH_CACHE.add(parent_url.rstrip("/") + "/" + folder_id)
         return False
     if r.status_code == 400 and "already in use" in (r.text or ""):
+        PATH_CACHE.add(parent_url.rstrip("/") + "/" + folder_id)
         return False
+    if r.status_code == 404:
+        PATH_CACHE.invalidate(parent_url)
     raise RuntimeError(f"POST {parent_url} -> {r.status_code} {r.text}")
 
+@METRICS.timed("criar documento")
 def dest_create_document(dest_sess, parent_url: str, doc_id: str,
                          title: str, html: str, description: str,
                          subject: list, effective: str, expires: str, dest_auth) -> bool:
@@ -288,24 +500,12 @@ def dest_create_document(dest_sess, parent_url: str, doc_id: str,
         return False
     if r.status_code == 400 and "already in use" in (r.text or ""):
         return False
+    if r.status_code == 404:
+        PATH_CACHE.invalidate(parent_url)
 
     raise RuntimeError(f"POST {parent_url} (Document id={doc_id}) -> {r.status_code} {r.text}")
 
-def dest_upload_file(dest_sess: requests.Session, container_url: str, filename: str, blob: bytes,
-                     dest_auth, content_type: str = None):
-    upload_url = container_url.rstrip("/") + "/@upload"
-    files = {"file": (filename, blob, content_type or "application/octet-stream")}
-    r = dest_sess.post(
-        upload_url,
-        auth=dest_auth,
-        headers=UPLOAD_HEADERS,
-        files=files,
-        timeout=TIMEOUT,
-        verify=SSL_VERIFY,
-    )
-    r.raise_for_status()
-    return r.json()
-
+@METRICS.timed("cadeia de pastas")
 def ensure_dest_folder_chain(dest_sess: requests.Session, dest_auth, dest_root_url: str, full_dest_url: str):
     """
     Garante que TODAS as pastas no destino existam até o PAI do item final.
@@ -331,10 +531,19 @@ def ensure_dest_folder_chain(dest_sess: requests.Session, dest_auth, dest_root_u
     current_url = dest_root_url.rstrip("/")
     for seg in rel.split("/"):
         next_url = current_url + "/" + seg
-        if not dest_exists(dest_sess, next_url, dest_auth):
+        if not dest_folder_exists(dest_sess, next_url, dest_auth):
             dest_create_folder(dest_sess, current_url, seg, seg, dest_auth)
         current_url = next_url
 
+def dest_folder_exists(dest_sess: requests.Session, url: str, dest_auth) -> bool:
+    """dest_exists com cache: pastas já vistas/criadas não geram nova requisição."""
+    if url in PATH_CACHE:
+        return True
+    if dest_exists(dest_sess, url, dest_auth):
+        PATH_CACHE.add(url)
+        return True
+    return False
+
 # =========================
 # ORIGEM (SEM REST API) - páginas via métodos Zope
 # =========================
@@ -356,6 +565,7 @@ def call_zope_method_text(orig_sess: requests.Session, obj_url: str, method_name
     return r.text
 
 
+@METRICS.timed("origem pagina")
 def fetch_page_data_from_origin(orig_sess: requests.Session, page_url: str, orig_auth) -> PageData:
     """
     Chama os 2 métodos na ORIGEM DIRETO NO OBJETO (sem ?id=).
@@ -401,10 +611,12 @@ def parse_metadados_text(txt: str) -> dict:
 # MIGRAÇÃO
 # =========================
 
-def migrate_folder(orig_sess, dest_sess, row: Row, orig_auth, dest_auth):
-    ensure_dest_folder_chain(dest_sess, dest_auth, DEST_ROOT_URL, row.url_destino)
+@METRICS.timed("item pasta")
+def migrate_folder(orig_sess, dest_sess, row: Row, orig_auth, dest_auth, chain_done: bool = False):
+    if not chain_done:
+        ensure_dest_folder_chain(dest_sess, dest_auth, DEST_ROOT_URL, row.url_destino)
 
-    if dest_exists(dest_sess, row.url_destino, dest_auth):
+    if dest_folder_exists(dest_sess, row.url_destino, dest_auth):
         return "exists"
 
     parent_url, folder_id = parent_and_id(row.url_destino)
@@ -421,11 +633,13 @@ def migrate_folder(orig_sess, dest_sess, row: Row, orig_auth, dest_auth):
 
 
 
-def migrate_pagina(orig_sess, dest_sess, row: Row, orig_auth, dest_auth):
+@METRICS.timed("item pagina")
+def migrate_pagina(orig_sess, dest_sess, row: Row, orig_auth, dest_auth, chain_done: bool = False):
     if dest_exists(dest_sess, row.url_destino, dest_auth):
         return "exists"
 
-    ensure_dest_folder_chain(dest_sess, dest_auth, DEST_ROOT_URL, row.url_destino)
+    if not chain_done:
+        ensure_dest_folder_chain(dest_sess, dest_auth, DEST_ROOT_URL, row.url_destino)
 
     pd = fetch_page_data_from_origin(orig_sess, row.url_origem, orig_auth)
 
@@ -444,53 +658,476 @@ def migrate_pagina(orig_sess, dest_sess, row: Row, orig_auth, dest_auth):
     )
     return "created" if created else "exists"
 
-def migrate_arquivo(orig_sess, dest_sess, row: Row, orig_auth, dest_auth):
-    if dest_exists(dest_sess, row.url_destino, dest_auth):
+def origin_validators(headers) -> dict:
+    """ETag, Last-Modified e Content-Length da resposta da origem (para o ledger)."""
+    length = headers.get("Content-Length") or ""
+    return {
+        "etag": headers.get("ETag") or None,
+        "last_modified": headers.get("Last-Modified") or None,
+        "length": int(length) if length.isdigit() and not headers.get("Content-Encoding") else None,
+    }
+
+@METRICS.timed("sync arquivo")
+def sync_arquivo(orig_sess, dest_sess, row: Row, orig_auth, prev: dict, dest_auth, info: dict):
+    """
+    Arquivo já migrado (segundo o ledger): GET condicional na origem.
+    Retorna "unchanged", "updated" ou None se o objeto sumiu do destino
+    (aí o chamador segue o caminho normal de criação).
+    """
+    headers = {}
+    if prev.get("etag"):
+        headers["If-None-Match"] = prev["etag"]
+    if prev.get("last_modified"):
+        headers["If-Modified-Since"] = prev["last_modified"]
+
+    with METRICS.phase("download arquivo"):
+        r = orig_sess.get(
+            row.url_origem,
+            auth=orig_auth,
+            headers=headers,
+            timeout=TIMEOUT,
+            allow_redirects=True,
+            verify=SSL_VERIFY,
+            stream=True,
+        )
+    with r:
+        if r.status_code == 304:
+            return "unchanged"
+        r.raise_for_status()
+        info.update(origin_validators(r.headers))
+        ctype = r.headers.get("Content-Type", "application/octet-stream")
+        filename = guess_filename(r, row.url_origem)
+
+        # servidor sem validadores (ou que ignora o condicional): decide pelo sha256,
+        # baixando para disco antes de mandar qualquer coisa ao destino
+        with tempfile.TemporaryFile() as spool:
+            for chunk in hashing_chunks(r.iter_content(UPLOAD_CHUNK_SIZE), info):
+                spool.write(chunk)
+            if info["sha256"] == prev.get("sha256"):
+                return "unchanged"
+            spool.seek(0)
+            file_url = prev.get("dest_id") or normalize_url(row.url_destino)
+            if not dest_replace_file(dest_sess, file_url, filename or parent_and_id(file_url)[1],
+                                     spool, info["bytes"], ctype, dest_auth):
+                return None
+    info["dest_id"] = file_url
+    return "updated"
+
+def refill_arquivo(dest_sess, r: requests.Response, file_url: str, filename: str, ctype: str,
+                   dest_auth, info: dict = None) -> str:
+    """Envia o conteúdo da origem (r, em stream) para um File que já existe vazio no destino."""
+    info = info if info is not None else {}
+    with tempfile.TemporaryFile() as spool:
+        for chunk in hashing_chunks(r.iter_content(UPLOAD_CHUNK_SIZE), info):
+            spool.write(chunk)
+        spool.seek(0)
+        if not dest_replace_file(dest_sess, file_url, filename, spool, info["bytes"], ctype, dest_auth):
+            raise RuntimeError(f"File sumiu do destino durante o preenchimento: {file_url}")
+    return "updated"
+
+@METRICS.timed("item arquivo")
+def migrate_arquivo(orig_sess, dest_sess, row: Row, orig_auth, dest_auth, chain_done: bool = False,
+                    info: dict = None):
+    if SYNC and LEDGER and info is not None:
+        prev = LEDGER.get(LEDGER_SCRIPT, row.url_origem)
+        if prev and prev["status"] in DONE_STATUSES:
+            st = sync_arquivo(orig_sess, dest_sess, row, orig_auth, prev, dest_auth, info)
+            if st is not None:
+                return st
+            info.clear()
+
+    size = dest_file_size(dest_sess, row.url_destino, dest_auth)
+    if size:
         return "exists"
 
-    r = orig_sess.get(
-        row.url_origem,
-        auth=orig_auth,
-        timeout=TIMEOUT,
-        allow_redirects=True,
-        verify=SSL_VERIFY,
-    )
-    r.raise_for_status()
-    blob = r.content
-    ctype = r.headers.get("Content-Type", "application/octet-stream")
-    filename = guess_filename(r, row.url_origem)
+    with METRICS.phase("download arquivo"):
+        r = orig_sess.get(
+            row.url_origem,
+            auth=orig_auth,
+            timeout=TIMEOUT,
+            allow_redirects=True,
+            verify=SSL_VERIFY,
+            stream=True,  # o Content-Length decide entre TUS em blocos e JSON (aí lê r.content)
+        )
+    # a resposta (em stream) segura uma conexão do pool: fechada em qualquer saída,
+    # inclusive se as chamadas ao destino ou à origem abaixo levantarem
+    with r:
+        r.raise_for_status()
+        validators = origin_validators(r.headers)
+        if info is not None:
+            info.update(validators)
+        ctype = r.headers.get("Content-Type", "application/octet-stream")
+        filename = guess_filename(r, row.url_origem)
+
+        parent_url, file_id = parent_and_id(row.url_destino)
+
+        if not chain_done:
+            ensure_dest_folder_chain(dest_sess, dest_auth, DEST_ROOT_URL, row.url_destino)
+
+        parent_type = dest_get_type(dest_sess, parent_url, dest_auth)
+        if parent_type and parent_type != "Folder":
+            pparent_url, pid = parent_and_id(parent_url)
+            fallback_id = pid + "-files"
+            fallback_url = pparent_url.rstrip("/") + "/" + fallback_id
+            if not dest_folder_exists(dest_sess, fallback_url, dest_auth):
+                dest_create_folder(dest_sess, pparent_url, fallback_id, fallback_id, dest_auth)
+            parent_url = fallback_url
+
+        original_title = fetch_origin_title(
+            orig_sess,
+            row.url_origem,
+            orig_auth,
+            fallback=filename or file_id,
+        )
+
+        file_url = parent_url.rstrip("/") + "/" + file_id
+        if info is not None:
+            info["dest_id"] = file_url
+
+        if size is None and normalize_url(file_url) != normalize_url(row.url_destino):
+            size = dest_file_size(dest_sess, file_url, dest_auth)  # já criado sob o fallback "-files"
+        if size is not None and (size or validators["length"] == 0):
+            return "exists"
+        if size == 0:
+            # File vazio de um run que caiu entre a criação e o TUS: preenche em vez de dar "existe"
+            return refill_arquivo(dest_sess, r, file_url, filename or file_id, ctype, dest_auth, info)
+
+        if STREAM_UPLOAD or use_tus(validators["length"], UPLOAD_TUS_MIN_BYTES):
+            created = dest_create_file_streamed(
+                dest_sess,
+                parent_url,
+                file_id,
+                filename,
+                r,
+                ctype,
+                dest_auth,
+                title=original_title,
+                info=info,
+            )
+            return "created" if created else "exists"
+
+        blob = r.content
+        if info is not None:
+            info["bytes"] = len(blob)
+            with METRICS.phase("sha256"):
+                info["sha256"] = hashlib.sha256(blob).hexdigest()
+
+        created = dest_create_file(
+            dest_sess,
+            parent_url,
+            file_id,
+            filename,
+            blob,
+            ctype,
+            dest_auth,
+            title=original_title,
+        )
+        return "created" if created else "exists"
+
+def migrate_row(orig_sess, dest_sess, row: Row, orig_auth, dest_auth, chain_done: bool = False,
+                info: dict = None):
+    """Despacha pela coluna tipo. Retorna None para tipos não suportados (SKIP)."""
+    if row.tipo == "folder":
+        return migrate_folder(orig_sess, dest_sess, row, orig_auth, dest_auth, chain_done)
+    if row.tipo in ("pagina", "document", "page"):
+        return migrate_pagina(orig_sess, dest_sess, row, orig_auth, dest_auth, chain_done)
+    if row.tipo in ("arquivo", "file"):
+        return migrate_arquivo(orig_sess, dest_sess, row, orig_auth, dest_auth, chain_done, info)
+    return None
 
-    parent_url, file_id = parent_and_id(row.url_destino)
+# =========================
+# EXECUÇÃO + LEDGER
+# =========================
 
-    ensure_dest_folder_chain(dest_sess, dest_auth, DEST_ROOT_URL, row.url_destino)
+_REPORT_LOCK = threading.Lock()
 
-    parent_type = dest_get_type(dest_sess, parent_url, dest_auth)
-    if parent_type and parent_type != "Folder":
-        pparent_url, pid = parent_and_id(parent_url)
-        fallback_id = pid + "-files"
-        fallback_url = pparent_url.rstrip("/") + "/" + fallback_id
-        if not dest_exists(dest_sess, fallback_url, dest_auth):
-            dest_create_folder(dest_sess, pparent_url, fallback_id, fallback_id, dest_auth)
-        parent_url = fallback_url
+def ledger_done() -> set:
+    return LEDGER.done(LEDGER_SCRIPT) if LEDGER else set()
 
-    original_title = fetch_origin_title(
-        orig_sess,
+def ledger_record(row: Row, status: str, info: dict = None, erro: str = ""):
+    if not LEDGER:
+        return
+    info = info or {}
+    dest_id = info.get("dest_id")
+    if not dest_id and status not in ("unchanged", "error"):
+        dest_id = normalize_url(row.url_destino)
+    # "unchanged"/erro não tocam no destino: dest_id None mantém o gravado
+    # (ex.: arquivo que foi para o fallback "-files")
+    LEDGER.record(
+        LEDGER_SCRIPT,
         row.url_origem,
-        orig_auth,
-        fallback=filename or file_id,
+        status,
+        destino=row.url_destino,
+        dest_id=dest_id,
+        tipo=row.tipo,
+        bytes_=info.get("bytes"),
+        sha256=info.get("sha256"),
+        erro=erro,
+        etag=info.get("etag"),
+        last_modified=info.get("last_modified"),
+        length=info.get("length"),
     )
 
-    created = dest_create_file_json(
-        dest_sess,
-        parent_url,
-        file_id,
-        filename,
-        blob,
-        ctype,
-        dest_auth,
-        title=original_title,
-    )
-    return "created" if created else "exists"
+def run_row(orig_sess, dest_sess, idx: int, total: int, row: Row, orig_auth, dest_auth,
+            counters: dict, done: set = frozenset(), chain_done: bool = False):
+    """Migra uma linha, imprime o resultado e atualiza contadores e ledger. Retorna o status."""
+    if row.url_origem in done and not (SYNC and row.tipo in ("arquivo", "file")):
+        with _REPORT_LOCK:
+            counters["ok"] += 1
+            print(f"[{idx}/{total}] OK {row.tipo} -> ledger :: {row.url_destino}")
+        return "ledger"
+
+    info = {}
+    try:
+        st = migrate_row(orig_sess, dest_sess, row, orig_auth, dest_auth, chain_done=chain_done, info=info)
+    except Exception as e:
+        with _REPORT_LOCK:
+            counters["fail"] += 1
+            print(f"[{idx}/{total}] FAIL {row.tipo} :: {row.url_origem} -> {row.url_destino}", file=sys.stderr)
+            print(f"  ERRO: {e}", file=sys.stderr)
+        ledger_record(row, "error", info, erro=str(e))
+        return None
+
+    with _REPORT_LOCK:
+        if st is None:
+            counters["skip"] += 1
+            print(f"[{idx}/{total}] SKIP tipo={row.tipo} :: {row.url_origem}")
+            return None
+        counters["ok"] += 1
+        print(f"[{idx}/{total}] OK {row.tipo} -> {st} :: {row.url_destino}")
+    ledger_record(row, st, info)
+    return st
+
+# =========================
+# PLANEJADOR (motor "plan")
+# =========================
+
+def plan_rows(rows: list, dest_root_url: str) -> Plan:
+    """
+    Monta a árvore de pastas a partir de todos os url_destino do CSV.
+    Cada pasta distinta aparece uma única vez em plan.levels (ordem topológica).
+    """
+    root_base, root_path = split_base_and_path(dest_root_url)
+    rp = root_path.rstrip("/")
+
+    plan = Plan()
+    folders = set()
+
+    for idx, row in enumerate(rows, start=1):
+        base, path = split_base_and_path(row.url_destino)
+        supported = row.tipo in ("folder", "pagina", "document", "page", "arquivo", "file")
+        if base != root_base or not path.startswith(rp + "/") or not supported:
+            plan.loose.append((idx, row))
+            continue
+
+        segs = path[len(rp):].strip("/").split("/")
+        # ancestrais (abaixo do root) até o pai do item
+        for n in range(1, len(segs)):
+            folders.add(base + rp + "/" + "/".join(segs[:n]))
+
+        url = base + path
+        if row.tipo == "folder":
+            folders.add(url)
+            plan.folder_rows.setdefault(url, (idx, row))
+        else:
+            parent_url, _id = parent_and_id(url)
+            plan.children.setdefault(parent_url, []).append((idx, row))
+
+    by_depth = {}
+    for url in folders:
+        by_depth.setdefault(url.count("/"), []).append(url)
+    plan.levels = [sorted(by_depth[d]) for d in sorted(by_depth)]
+
+    # filhos diretos do root não dependem de nenhuma pasta do plano
+    root_children = plan.children.pop(root_base + rp, [])
+    plan.loose.extend(root_children)
+    return plan
+
+_THREAD_LOCAL = threading.local()
+
+def thread_sessions():
+    """Sessões (origem, destino) próprias de cada thread do pool."""
+    sessions = getattr(_THREAD_LOCAL, "sessions", None)
+    if sessions is None:
+        sessions = _THREAD_LOCAL.sessions = (make_session("orig", "PLONE_"), make_session("dest", "PLONE_"))
+    return sessions
+
+def run_planned(rows: list, orig_auth, dest_auth, workers: int):
+    plan = plan_rows(rows, DEST_ROOT_URL)
+    total = len(rows)
+    counters = {"ok": 0, "skip": 0, "fail": 0}
+    done = ledger_done()
+
+    print(f"Plano: {sum(len(l) for l in plan.levels)} pastas distintas em {len(plan.levels)} níveis, "
+          f"{sum(len(c) for c in plan.children.values())} páginas/arquivos, {len(plan.loose)} avulsas")
+
+    planned = {url for level in plan.levels for url in level}
+    ensured = set()  # pastas do plano que existem no destino (criadas ou já lá)
+
+    def run_pooled(idx, row, chain_done):
+        orig_sess, dest_sess = thread_sessions()
+        return run_row(orig_sess, dest_sess, idx, total, row, orig_auth, dest_auth, counters, done, chain_done)
+
+    def run_folder(url):
+        # pai do plano que falhou: esta pasta (e o que vier abaixo) refaz a cadeia
+        parent_url, seg = parent_and_id(url)
+        chain_ok = parent_url not in planned or parent_url in ensured
+        if url in plan.folder_rows:
+            idx, row = plan.folder_rows[url]
+            ok = run_pooled(idx, row, chain_ok) is not None
+        else:
+            _orig_sess, dest_sess = thread_sessions()
+            try:
+                if not chain_ok:
+                    ensure_dest_folder_chain(dest_sess, dest_auth, DEST_ROOT_URL, url)
+                if not dest_folder_exists(dest_sess, url, dest_auth):
+                    dest_create_folder(dest_sess, parent_url, seg, seg, dest_auth)
+                ok = True
+            except Exception as e:
+                print(f"[pasta] FAIL {url}\n  ERRO: {e}", file=sys.stderr)
+                ok = False
+        if ok:
+            ensured.add(url)
+
+        # libera a subárvore imediata (páginas/arquivos) para o pool; se a pasta
+        # falhou, cada filho tenta garantir a cadeia por conta própria
+        for idx, row in plan.children.get(url, []):
+            leaves.append(pool.submit(run_pooled, idx, row, ok))
+
+    leaves = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        for idx, row in plan.loose:
+            leaves.append(pool.submit(run_pooled, idx, row, False))
+        for level in plan.levels:
+            # um nível só começa quando todos os pais (nível anterior) existem
+            wait([pool.submit(run_folder, url) for url in level])
+        wait(leaves)
+
+    return counters
+
+# =========================
+# ESTIMATIVA (--estimate): nada é gravado no destino
+# =========================
+
+# Requisições (origem, destino) de uma linha nova (objeto ausente no destino,
+# pastas do caminho já garantidas); pastas intermediárias são somadas à parte.
+#   folder : título na origem           | GET existe + POST
+#   pagina : metadados + corpo          | GET existe + POST
+#   arquivo: download + título          | GET existe + GET tipo do pai + POST
+#            (stream: + POST @tus-replace + 1 PATCH por bloco)
+EST_REQS = {"folder": (1, 2), "pagina": (2, 2), "arquivo": (2, 3)}
+EST_GROUP = {"folder": "folder", "pagina": "pagina", "document": "pagina", "page": "pagina",
+             "arquivo": "arquivo", "file": "arquivo"}
+
+def head_length(orig_sess, url: str, orig_auth):
+    """Content-Length via HEAD (None se o servidor não informar)."""
+    try:
+        r = orig_sess.head(url, auth=orig_auth, timeout=TIMEOUT, allow_redirects=True, verify=SSL_VERIFY)
+    except requests.RequestException:
+        return None
+    length = r.headers.get("Content-Length") or ""
+    return int(length) if r.status_code == 200 and length.isdigit() else None
+
+def estimate(rows: list, orig_auth, workers: int, sample: int) -> dict:
+    done = ledger_done()
+    pending = [r for r in rows if r.url_origem not in done]
+    groups = Counter(EST_GROUP.get(r.tipo, "outro") for r in pending)
+
+    # pastas intermediárias que o run teria de conferir (GET) e talvez criar (POST)
+    plan = plan_rows(pending, DEST_ROOT_URL)
+    chain = [u for level in plan.levels for u in level if u not in plan.folder_rows and u not in PATH_CACHE]
+
+    files = [r for r in pending if EST_GROUP.get(r.tipo) == "arquivo"]
+    probe = random.sample(files, sample) if 0 < sample < len(files) else files
+    sizes = []
+    if probe:
+        def head_one(row):
+            orig_sess, _dest_sess = thread_sessions()
+            return head_length(orig_sess, row.url_origem, orig_auth)
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+            sizes = [n for n in pool.map(head_one, probe) if n is not None]
+    avg_size = sum(sizes) / len(sizes) if sizes else 0
+    file_bytes = int(avg_size * len(files))
+
+    orig_reqs = sum(EST_REQS[g][0] * n for g, n in groups.items() if g in EST_REQS)
+    dest_reqs = sum(EST_REQS[g][1] * n for g, n in groups.items() if g in EST_REQS) + 2 * len(chain)
+    # TUS (STREAM_UPLOAD ou acima de UPLOAD_TUS_MIN_BYTES): POST + um PATCH por bloco, bytes crus;
+    # o resto vai em base64 no JSON (+1/3)
+    scale = len(files) / len(sizes) if sizes else 0
+    tus_sizes = [n for n in sizes if STREAM_UPLOAD or use_tus(n, UPLOAD_TUS_MIN_BYTES)]
+    dest_reqs += round(scale * sum(1 + max(1, math.ceil(n / UPLOAD_CHUNK_SIZE)) for n in tus_sizes))
+    upload_bytes = int(scale * (sum(tus_sizes) + (sum(sizes) - sum(tus_sizes)) * 4 / 3))
+
+    return {
+        "linhas": len(rows),
+        "ja_no_ledger": len(rows) - len(pending),
+        "por_tipo": dict(groups),
+        "pastas_intermediarias": len(chain),
+        "arquivos_medidos": len(sizes),
+        "arquivos_sem_tamanho": len(probe) - len(sizes),
+        "bytes_origem": file_bytes,
+        "bytes_destino": upload_bytes,
+        "req_origem": orig_reqs,
+        "req_destino": dest_reqs,
+    }
+
+def print_estimate(est: dict, sample: int) -> None:
+    print("Estimativa (nada foi gravado no destino):")
+    print(f"  linhas no CSV        : {est['linhas']}  (já concluídas no ledger: {est['ja_no_ledger']})")
+    for g in ("folder", "pagina", "arquivo", "outro"):
+        if est["por_tipo"].get(g):
+            print(f"  {g:<21}: {est['por_tipo'][g]}" + ("  (ignoradas pelo script)" if g == "outro" else ""))
+    print(f"  pastas intermediárias: até {est['pastas_intermediarias']} (fora do cache de caminhos)")
+    amostra = f"amostra de {sample}" if sample else "todos"
+    print(f"  tamanho dos arquivos : HEAD em {est['arquivos_medidos']} ({amostra}); "
+          f"{est['arquivos_sem_tamanho']} sem Content-Length")
+    print(f"  bytes baixados       : ~{human_bytes(est['bytes_origem'])}")
+    print(f"  bytes enviados       : ~{human_bytes(est['bytes_destino'])}"
+          + ("" if STREAM_UPLOAD else f" (base64 abaixo de {human_bytes(UPLOAD_TUS_MIN_BYTES)}, TUS acima)"
+             if UPLOAD_TUS_MIN_BYTES > 0 else " (base64)"))
+    print(f"  requisições          : ~{est['req_origem']} na origem + ~{est['req_destino']} no destino")
+
+# =========================
+# SNAPSHOT (--snapshot-export): só as leituras da origem, nada no destino
+# =========================
+
+def export_row(orig_sess, row: Row, orig_auth):
+    """Faz as mesmas leituras da origem que migrate_row (o adapter grava no snapshot)."""
+    group = EST_GROUP.get(row.tipo)
+    _parent_url, obj_id = parent_and_id(row.url_destino)
+    if group == "folder":
+        fetch_origin_title(orig_sess, row.url_origem, orig_auth, fallback=obj_id)
+    elif group == "pagina":
+        fetch_page_data_from_origin(orig_sess, row.url_origem, orig_auth)
+    elif group == "arquivo":
+        with orig_sess.get(row.url_origem, auth=orig_auth, timeout=TIMEOUT, allow_redirects=True,
+                           verify=SSL_VERIFY, stream=True) as r:
+            r.raise_for_status()
+        fetch_origin_title(orig_sess, row.url_origem, orig_auth, fallback=obj_id)
+    else:
+        return None
+    return "exported"
+
+def run_export(rows: list, orig_auth, workers: int) -> dict:
+    counters = {"ok": 0, "skip": 0, "fail": 0}
+    total = len(rows)
+
+    def export_one(idx, row):
+        orig_sess, _dest_sess = thread_sessions()
+        try:
+            st = export_row(orig_sess, row, orig_auth)
+        except Exception as e:
+            with _REPORT_LOCK:
+                counters["fail"] += 1
+                print(f"[{idx}/{total}] FAIL {row.tipo} :: {row.url_origem}\n  ERRO: {e}", file=sys.stderr)
+            return
+        with _REPORT_LOCK:
+            counters["ok" if st else "skip"] += 1
+            print(f"[{idx}/{total}] {'EXPORT' if st else 'SKIP'} {row.tipo} :: {row.url_origem}")
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        wait([pool.submit(export_one, idx, row) for idx, row in enumerate(rows, start=1)])
+    return counters
 
 # =========================
 # CSV
@@ -516,57 +1153,131 @@ def read_rows(csv_path: str):
 # MAIN
 # =========================
 
-def main():
-    if len(sys.argv) < 2:
-        print("Uso: bulk_migration.py arquivo.csv", file=sys.stderr)
-        sys.exit(2)
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(prog="bulk_migration.py", description="Migração em lote a partir de CSV")
+    ap.add_argument("csv_path", help="CSV ; com colunas tipo;url_origem;url_destino")
+    ap.add_argument("--engine", choices=("sync", "async", "plan"), default=ENGINE,
+                    help="sync = requests linha a linha; async = asyncio + httpx (mede fases e HTTP, "
+                         "mas sem throttle, cache da origem, estatísticas de conexão, --sync e "
+                         "--snapshot-import); plan = pastas em ordem topológica + threads")
+    ap.add_argument("--max-per-host", type=int, default=MAX_PER_HOST,
+                    help="requisições simultâneas por host (motor async)")
+    ap.add_argument("--workers", type=int, default=WORKERS,
+                    help="threads para páginas/arquivos (motor plan)")
+    ap.add_argument("--sync", action="store_true", default=SYNC,
+                    help="sincronização incremental: reconfere na origem (GET condicional) os arquivos "
+                         "já no ledger e só transfere os novos ou alterados")
+    ap.add_argument("--estimate", action="store_true",
+                    help="só planeja: conta itens, requisições e bytes (HEAD na origem) sem gravar no destino")
+    ap.add_argument("--sample", type=int, default=0,
+                    help="no --estimate, mede o tamanho de só N arquivos e extrapola (0 = todos)")
+    ap.add_argument("--snapshot-export", default=SNAPSHOT_EXPORT, metavar="DIR",
+                    help="só lê a origem de cada linha e grava o snapshot em DIR (threads = --workers); "
+                         "nada vai ao destino")
+    ap.add_argument("--snapshot-import", default=SNAPSHOT_IMPORT, metavar="DIR",
+                    help="migra lendo a origem do snapshot em DIR, sem acessar o site antigo")
+    ap.add_argument("--metrics-out", default=os.getenv("PLONE_METRICS_OUT", ""), metavar="ARQUIVO",
+                    help="grava as métricas do run: .json ou texto Prometheus (outra extensão)")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    global SYNC
+    args = parse_args(argv)
+    SYNC = args.sync
+    if SYNC and not LEDGER:
+        sys.exit("--sync precisa do ledger (PLONE_LEDGER_FILE).")
+    if SYNC and args.engine == "async":
+        sys.exit("--sync não é suportado no motor async; use --engine sync ou plan.")
+    if args.snapshot_import and args.engine == "async":
+        sys.exit("--snapshot-import não é suportado no motor async; use --engine sync ou plan.")
+    use_snapshot("PLONE_", args.snapshot_export, args.snapshot_import)
 
     setup_ssl_behavior()
 
-    csv_path = sys.argv[1]
-    rows = read_rows(csv_path)
+    rows = read_rows(args.csv_path)
 
     orig_auth = get_origin_auth()
     dest_auth = (DEST_USER, DEST_PASS)
 
-    orig_sess = requests.Session()
-    dest_sess = requests.Session()
-
-    ok = 0
-    skip = 0
-    fail = 0
+    if args.estimate:
+        try:
+            print_estimate(estimate(rows, orig_auth, args.workers, args.sample), args.sample)
+        finally:
+            if LEDGER:
+                LEDGER.close()
+        return
 
-    total = len(rows)
+    if args.snapshot_export:
+        try:
+            counters = run_export(rows, orig_auth, args.workers)
+        finally:
+            if LEDGER:
+                LEDGER.close()
+        print_summary(counters["ok"], counters["skip"], counters["fail"])
+        print_connection_stats()
+        METRICS.report()
+        if args.metrics_out:
+            METRICS.export(args.metrics_out)
+        return
 
     print("Config:")
     print(f"  DEST_ROOT_URL: {DEST_ROOT_URL}")
     print(f"  SSL_VERIFY: {SSL_VERIFY!r}  (False=ignora, str=cabundle, True=valida)")
     print(f"  TIMEOUT: {TIMEOUT}s")
-    print(f"  SLEEP_BETWEEN: {SLEEP_BETWEEN}s")
+    print(f"  ENGINE: {args.engine}")
+    if args.engine == "async":
+        print(f"  MAX_PER_HOST: {args.max_per_host}")
+    elif args.engine == "plan":
+        print(f"  WORKERS: {args.workers}")
+    elif THROTTLE:
+        print("  THROTTLE: aimd (PLONE_THROTTLE=off, o default, usa SLEEP_BETWEEN)")
+    else:
+        print(f"  SLEEP_BETWEEN: {SLEEP_BETWEEN}s")
+    if STREAM_UPLOAD:
+        print(f"  STREAM_UPLOAD: blocos de {UPLOAD_CHUNK_SIZE} bytes")
+    elif UPLOAD_TUS_MIN_BYTES > 0:
+        print(f"  UPLOAD_TUS_MIN_MB: arquivos a partir de {human_bytes(UPLOAD_TUS_MIN_BYTES)} vão por TUS")
+    if SYNC:
+        print("  SYNC: arquivos do ledger reconferidos na origem (GET condicional)")
     print("")
 
+    try:
+        if args.engine == "async":
+            from bulk1_async import main_async
+
+            counters = main_async(rows, orig_auth, dest_auth, args.max_per_host)
+        elif args.engine == "plan":
+            counters = run_planned(rows, orig_auth, dest_auth, args.workers)
+        else:
+            counters = run_sequential(rows, orig_auth, dest_auth)
+    finally:
+        PATH_CACHE.save()
+        if LEDGER:
+            LEDGER.close()
+
+    print_summary(counters["ok"], counters["skip"], counters["fail"])
+    print_connection_stats()
+    print_throttle_stats()
+    METRICS.report()
+    if args.metrics_out:
+        METRICS.export(args.metrics_out)
+
+def run_sequential(rows: list, orig_auth, dest_auth) -> dict:
+    orig_sess = make_session("orig", "PLONE_")
+    dest_sess = make_session("dest", "PLONE_")
+
+    counters = {"ok": 0, "skip": 0, "fail": 0}
+    total = len(rows)
+    done = ledger_done()
+
     for idx, row in enumerate(rows, start=1):
-        try:
-            if row.tipo == "folder":
-                st = migrate_folder(orig_sess, dest_sess, row, orig_auth, dest_auth)
-            elif row.tipo in ("pagina", "document", "page"):
-                st = migrate_pagina(orig_sess, dest_sess, row, orig_auth, dest_auth)
-            elif row.tipo in ("arquivo", "file"):
-                st = migrate_arquivo(orig_sess, dest_sess, row, orig_auth, dest_auth)
-            else:
-                skip += 1
-                print(f"[{idx}/{total}] SKIP tipo={row.tipo} :: {row.url_origem}")
-                continue
-
-            ok += 1
-            print(f"[{idx}/{total}] OK {row.tipo} -> {st} :: {row.url_destino}")
+        st = run_row(orig_sess, dest_sess, idx, total, row, orig_auth, dest_auth, counters, done)
+        if st and st != "ledger" and not THROTTLE:
             time.sleep(SLEEP_BETWEEN)
 
-        except Exception as e:
-            fail += 1
-            print(f"[{idx}/{total}] FAIL {row.tipo} :: {row.url_origem} -> {row.url_destino}", file=sys.stderr)
-            print(f"  ERRO: {e}", file=sys.stderr)
+    return counters
 
+def print_summary(ok: int, skip: int, fail: int):
     print("\nResumo:")
     print(f"  OK: {ok}")
     print(f"  SKIP: {skip}")
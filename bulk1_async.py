@@ -0,0 +1,487 @@
+# -*- coding: utf-8 -*-
+
+"""
+Motor assíncrono (asyncio + httpx) para o bulk1.py.
+
+Reimplementa migrate_folder / migrate_pagina / migrate_arquivo como corrotinas,
+com limite de requisições simultâneas POR HOST (origem e destino separados).
+
+Ordem garantida:
+1) Linhas Folder, por profundidade (pais antes dos filhos; mesma profundidade em paralelo)
+2) Páginas e arquivos em paralelo, no máximo ROWS_PER_HOST_SLOT * max_per_host
+   linhas em voo (cada arquivo segura o blob até o POST: sem o limite, os
+   downloads da origem correm à frente do destino e a memória cresce com o CSV).
+   A cadeia de pastas de cada linha é garantida por ensure_dest_folder_chain,
+   que cria cada pasta uma única vez e faz os filhos aguardarem a criação do pai.
+
+Arquivos a partir de PLONE_UPLOAD_TUS_MIN_MB seguem a estratégia do bulk1: o
+File é criado vazio e o conteúdo vai por @tus-replace. O envio TUS usa
+uploads.tus_fill (mesma retomada do motor síncrono) numa thread, com a sessão
+requests da thread, segurando uma vaga do host de destino.
+
+Métricas: cada requisição httpx entra em METRICS como no http_client (papel
+orig/dest, latência, status, bytes) e as etapas usam os mesmos nomes de fase do
+motor síncrono. O resto do http_client não vale aqui: sem throttle adaptativo,
+sem cache da origem, sem estatísticas de reuso de conexão (nem --sync e
+--snapshot-import, recusados pelo bulk1.py).
+
+Uso: bulk1.py arquivo.csv --engine async --max-per-host 8
+"""
+
+import asyncio
+import hashlib
+import json
+import ssl
+import sys
+import time
+from urllib.parse import urlparse
+
+import httpx
+
+from bulk1 import (
+    DEST_ROOT_URL,
+    JSON_HEADERS,
+    ORIG_METHOD_BODY,
+    ORIG_METHOD_META,
+    PATH_CACHE,
+    SSL_VERIFY,
+    TIMEOUT,
+    UPLOAD_CHUNK_SIZE,
+    UPLOAD_TUS_MIN_BYTES,
+    Row,
+    guess_filename,
+    normalize_url,
+    origin_validators,
+    parent_and_id,
+    parse_metadados_text,
+    ledger_done,
+    ledger_record,
+    split_base_and_path,
+    thread_sessions,
+)
+from metrics import METRICS
+from payloads import BASE64, json_body
+from uploads import blob_chunks, tus_fill, use_tus
+
+# linhas em voo por vaga de conexão do host: uma baixando enquanto outra envia
+ROWS_PER_HOST_SLOT = 2
+
+# =========================
+# LIMITE POR HOST
+# =========================
+
+class HostLimiter:
+    """Um semáforo por host (scheme://netloc) limitando requisições em voo."""
+
+    def __init__(self, max_per_host: int):
+        self.max_per_host = max(1, int(max_per_host))
+        self._sems = {}
+
+    def __call__(self, url: str) -> asyncio.Semaphore:
+        u = urlparse(url)
+        host = f"{u.scheme}://{u.netloc}"
+        sem = self._sems.get(host)
+        if sem is None:
+            sem = self._sems[host] = asyncio.Semaphore(self.max_per_host)
+        return sem
+
+
+class AsyncCtx:
+    """Estado compartilhado de uma execução assíncrona."""
+
+    def __init__(self, orig: httpx.AsyncClient, dest: httpx.AsyncClient, orig_auth, dest_auth, max_per_host: int):
+        self.orig = orig
+        self.dest = dest
+        self.orig_auth = orig_auth
+        self.dest_auth = dest_auth
+        self.limit = HostLimiter(max_per_host)
+        # origens já concluídas segundo o ledger
+        self.done = ledger_done()
+        # url da pasta -> Task que a garante (cada pasta é verificada/criada uma única vez)
+        self.folders = {}
+
+    async def request(self, client: httpx.AsyncClient, method: str, url: str, **kw) -> httpx.Response:
+        """Requisição com vaga do host, registrada em METRICS como no http_client."""
+        role = "orig" if client is self.orig else "dest"
+        content = kw.get("content")
+        bytes_out = len(content) if isinstance(content, (bytes, str)) else 0
+        async with self.limit(url):
+            t0 = time.perf_counter()
+            try:
+                r = await client.request(method, url, **kw)
+            except Exception:
+                METRICS.http(role, method, time.perf_counter() - t0, 0, bytes_out, 0)
+                raise
+            METRICS.http(role, method, time.perf_counter() - t0, r.status_code, bytes_out, len(r.content))
+            return r
+
+    async def get(self, client: httpx.AsyncClient, url: str, **kw) -> httpx.Response:
+        return await self.request(client, "GET", url, **kw)
+
+    async def post(self, client: httpx.AsyncClient, url: str, **kw) -> httpx.Response:
+        return await self.request(client, "POST", url, **kw)
+
+
+def httpx_verify():
+    if isinstance(SSL_VERIFY, str):
+        return ssl.create_default_context(cafile=SSL_VERIFY)
+    return SSL_VERIFY
+
+# =========================
+# DESTINO
+# =========================
+
+async def dest_exists(ctx: AsyncCtx, url: str) -> bool:
+    wanted = normalize_url(url)
+    try:
+        r = await ctx.get(ctx.dest, wanted, auth=ctx.dest_auth, headers={"Accept": "application/json"},
+                          follow_redirects=True)
+        if r.status_code != 200:
+            return False
+        ctype = (r.headers.get("Content-Type") or "").lower()
+        if "application/json" not in ctype:
+            return False
+        data = r.json()
+        returned_id = normalize_url(data.get("@id", ""))
+        if not returned_id or not data.get("@type"):
+            return False
+        return returned_id == wanted
+    except Exception:
+        return False
+
+
+async def dest_file_size(ctx: AsyncCtx, url: str):
+    """
+    Como bulk1.dest_file_size: None se o File não existe; 0 se ficou vazio (TUS
+    não terminou); RuntimeError se o caminho é de outro tipo.
+    """
+    wanted = normalize_url(url)
+    try:
+        r = await ctx.get(ctx.dest, wanted, auth=ctx.dest_auth, headers={"Accept": "application/json"},
+                          follow_redirects=True)
+        if r.status_code != 200 or "application/json" not in (r.headers.get("Content-Type") or "").lower():
+            return None
+        data = r.json()
+        if not data.get("@type") or normalize_url(data.get("@id", "")) != wanted:
+            return None
+    except Exception:
+        return None
+    if data.get("@type") != "File":
+        raise RuntimeError(f"Destino {wanted} já existe como {data.get('@type')} (esperado File)")
+    return int((data.get("file") or {}).get("size") or 0)
+
+
+async def dest_tus_fill(ctx: AsyncCtx, file_url: str, blob: bytes, filename: str, ctype: str) -> None:
+    """Conteúdo do File por @tus-replace (uploads.tus_fill numa thread, com uma vaga do host)."""
+    async with ctx.limit(file_url):
+        await asyncio.to_thread(
+            lambda: tus_fill(thread_sessions()[1], file_url, blob_chunks(blob, UPLOAD_CHUNK_SIZE), len(blob),
+                             filename, ctype, ctx.dest_auth, TIMEOUT, SSL_VERIFY)
+        )
+
+
+async def dest_get_type(ctx: AsyncCtx, url: str):
+    r = await ctx.get(ctx.dest, url.rstrip("/"), auth=ctx.dest_auth, headers={"Accept": "application/json"})
+    if r.status_code == 404:
+        return None
+    r.raise_for_status()
+    return r.json().get("@type")
+
+
+async def dest_post_content(ctx: AsyncCtx, parent_url: str, payload: dict, what: str, body: bytes = None) -> bool:
+    """POST de criação; body = corpo já serializado (blobs: montado fora do event loop)."""
+    r = await ctx.post(ctx.dest, parent_url.rstrip("/"), auth=ctx.dest_auth, headers=JSON_HEADERS,
+                       content=json.dumps(payload) if body is None else body)
+    if r.status_code in (200, 201):
+        return True
+    if r.status_code == 409:
+        return False
+    if r.status_code == 400 and "already in use" in (r.text or ""):
+        return False
+    if r.status_code == 404:
+        PATH_CACHE.invalidate(parent_url)
+    raise RuntimeError(f"POST {parent_url} ({what}) -> {r.status_code} {r.text}")
+
+
+async def dest_create_folder(ctx: AsyncCtx, parent_url, folder_id, title):
+    payload = {"@type": "Folder", "id": folder_id, "title": title or folder_id}
+    created = await dest_post_content(ctx, parent_url, payload, f"Folder id={folder_id}")
+    PATH_CACHE.add(parent_url.rstrip("/") + "/" + folder_id)
+    return created
+
+
+async def ensure_folder(ctx: AsyncCtx, folder_url: str, root_url: str):
+    """Garante UMA pasta (e, antes, o pai dela). Concorrentes aguardam a mesma Task."""
+    folder_url = normalize_url(folder_url)
+    if len(folder_url) <= len(normalize_url(root_url)):
+        return
+    task = ctx.folders.get(folder_url)
+    if task is None:
+        task = ctx.folders[folder_url] = asyncio.ensure_future(_create_folder_once(ctx, folder_url, root_url))
+    try:
+        await task
+    except Exception:
+        # falha não fica memorizada: o próximo filho tenta a pasta de novo
+        if ctx.folders.get(folder_url) is task:
+            del ctx.folders[folder_url]
+        raise
+
+
+async def _create_folder_once(ctx: AsyncCtx, folder_url: str, root_url: str):
+    if folder_url in PATH_CACHE:
+        return
+    parent_url, seg = parent_and_id(folder_url)
+    await ensure_folder(ctx, parent_url, root_url)
+    if await dest_exists(ctx, folder_url):
+        PATH_CACHE.add(folder_url)
+    else:
+        await dest_create_folder(ctx, parent_url, seg, seg)
+
+
+async def ensure_dest_folder_chain(ctx: AsyncCtx, dest_root_url: str, full_dest_url: str):
+    """Mesmas validações da versão síncrona; as pastas são garantidas via ensure_folder."""
+    root_base, root_path = split_base_and_path(dest_root_url)
+    dest_base, dest_path = split_base_and_path(full_dest_url)
+
+    if root_base != dest_base:
+        raise ValueError(f"Destino fora do host esperado. root={root_base} dest={dest_base}")
+
+    parent_path, _sep, _leaf = dest_path.rpartition("/")
+    if not parent_path:
+        parent_path = "/"
+
+    rp = root_path.rstrip("/")
+    if not parent_path.startswith(rp):
+        raise ValueError(f"Destino fora do root. parent_path={parent_path} root_path={rp}")
+
+    if not parent_path[len(rp):].strip("/"):
+        return
+    await ensure_folder(ctx, dest_base + parent_path, dest_root_url)
+
+# =========================
+# ORIGEM
+# =========================
+
+async def call_zope_method_text(ctx: AsyncCtx, obj_url: str, method_name: str) -> str:
+    url = obj_url.rstrip("/") + "/" + method_name
+    r = await ctx.get(ctx.orig, url, auth=ctx.orig_auth, follow_redirects=True)
+    r.raise_for_status()
+    return r.text
+
+
+async def fetch_origin_title(ctx: AsyncCtx, obj_url: str, fallback: str = "") -> str:
+    try:
+        meta = parse_metadados_text(await call_zope_method_text(ctx, obj_url, ORIG_METHOD_META))
+        titulo = (meta.get("titulo") or "").strip()
+        if titulo:
+            return titulo
+    except Exception:
+        pass
+    return fallback
+
+# =========================
+# MIGRAÇÃO
+# =========================
+
+async def migrate_folder(ctx: AsyncCtx, row: Row):
+    with METRICS.phase("cadeia de pastas"):
+        await ensure_dest_folder_chain(ctx, DEST_ROOT_URL, row.url_destino)
+
+    if row.url_destino in PATH_CACHE or await dest_exists(ctx, row.url_destino):
+        PATH_CACHE.add(row.url_destino)
+        return "exists"
+
+    parent_url, folder_id = parent_and_id(row.url_destino)
+    original_title = await fetch_origin_title(ctx, row.url_origem, fallback=folder_id)
+    await dest_create_folder(ctx, parent_url, folder_id, original_title)
+    return "created"
+
+
+async def migrate_pagina(ctx: AsyncCtx, row: Row):
+    if await dest_exists(ctx, row.url_destino):
+        return "exists"
+
+    with METRICS.phase("cadeia de pastas"):
+        await ensure_dest_folder_chain(ctx, DEST_ROOT_URL, row.url_destino)
+
+    with METRICS.phase("origem pagina"):
+        meta_txt, body_txt = await asyncio.gather(
+            call_zope_method_text(ctx, row.url_origem, ORIG_METHOD_META),
+            call_zope_method_text(ctx, row.url_origem, ORIG_METHOD_BODY),
+        )
+    meta = parse_metadados_text(meta_txt)
+
+    parent_url, doc_id = parent_and_id(row.url_destino)
+    payload = {
+        "@type": "Document",
+        "id": doc_id,
+        "title": meta.get("titulo", "") or doc_id,
+        "description": meta.get("descricao", "") or "",
+        "text": {"data": body_txt or "", "content-type": "text/html"},
+    }
+    if meta.get("subject"):
+        payload["subject"] = meta["subject"]
+
+    created = await dest_post_content(ctx, parent_url, payload, f"Document id={doc_id}")
+    return "created" if created else "exists"
+
+
+async def migrate_arquivo(ctx: AsyncCtx, row: Row, info: dict = None):
+    size = await dest_file_size(ctx, row.url_destino)
+    if size:
+        return "exists"
+
+    with METRICS.phase("download arquivo"):
+        r = await ctx.get(ctx.orig, row.url_origem, auth=ctx.orig_auth, follow_redirects=True)
+    r.raise_for_status()
+    if info is not None:
+        info.update(origin_validators(r.headers))
+    blob = r.content
+    ctype = r.headers.get("Content-Type", "application/octet-stream")
+    filename = guess_filename(r, row.url_origem)
+
+    parent_url, file_id = parent_and_id(row.url_destino)
+
+    with METRICS.phase("cadeia de pastas"):
+        await ensure_dest_folder_chain(ctx, DEST_ROOT_URL, row.url_destino)
+
+    parent_type = await dest_get_type(ctx, parent_url)
+    if parent_type and parent_type != "Folder":
+        pparent_url, pid = parent_and_id(parent_url)
+        fallback_id = pid + "-files"
+        fallback_url = pparent_url.rstrip("/") + "/" + fallback_id
+        await ensure_folder(ctx, fallback_url, DEST_ROOT_URL)
+        parent_url = fallback_url
+
+    with METRICS.phase("titulo origem"):
+        original_title = await fetch_origin_title(ctx, row.url_origem, fallback=filename or file_id)
+
+    file_url = parent_url.rstrip("/") + "/" + file_id
+    if size is None and normalize_url(file_url) != normalize_url(row.url_destino):
+        size = await dest_file_size(ctx, file_url)  # já criado sob o fallback "-files"
+    if size is not None and (size or not blob):
+        return "exists"
+
+    if info is not None:
+        info["dest_id"] = file_url
+        info["bytes"] = len(blob)
+        info["sha256"] = await asyncio.to_thread(lambda b: hashlib.sha256(b).hexdigest(), blob)
+
+    filename = filename or file_id
+    ctype = ctype or "application/octet-stream"
+    if size == 0:
+        # File vazio de um run que caiu entre a criação e o TUS: preenche em vez de dar "existe"
+        with METRICS.phase("substituir arquivo"):
+            await dest_tus_fill(ctx, file_url, blob, filename, ctype)
+        return "updated"
+
+    payload = {
+        "@type": "File",
+        "id": file_id,
+        "title": original_title or filename or file_id,
+        "file": {
+            "data": BASE64,
+            "encoding": "base64",
+            "filename": filename,
+            "content-type": ctype,
+        },
+    }
+    if use_tus(len(blob), UPLOAD_TUS_MIN_BYTES):
+        # criado vazio; os bytes vão crus por TUS
+        del r
+        created = await dest_post_content(ctx, parent_url, payload, f"File id={file_id}",
+                                          body=json_body(payload, b"", False))
+        if created:
+            with METRICS.phase("criar arquivo tus"):
+                await dest_tus_fill(ctx, file_url, blob, filename, ctype)
+        return "created" if created else "exists"
+
+    # base64 + JSON numa thread: o event loop segue atendendo as outras linhas
+    with METRICS.phase("base64"):
+        body = await asyncio.to_thread(json_body, payload, blob, False)
+    del blob, r  # só o corpo fica vivo até o POST
+    created = await dest_post_content(ctx, parent_url, payload, f"File id={file_id}", body=body)
+    return "created" if created else "exists"
+
+# =========================
+# EXECUÇÃO
+# =========================
+
+async def migrate_row(ctx: AsyncCtx, idx: int, total: int, row: Row, counters: dict):
+    """Migra uma linha; retorna o status, ou None se falhou ou foi pulada."""
+    if row.url_origem in ctx.done:
+        counters["ok"] += 1
+        print(f"[{idx}/{total}] OK {row.tipo} -> ledger :: {row.url_destino}")
+        return "ledger"
+
+    info = {}
+    try:
+        if row.tipo == "folder":
+            with METRICS.phase("item pasta"):
+                st = await migrate_folder(ctx, row)
+        elif row.tipo in ("pagina", "document", "page"):
+            with METRICS.phase("item pagina"):
+                st = await migrate_pagina(ctx, row)
+        elif row.tipo in ("arquivo", "file"):
+            with METRICS.phase("item arquivo"):
+                st = await migrate_arquivo(ctx, row, info)
+        else:
+            counters["skip"] += 1
+            print(f"[{idx}/{total}] SKIP tipo={row.tipo} :: {row.url_origem}")
+            return
+
+        counters["ok"] += 1
+        print(f"[{idx}/{total}] OK {row.tipo} -> {st} :: {row.url_destino}")
+        ledger_record(row, st, info)
+        return st
+
+    except Exception as e:
+        counters["fail"] += 1
+        print(f"[{idx}/{total}] FAIL {row.tipo} :: {row.url_origem} -> {row.url_destino}", file=sys.stderr)
+        print(f"  ERRO: {e}", file=sys.stderr)
+        ledger_record(row, "error", info, erro=str(e))
+
+
+async def run_rows(rows: list, orig_auth, dest_auth, max_per_host: int) -> dict:
+    counters = {"ok": 0, "skip": 0, "fail": 0}
+    total = len(rows)
+    indexed = list(enumerate(rows, start=1))
+
+    verify = httpx_verify()
+    timeout = httpx.Timeout(TIMEOUT)
+    limits = httpx.Limits(max_connections=None, max_keepalive_connections=max_per_host * 2)
+
+    async with httpx.AsyncClient(verify=verify, timeout=timeout, limits=limits) as orig, \
+               httpx.AsyncClient(verify=verify, timeout=timeout, limits=limits) as dest:
+        ctx = AsyncCtx(orig, dest, orig_auth, dest_auth, max_per_host)
+
+        # 1) Pastas do CSV por profundidade: garante o título original antes de
+        #    qualquer filho criar a pasta com o título genérico (= id).
+        folders = [(i, r) for i, r in indexed if r.tipo == "folder"]
+        by_depth = {}
+        for i, r in folders:
+            depth = len(split_base_and_path(r.url_destino)[1].strip("/").split("/"))
+            by_depth.setdefault(depth, []).append((i, r))
+        for depth in sorted(by_depth):
+            results = await asyncio.gather(*(migrate_row(ctx, i, total, r, counters) for i, r in by_depth[depth]))
+            for (_i, r), st in zip(by_depth[depth], results):
+                if st is None:
+                    continue  # falhou: os filhos verificam/criam a pasta via ensure_folder
+                done = asyncio.get_running_loop().create_future()
+                done.set_result(None)
+                ctx.folders.setdefault(normalize_url(r.url_destino), done)
+
+        # 2) Demais linhas: workers puxando de um iterador comum limitam as linhas em voo
+        others = iter([(i, r) for i, r in indexed if r.tipo != "folder"])
+
+        async def worker():
+            for i, r in others:
+                await migrate_row(ctx, i, total, r, counters)
+
+        await asyncio.gather(*(worker() for _ in range(ROWS_PER_HOST_SLOT * max(1, max_per_host))))
+
+    return counters
+
+
+def main_async(rows: list, orig_auth, dest_auth, max_per_host: int) -> dict:
+    return asyncio.run(run_rows(rows, orig_auth, dest_auth, max_per_host))
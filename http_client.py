@@ -0,0 +1,231 @@
+# -*- coding: utf-8 -*-
+
+"""
+Fábrica de sessões HTTP compartilhada pelos migradores.
+
+- pool de conexões configurável por papel (origem/destino)
+- keep-alive: TCP keepalive no socket, para conexões ociosas não caírem no meio do run
+- Retry (urllib3) só para métodos idempotentes (GET/HEAD): erros de conexão e 502/503/504
+- estatística de reuso de conexões (quantas conexões novas x quantas requisições)
+- toda requisição é registrada em metrics.METRICS (latência, status, bytes)
+- sessões de destino passam pelo throttle adaptativo (throttle.py), salvo <prefixo>THROTTLE=off
+- sessões de origem podem ler/gravar o cache em disco (origin_cache.py, <prefixo>ORIGIN_CACHE_DIR)
+  e exportar para / importar de um snapshot (snapshot.py, ligado pelo main() do script)
+
+Configuração por env, com o prefixo do script (vazio no migrar_noticias, "PLONE_"
+no bulk1/municipios) e o papel ORIG/DEST:
+
+  <prefixo>HTTP_<PAPEL>_POOL_CONNECTIONS  hosts mantidos no pool       (default 10)
+  <prefixo>HTTP_<PAPEL>_POOL_MAXSIZE      conexões por host             (default 10)
+  <prefixo>HTTP_<PAPEL>_RETRIES           tentativas extras em GET/HEAD (default 3)
+  <prefixo>HTTP_<PAPEL>_BACKOFF           backoff_factor do Retry       (default 0.5)
+  <prefixo>HTTP_KEEPALIVE                 0 desliga o TCP keepalive     (default 1)
+"""
+
+import os
+import socket
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3 import HTTPResponse
+from urllib3.connection import HTTPConnection
+from urllib3.util.retry import Retry
+
+from metrics import METRICS
+from origin_cache import CACHEABLE_STATUS, CHUNK_SIZE, cacheable_request, print_cache_stats, shared_origin_cache
+from snapshot import active_snapshot, print_snapshot_stats, recordable_request
+from throttle import retry_after_seconds, shared_throttle
+
+RETRY_STATUS = (502, 503, 504)
+IDEMPOTENT_METHODS = frozenset({"GET", "HEAD"})
+
+# referência forte: as sessões thread-local morrem com as threads do pool,
+# mas os números de reuso precisam sobreviver até o relatório do fim
+_SESSIONS = []
+_SESSIONS_LOCK = threading.Lock()
+
+
+def _env_int(name: str, default: int) -> int:
+    return int(os.getenv(name, str(default)))
+
+
+def keepalive_socket_options() -> list:
+    opts = list(HTTPConnection.default_socket_options) + [(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)]
+    # Linux: começa a sondar após 60s ociosos, a cada 15s, desiste após 4 falhas
+    for name, value in (("TCP_KEEPIDLE", 60), ("TCP_KEEPINTVL", 15), ("TCP_KEEPCNT", 4)):
+        if hasattr(socket, name):
+            opts.append((socket.IPPROTO_TCP, getattr(socket, name), value))
+    return opts
+
+
+class KeepAliveAdapter(HTTPAdapter):
+    """HTTPAdapter com socket_options e, opcionalmente, throttle (destino), cache em disco e snapshot (origem)."""
+
+    def __init__(self, *args, socket_options=None, throttle=None, cache=None, snapshot=None, role: str = "",
+                 **kwargs):
+        self._socket_options = socket_options
+        self.throttle = throttle
+        self.cache = cache
+        self.snapshot = snapshot
+        self.role = role
+        super().__init__(*args, **kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        if self._socket_options:
+            kwargs["socket_options"] = self._socket_options
+        super().init_poolmanager(*args, **kwargs)
+
+    def send(self, request, *args, **kwargs):
+        if self.snapshot is not None and request.method in ("GET", "HEAD"):
+            return self._send_snapshot(request, *args, **kwargs)
+        return self._send_cached(request, *args, **kwargs)
+
+    def _send_snapshot(self, request, *args, **kwargs):
+        entry = self.snapshot.get(request.url)
+        if entry is not None:
+            body = self.snapshot.open_body(entry) if request.method == "GET" else b""
+            return self._file_response(request, entry["status"], entry["headers"], body, entry["size"])
+        if self.snapshot.importing:
+            raise requests.exceptions.ConnectionError(
+                f"URL fora do snapshot {self.snapshot.dir}: {request.url}", request=request)
+
+        resp = self._send_cached(request, *args, **kwargs)
+        if not recordable_request(request) or resp.status_code >= 500:
+            return resp
+        with resp:
+            entry = self.snapshot.record(request.url, resp.status_code, resp.headers,
+                                         resp.raw.stream(CHUNK_SIZE, decode_content=True))
+        return self._file_response(request, entry["status"], entry["headers"],
+                                   self.snapshot.open_body(entry), entry["size"])
+
+    def _send_cached(self, request, *args, **kwargs):
+        if self.cache is None or not cacheable_request(request):
+            return self._send(request, *args, **kwargs)
+
+        hit = self.cache.get(request.url)
+        if hit is not None:
+            status, headers, path, size = hit
+            return self._file_response(request, status, headers, open(path, "rb") if request.method == "GET" else b"",
+                                       size)
+        resp = self._send(request, *args, **kwargs)
+        if request.method != "GET" or resp.status_code not in CACHEABLE_STATUS:
+            return resp
+        # corpo vai para o disco inteiro aqui (mesmo com stream=True) e é relido de lá
+        with resp:
+            path, size = self.cache.store(request.url, resp.status_code, resp.headers,
+                                          resp.raw.stream(CHUNK_SIZE, decode_content=True))
+        return self._file_response(request, resp.status_code, resp.headers, open(path, "rb"), size)
+
+    def _file_response(self, request, status: int, headers, body, size: int):
+        """Resposta montada a partir de um corpo local (arquivo aberto, mmap ou b"" no HEAD)."""
+        headers = {k: v for k, v in headers.items() if k.lower() not in ("content-encoding", "transfer-encoding")}
+        headers["Content-Length"] = str(size)
+        raw = HTTPResponse(
+            body=body,
+            headers=headers,
+            status=status,
+            preload_content=False,
+            decode_content=False,
+            request_method=request.method,
+            request_url=request.url,
+        )
+        return self.build_response(request, raw)
+
+    def _send(self, request, *args, **kwargs):
+        if self.throttle is not None:
+            self.throttle.acquire()
+        t0 = time.monotonic()
+        try:
+            resp = super().send(request, *args, **kwargs)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+            elapsed = time.monotonic() - t0
+            METRICS.http(self.role, request.method, elapsed, 0, body_length(request), 0)
+            if self.throttle is not None:
+                self.throttle.observe(elapsed, failed=True, bytes_sent=body_length(request))
+            raise
+        elapsed = time.monotonic() - t0
+        # corpo da resposta ainda não foi lido aqui: conta pelo Content-Length
+        METRICS.http(self.role, request.method, elapsed, resp.status_code, body_length(request),
+                     int(resp.headers.get("Content-Length") or 0))
+        if self.throttle is not None:
+            self.throttle.observe(
+                elapsed,
+                status=resp.status_code,
+                retry_after=retry_after_seconds(resp.headers.get("Retry-After")) if resp.status_code in (429, 503) else 0.0,
+                bytes_sent=body_length(request),
+            )
+        return resp
+
+
+def body_length(request) -> int:
+    body = request.body
+    if isinstance(body, (bytes, str)):
+        return len(body)
+    return int(request.headers.get("Content-Length") or 0)
+
+
+def make_session(role: str, prefix: str = "") -> requests.Session:
+    """Sessão com pool/retry/keep-alive do papel ("orig" ou "dest"); "dest" com throttle, "orig" com cache."""
+    key = f"{prefix}HTTP_{role.upper()}_"
+    retry = Retry(
+        total=_env_int(key + "RETRIES", 3),
+        backoff_factor=float(os.getenv(key + "BACKOFF", "0.5")),
+        status_forcelist=RETRY_STATUS,
+        allowed_methods=IDEMPOTENT_METHODS,
+        raise_on_status=False,  # esgotado, devolve a última resposta: quem chama testa o status
+    )
+    keepalive = os.getenv(f"{prefix}HTTP_KEEPALIVE", "1").strip().lower() not in ("0", "false", "no")
+    adapter = KeepAliveAdapter(
+        pool_connections=_env_int(key + "POOL_CONNECTIONS", 10),
+        pool_maxsize=_env_int(key + "POOL_MAXSIZE", 10),
+        max_retries=retry,
+        socket_options=keepalive_socket_options() if keepalive else None,
+        throttle=shared_throttle(prefix) if role == "dest" else None,
+        cache=shared_origin_cache(prefix) if role == "orig" else None,
+        snapshot=active_snapshot(prefix) if role == "orig" else None,
+        role=role,
+    )
+    sess = requests.Session()
+    sess.mount("http://", adapter)
+    sess.mount("https://", adapter)
+    with _SESSIONS_LOCK:
+        _SESSIONS.append(sess)
+    return sess
+
+
+def connection_stats() -> dict:
+    """{host: {"conexoes": n, "requisicoes": n}} somando todas as sessões criadas aqui."""
+    stats = {}
+    with _SESSIONS_LOCK:
+        sessions = list(_SESSIONS)
+    for sess in sessions:
+        seen = set()
+        for adapter in sess.adapters.values():
+            if id(adapter) in seen:
+                continue
+            seen.add(id(adapter))
+            pools = adapter.poolmanager.pools  # RecentlyUsedContainer: keys() é a única iteração segura
+            for pool_key in pools.keys():
+                pool = pools.get(pool_key)
+                if pool is None:
+                    continue
+                host = f"{pool.host}:{pool.port}" if pool.port else pool.host
+                st = stats.setdefault(host, {"conexoes": 0, "requisicoes": 0})
+                st["conexoes"] += pool.num_connections
+                st["requisicoes"] += pool.num_requests
+    return stats
+
+
+def print_connection_stats() -> None:
+    print_cache_stats()
+    print_snapshot_stats()
+    stats = connection_stats()
+    if not stats:
+        return
+    print("\nConexões HTTP (novas / requisições / reuso):")
+    for host, st in sorted(stats.items()):
+        reqs = st["requisicoes"]
+        reuse = (1 - st["conexoes"] / reqs) * 100 if reqs else 0.0
+        print(f"  {host:<40} {st['conexoes']:>6} / {reqs:>7}  {reuse:5.1f}%")
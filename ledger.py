@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+
+"""
+Ledger (SQLite) de migração compartilhado pelos três migradores.
+
+Uma linha por (script, URL de origem) com: destino, @id criado, status,
+datas, bytes transferidos e sha256 do conteúdo. Permite que um novo run pule
+o que já terminou com uma consulta local, sem tocar na rede.
+
+Status usados: "created", "exists", "updated", "unchanged" (todos = concluído)
+e "error". "updated"/"unchanged" vêm da sincronização incremental do bulk1
+(--sync), que guarda também ETag, Last-Modified e Content-Length da origem
+para as requisições condicionais do run seguinte.
+"""
+
+import sqlite3
+import threading
+from datetime import datetime, timezone
+
+DONE_STATUSES = ("created", "exists", "updated", "unchanged")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    script        TEXT NOT NULL,
+    origem        TEXT NOT NULL,
+    destino       TEXT,
+    dest_id       TEXT,
+    tipo          TEXT,
+    status        TEXT NOT NULL,
+    bytes         INTEGER,
+    sha256        TEXT,
+    etag          TEXT,
+    last_modified TEXT,
+    length        INTEGER,
+    erro          TEXT,
+    criado_em     TEXT NOT NULL,
+    atualizado_em TEXT NOT NULL,
+    PRIMARY KEY (script, origem)
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (script, status);
+CREATE INDEX IF NOT EXISTS items_sha256 ON items (sha256);
+"""
+
+# colunas acrescentadas depois da primeira versão (ledgers antigos recebem ALTER TABLE)
+LATER_COLUMNS = {"etag": "TEXT", "last_modified": "TEXT", "length": "INTEGER"}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+
+class Ledger:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+        cols = {r["name"] for r in self._conn.execute("PRAGMA table_info(items)")}
+        for name, decl in LATER_COLUMNS.items():
+            if name not in cols:
+                self._conn.execute(f"ALTER TABLE items ADD COLUMN {name} {decl}")
+
+    def record(self, script: str, origem: str, status: str, destino: str = "", dest_id: str = "",
+               tipo: str = "", bytes_: int = None, sha256: str = None, erro: str = "",
+               etag: str = None, last_modified: str = None, length: int = None) -> None:
+        now = _now()
+        with self._lock:
+            self._conn.execute(
+                """
+                INSERT INTO items (script, origem, destino, dest_id, tipo, status, bytes, sha256, erro,
+                                   etag, last_modified, length, criado_em, atualizado_em)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (script, origem) DO UPDATE SET
+                    destino = COALESCE(NULLIF(excluded.destino, ''), destino),
+                    dest_id = COALESCE(NULLIF(excluded.dest_id, ''), dest_id),
+                    tipo = COALESCE(NULLIF(excluded.tipo, ''), tipo),
+                    status = excluded.status,
+                    bytes = COALESCE(excluded.bytes, bytes),
+                    sha256 = COALESCE(excluded.sha256, sha256),
+                    etag = COALESCE(excluded.etag, etag),
+                    last_modified = COALESCE(excluded.last_modified, last_modified),
+                    length = COALESCE(excluded.length, length),
+                    erro = excluded.erro,
+                    atualizado_em = excluded.atualizado_em
+                """,
+                (script, origem, destino, dest_id, tipo, status, bytes_, sha256, erro,
+                 etag, last_modified, length, now, now),
+            )
+
+    def get(self, script: str, origem: str):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT * FROM items WHERE script = ? AND origem = ?", (script, origem)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def done(self, script: str) -> set:
+        """URLs de origem já concluídas pelo script (uma única consulta)."""
+        marks = ",".join("?" for _ in DONE_STATUSES)
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT origem FROM items WHERE script = ? AND status IN ({marks})",
+                (script, *DONE_STATUSES),
+            ).fetchall()
+        return {r["origem"] for r in rows}
+
+    def summary(self, script: str = "") -> dict:
+        sql = "SELECT status, COUNT(*) AS n, COALESCE(SUM(bytes), 0) AS b FROM items"
+        args = ()
+        if script:
+            sql += " WHERE script = ?"
+            args = (script,)
+        with self._lock:
+            rows = self._conn.execute(sql + " GROUP BY status", args).fetchall()
+        return {r["status"]: {"itens": r["n"], "bytes": r["b"]} for r in rows}
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def open_ledger(path: str):
+    """None quando o ledger está desligado (path vazio)."""
+    path = (path or "").strip()
+    return Ledger(path) if path else None
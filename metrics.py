@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""
+Instrumentação dos migradores: tempo por fase, requisições HTTP e bytes.
+
+- METRICS.phase("nome") mede um trecho (context manager); @METRICS.timed("nome")
+  mede cada chamada de uma função
+- http_client registra cada requisição (papel + método, latência, bytes)
+- no fim: report() imprime p50/p95/p99 por fase; export(path) grava JSON
+  (.json) ou texto no formato do Prometheus (qualquer outra extensão)
+
+Os tempos vão para um histograma de buckets logarítmicos (passo de 5%), então
+a memória não cresce com o número de itens; os percentis têm erro de até ~5%.
+"""
+
+import functools
+import json
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+_GROWTH = 1.05
+_MIN_SECONDS = 1e-4  # tudo abaixo de 0,1 ms cai no primeiro bucket
+
+
+class Histogram:
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        idx = 0 if seconds <= _MIN_SECONDS else int(math.log(seconds / _MIN_SECONDS, _GROWTH)) + 1
+        self.buckets[idx] = self.buckets.get(idx, 0) + 1
+        self.count += 1
+        self.sum += seconds
+        self.max = max(self.max, seconds)
+
+    def quantile(self, q: float) -> float:
+        if not self.count:
+            return 0.0
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for idx in sorted(self.buckets):
+            seen += self.buckets[idx]
+            if seen >= rank:
+                return min(self.max, _MIN_SECONDS * _GROWTH ** idx)
+        return self.max
+
+
+class Metrics:
+    QUANTILES = (0.5, 0.95, 0.99)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.phases = {}
+        self.requests = {}
+        self.started = time.time()
+
+    def observe(self, name: str, seconds: float) -> None:
+        with self._lock:
+            h = self.phases.get(name)
+            if h is None:
+                h = self.phases[name] = Histogram()
+            h.add(seconds)
+
+    @contextmanager
+    def phase(self, name: str):
+        t0 = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - t0)
+
+    def timed(self, name: str):
+        """Decorator: mede cada chamada da função como a fase `name`."""
+        def deco(fn):
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return deco
+
+    def http(self, role: str, method: str, seconds: float, status: int, bytes_out: int, bytes_in: int) -> None:
+        key = f"{role} {method}"
+        self.observe(f"http {key}", seconds)
+        with self._lock:
+            st = self.requests.setdefault(key, {"requisicoes": 0, "erros": 0, "bytes_enviados": 0, "bytes_recebidos": 0})
+            st["requisicoes"] += 1
+            st["erros"] += 1 if (not status or status >= 400) else 0
+            st["bytes_enviados"] += bytes_out or 0
+            st["bytes_recebidos"] += bytes_in or 0
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            phases = {
+                name: {
+                    "n": h.count,
+                    "total_s": round(h.sum, 3),
+                    "max_s": round(h.max, 4),
+                    **{f"p{int(q * 100)}_s": round(h.quantile(q), 4) for q in self.QUANTILES},
+                }
+                for name, h in sorted(self.phases.items())
+            }
+            requests_ = {k: dict(v) for k, v in sorted(self.requests.items())}
+        return {"duracao_s": round(time.time() - self.started, 1), "fases": phases, "http": requests_}
+
+    def report(self) -> None:
+        snap = self.snapshot()
+        if not snap["fases"]:
+            return
+        print(f"\nTempos por fase (run de {snap['duracao_s']}s):")
+        print(f"  {'fase':<28} {'n':>7} {'total s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for name, ph in snap["fases"].items():
+            print(f"  {name:<28} {ph['n']:>7} {ph['total_s']:>9.1f} "
+                  f"{ph['p50_s'] * 1000:>9.1f} {ph['p95_s'] * 1000:>9.1f} {ph['p99_s'] * 1000:>9.1f}")
+        if snap["http"]:
+            print("HTTP (requisições / status >= 400 ou falha / enviados / recebidos):")
+            for key, st in snap["http"].items():
+                print(f"  {key:<28} {st['requisicoes']:>7} {st['erros']:>6} "
+                      f"{human_bytes(st['bytes_enviados']):>10} {human_bytes(st['bytes_recebidos']):>10}")
+
+    def prometheus(self, prefix: str = "migracao") -> str:
+        snap = self.snapshot()
+        lines = [
+            f"# TYPE {prefix}_phase_seconds summary",
+        ]
+        for name, ph in snap["fases"].items():
+            label = name.replace("\\", "\\\\").replace('"', '\\"')
+            for q in self.QUANTILES:
+                lines.append(f'{prefix}_phase_seconds{{phase="{label}",quantile="{q}"}} {ph[f"p{int(q * 100)}_s"]}')
+            lines.append(f'{prefix}_phase_seconds_sum{{phase="{label}"}} {ph["total_s"]}')
+            lines.append(f'{prefix}_phase_seconds_count{{phase="{label}"}} {ph["n"]}')
+        for metric, field in (("http_requests_total", "requisicoes"), ("http_errors_total", "erros"),
+                              ("http_sent_bytes_total", "bytes_enviados"),
+                              ("http_received_bytes_total", "bytes_recebidos")):
+            lines.append(f"# TYPE {prefix}_{metric} counter")
+            for key, st in snap["http"].items():
+                role, method = key.split(" ", 1)
+                lines.append(f'{prefix}_{metric}{{role="{role}",method="{method}"}} {st[field]}')
+        return "\n".join(lines) + "\n"
+
+    def export(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            if path.endswith(".json"):
+                json.dump(self.snapshot(), f, ensure_ascii=False, indent=2)
+            else:
+                f.write(self.prometheus())
+        print(f"Métricas gravadas em {path}")
+
+
+def human_bytes(n: int) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if n < 1024 or unit == "GiB":
+            return f"{n:.0f} {unit}" if unit == "B" else f"{n:.1f} {unit}"
+        n /= 1024
+    return f"{n} B"
+
+
+METRICS = Metrics()
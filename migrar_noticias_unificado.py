@@ -10,6 +10,7 @@ Fluxo:
    - GET <url>/v2_getNoticiasMetadados  (texto chave = valor)
    - GET <url>/v2_getNoticiasCorpo      (HTML)
    - (opcional) GET <url>/v2_getNoticiasImagem (texto em linhas: url, filename, ...)
+   (com --prefetch K essas leituras correm até K notícias à frente da escrita)
 
 3) Cria a notícia no destino conforme caminho:
    /portal/pgr/     -> /o-mpf/unidades/procuradoria-geral-da-republica-pgr/noticias
@@ -24,27 +25,51 @@ Fluxo:
 5) Publica:
    - local=True  -> workflow transition "show"
    - local=False -> workflow transition "publish"
+   (com --defer-publish as transições vão para PUBLISH_STATE_FILE e rodam em lote no fim;
+    --publish-pending executa só o que ficou pendente)
 
-Requisitos: requests, bs4, pillow (para detectar tamanho quando necessário).
+Duas fases (snapshot.py): --snapshot-export DIR faz só as leituras da origem
+(passo 2 e os downloads do passo 4) e grava tudo em DIR; depois
+--snapshot-import DIR roda a migração lendo a origem de DIR, sem rede.
+
+Requisitos: requests, pillow (para detectar tamanho quando necessário). O HTML
+do corpo é lido com o html.parser da biblioteca padrão.
 """
 
 from __future__ import annotations
 
-import base64
+import argparse
 import hashlib
 import json
 import os
+import random
 import re
 import sys
+import threading
 import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from html import escape as html_escape
+from html.parser import HTMLParser
 from typing import Optional
 from urllib.parse import urljoin, urlparse
 
 import requests
 import urllib3
-from bs4 import BeautifulSoup
 from PIL import Image as PILImage
+from PIL import ImageFile
+
+from asset_index import AssetIndex
+from http_client import make_session, print_connection_stats
+from ledger import open_ledger
+from metrics import METRICS, human_bytes
+from path_cache import PathCache
+from payloads import BASE64, close_body, json_body
+from snapshot import use_snapshot
+from state_store import open_state
+from throttle import print_throttle_stats, throttle_enabled
+from uploads import blob_chunks, blob_size, tus_fill, tus_min_bytes, use_tus
 
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
@@ -69,6 +94,9 @@ HEADERS_JSON = {
 HEADERS_ACCEPT = {"Accept": "application/json"}
 
 SLEEP_BETWEEN = float(os.getenv("SLEEP_BETWEEN", "0.05"))
+# THROTTLE=aimd: ritmo adaptativo no destino (throttle.py) no lugar do sleep
+# fixo acima; desligado por padrão (THROTTLE=off usa SLEEP_BETWEEN)
+THROTTLE = throttle_enabled()
 TIMEOUT = int(os.getenv("TIMEOUT", "60"))
 VERIFY_TLS = os.getenv("VERIFY_TLS", "0").strip() not in ("0", "false", "False", "no", "NO")
 
@@ -76,6 +104,64 @@ DRY_RUN = os.getenv("DRY_RUN", "0").strip() in ("1", "true", "True", "yes", "YES
 
 STATE_FILE = os.getenv("STATE_FILE", "import_state.json")
 
+# Backend do estado: "json" (regrava STATE_FILE a cada item) ou
+# "journal" (append-only em STATE_JOURNAL_FILE, compactado a cada STATE_COMPACT_EVERY gravações)
+STATE_BACKEND = os.getenv("STATE_BACKEND", "json")
+STATE_JOURNAL_FILE = os.getenv("STATE_JOURNAL_FILE", "import_state.jsonl")
+STATE_COMPACT_EVERY = int(os.getenv("STATE_COMPACT_EVERY", "5000"))
+STATE_FSYNC = os.getenv("STATE_FSYNC", "0").strip() in ("1", "true", "True", "yes", "YES")
+
+# --retry-failed: tentativas por item e backoff exponencial (segundos) com jitter
+RETRY_MAX_ATTEMPTS = int(os.getenv("RETRY_MAX_ATTEMPTS", "4"))
+RETRY_BASE_DELAY = float(os.getenv("RETRY_BASE_DELAY", "2"))
+RETRY_MAX_DELAY = float(os.getenv("RETRY_MAX_DELAY", "60"))
+
+# Ledger SQLite compartilhado com bulk1/municipios (vazio = desligado)
+LEDGER_FILE = os.getenv("LEDGER_FILE", "")
+LEDGER = open_ledger(LEDGER_FILE)
+LEDGER_SCRIPT = "noticias"
+LEDGER_DONE: set[str] = set()
+
+# Deduplicação global de imagens/arquivos embutidos (por URL de origem e sha256).
+# ASSET_INDEX_FILE persiste o índice em SQLite (pode ser o mesmo arquivo do LEDGER_FILE).
+ASSET_DEDUP = os.getenv("ASSET_DEDUP", "0").strip() in ("1", "true", "True", "yes", "YES")
+ASSET_INDEX_FILE = os.getenv("ASSET_INDEX_FILE", "")
+ASSET_INDEX = AssetIndex(ASSET_INDEX_FILE if ASSET_DEDUP else "")
+
+# Cache (LRU, por run) dos bytes de imagens baixadas: cada URL candidata é baixada no máximo uma vez
+IMAGE_CACHE_MB = int(os.getenv("IMAGE_CACHE_MB", "64"))
+# Para medir tamanho só pelo cabeçalho da imagem (Range / leitura parcial)
+IMAGE_HEADER_BYTES = int(os.getenv("IMAGE_HEADER_BYTES", "65536"))
+
+# Imagens/arquivos embutidos a partir de UPLOAD_TUS_MIN_MB vão por TUS (@tus-replace) em
+# blocos de UPLOAD_CHUNK_SIZE, com retomada; abaixo, base64 no JSON (0 = sempre JSON)
+UPLOAD_TUS_MIN_BYTES = tus_min_bytes("")
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+# Cache de pastas existentes no destino (vazio = só em memória, sem persistir)
+PATH_CACHE_FILE = os.getenv("PATH_CACHE_FILE", "")
+PATH_CACHE = PathCache(PATH_CACHE_FILE)
+
+# Quantidade de notícias migradas em paralelo (1 = sequencial, como antes)
+WORKERS = int(os.getenv("WORKERS", "1"))
+
+# Uma só escrita por notícia: assets baixados antes e HTML final já no POST de criação
+SINGLE_WRITE = os.getenv("SINGLE_WRITE", "0").strip() in ("1", "true", "True", "yes", "YES")
+
+# Publicação adiada: transições ficam num journal e rodam em lote no fim
+# (ou depois, com --publish-pending, p.ex. via cron)
+DEFER_PUBLISH = os.getenv("DEFER_PUBLISH", "0").strip() in ("1", "true", "True", "yes", "YES")
+PUBLISH_STATE_FILE = os.getenv("PUBLISH_STATE_FILE", "publish_pending.jsonl")
+PUBLISH_WORKERS = int(os.getenv("PUBLISH_WORKERS", "4"))
+PUBLISH_QUEUE = None  # JournalStateStore aberto em main() quando usado
+
+# Leitura antecipada da origem (itens à frente do que está sendo gravado); 0 = desligado
+PREFETCH = int(os.getenv("PREFETCH", "0"))
+
+# Snapshot da origem (snapshot.py): diretório a exportar ou do qual importar
+SNAPSHOT_EXPORT = os.getenv("SNAPSHOT_EXPORT", "")
+SNAPSHOT_IMPORT = os.getenv("SNAPSHOT_IMPORT", "")
+
 # Mapeamento de tema (classificacaoNoticia) -> id do vocabulário no destino
 # ORIGEM -> DESTINO (path no destino, sem domínio)
 ORIG_PREFIX_TO_DEST_PATH = {
@@ -93,17 +179,81 @@ ORIG_PREFIX_TO_DEST_PATH = {
 # Utils
 # -------------------------
 
-def load_state() -> dict:
-    if os.path.exists(STATE_FILE):
-        with open(STATE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+def load_state():
+    if STATE_BACKEND.strip().lower() != "journal":
+        return open_state(STATE_FILE, "json")
+
+    first_run = not os.path.exists(STATE_JOURNAL_FILE)
+    state = open_state(STATE_JOURNAL_FILE, "journal", compact_every=STATE_COMPACT_EVERY, fsync=STATE_FSYNC)
+    if first_run and os.path.exists(STATE_FILE):
+        n = state.import_json(STATE_FILE)
+        print(f"Estado: {n} entradas importadas de {STATE_FILE} para {STATE_JOURNAL_FILE}")
+    return state
+
+# -------------------------
+# Concorrência (modo --workers)
+# -------------------------
+
+_CONTAINER_LOCKS: dict[str, threading.Lock] = {}
+_CONTAINER_LOCKS_GUARD = threading.Lock()
+_THREAD_LOCAL = threading.local()
+
+def set_state(state, key: str, value: str) -> None:
+    """Atualiza e grava o estado (os backends de state_store são thread-safe)."""
+    state.set(key, value)
 
-def save_state(state: dict) -> None:
-    tmp = STATE_FILE + ".tmp"
-    with open(tmp, "w", encoding="utf-8") as f:
-        json.dump(state, f, ensure_ascii=False, indent=2)
-    os.replace(tmp, STATE_FILE)
+def resume_key(key: str) -> str:
+    """Chave de estado com a URL da notícia já criada por uma tentativa que falhou depois do POST."""
+    return f"{key}#noticia"
+
+def resumed_news_url(session: requests.Session, state, key: str) -> str:
+    """
+    URL da notícia criada por uma tentativa anterior (falha em assets, PATCH ou
+    publicação), se ela ainda existe no destino; "" para criar do zero.
+    """
+    url = state.get(resume_key(key)) or ""
+    if not url or DRY_RUN:
+        return url
+    r = session.get(url, headers=HEADERS_ACCEPT, auth=AUTH, timeout=TIMEOUT, verify=VERIFY_TLS)
+    return url if r.status_code == 200 else ""
+
+def ledger_record(key: str, status: str, destino: str = "", dest_id: str = "", erro: str = "",
+                  uploads: Optional[list] = None) -> None:
+    """
+    uploads: (tamanho, sha256) de cada blob enviado para a notícia (imagem
+    principal e assets criados), em ordem. No ledger: bytes = soma dos tamanhos;
+    sha256 = sha256 das assinaturas concatenadas (o próprio sha256 se é um só).
+    """
+    bytes_ = sha256 = None
+    if uploads is not None:
+        bytes_ = sum(size for size, _sha in uploads)
+        if len(uploads) == 1:
+            sha256 = uploads[0][1]
+        elif uploads:
+            sha256 = hashlib.sha256("".join(sha for _size, sha in uploads).encode("ascii")).hexdigest()
+    if LEDGER:
+        LEDGER.record(LEDGER_SCRIPT, key, status, destino=destino, dest_id=dest_id, tipo="Noticia",
+                      bytes_=bytes_, sha256=sha256, erro=erro)
+
+def blob_digest(data: bytes) -> tuple[int, str]:
+    with METRICS.phase("sha256"):
+        return len(data), hashlib.sha256(data).hexdigest()
+
+def container_lock(container_url: str) -> threading.Lock:
+    """Lock por container de destino: evita corrida na criação de pastas e de ids."""
+    key = (container_url or "").rstrip("/")
+    with _CONTAINER_LOCKS_GUARD:
+        lock = _CONTAINER_LOCKS.get(key)
+        if lock is None:
+            lock = _CONTAINER_LOCKS[key] = threading.Lock()
+        return lock
+
+def thread_sessions() -> tuple[requests.Session, requests.Session]:
+    """Sessões (origem, destino) próprias de cada thread; requests.Session não é thread-safe."""
+    sessions = getattr(_THREAD_LOCAL, "sessions", None)
+    if sessions is None:
+        sessions = _THREAD_LOCAL.sessions = (make_session("orig"), make_session("dest"))
+    return sessions
 
 def parse_kv_lines(text: str) -> dict:
     meta = {}
@@ -121,8 +271,13 @@ def strip_body_wrappers(html: str) -> str:
 
     # Remove prefixo doctype/html/body (tolerando espaços)
     s = re.sub(r"(?is)^\s*<!DOCTYPE[^>]*>\s*<html[^>]*>\s*<body[^>]*>\s*", "", s)
-    # Remove sufixo </body></html>
-    s = re.sub(r"(?is)\s*</body>\s*</html>\s*$", "", s)
+    # Remove sufixo </body></html> olhando só o fim da string
+    # (equivale a re.sub(r"(?is)\s*</body>\s*</html>\s*$", ...), sem varrer o documento)
+    tail = s.rstrip()
+    if tail[-7:].lower() == "</html>":
+        body_end = tail[:-7].rstrip()
+        if body_end[-7:].lower() == "</body>":
+            s = body_end[:-7]
     return s.strip()
 
 def guess_mime(filename: str) -> str:
@@ -241,6 +396,7 @@ def join_v2_endpoint(news_url: str, endpoint: str) -> str:
 # Plone destination helpers
 # -------------------------
 
+@METRICS.timed("pastas")
 def ensure_path_folders(session: requests.Session, dest_path: str) -> str:
     """Garante que a hierarquia do dest_path exista (criando Folder). Retorna URL completa."""
     dest_path = (dest_path or "").strip()
@@ -250,8 +406,13 @@ def ensure_path_folders(session: requests.Session, dest_path: str) -> str:
     current_url = PLONE_URL
     for part in parts:
         next_url = f"{current_url}/{part}"
+        if next_url in PATH_CACHE:
+            current_url = next_url
+            continue
+
         r = session.get(next_url, headers=HEADERS_ACCEPT, auth=AUTH, timeout=TIMEOUT, verify=VERIFY_TLS)
         if r.status_code == 200:
+            PATH_CACHE.add(next_url)
             current_url = next_url
             continue
 
@@ -261,11 +422,18 @@ def ensure_path_folders(session: requests.Session, dest_path: str) -> str:
 
         payload = {"@type": "Folder", "id": part, "title": part}
         pr = session.post(current_url, headers=HEADERS_JSON, auth=AUTH, json=payload, timeout=TIMEOUT, verify=VERIFY_TLS)
-        if pr.status_code not in (200, 201):
+        # Outro worker pode ter criado a mesma pasta entre o GET e o POST
+        already = pr.status_code == 409 or (pr.status_code == 400 and "already in use" in (pr.text or ""))
+        if pr.status_code not in (200, 201) and not already:
+            if pr.status_code == 404:
+                # pai estava no cache mas sumiu no destino
+                PATH_CACHE.invalidate(current_url)
             raise RuntimeError(f"Não foi possível criar pasta '{part}' em {current_url}: {pr.status_code} {pr.text}")
+        PATH_CACHE.add(next_url)
         current_url = next_url
     return f"{PLONE_URL}/{dest_path.lstrip('/')}"
 
+@METRICS.timed("criar noticia")
 def create_news_item(session: requests.Session, container_url: str, meta: dict, text_html: str, image_info: dict) -> dict:
     payload = {
         "@type": "Noticia",
@@ -291,22 +459,31 @@ def create_news_item(session: requests.Session, container_url: str, meta: dict,
     # Remove chaves None para não causar validação ruim
     payload = {k: v for k, v in payload.items() if v is not None}
 
-    if image_info.get("data_b64") and image_info.get("filename"):
+    image_data = image_info.get("data") if image_info.get("filename") else None
+    if image_data:
         payload["image"] = {
             "filename": image_info["filename"],
             "content-type": guess_mime(image_info["filename"]),
-            "data": image_info["data_b64"],
+            "data": BASE64,
             "encoding": "base64",
         }
 
     if DRY_RUN:
         return {"@id": f"{container_url.rstrip('/')}/{meta.get('id','fake')}"}
 
-    r = session.post(container_url, headers=HEADERS_JSON, auth=AUTH, json=payload, timeout=TIMEOUT, verify=VERIFY_TLS)
+    with METRICS.phase("base64"):
+        body = json_body(payload, image_data) if image_data else json.dumps(payload)
+    try:
+        r = session.post(container_url, headers=HEADERS_JSON, auth=AUTH, data=body, timeout=TIMEOUT, verify=VERIFY_TLS)
+    finally:
+        close_body(body)
+    if r.status_code == 404:
+        PATH_CACHE.invalidate(container_url)
     if r.status_code not in (200, 201):
         raise Exception(f"Erro criando noticia: {r.status_code} {r.reason}\n{r.text}")
     return r.json()
 
+@METRICS.timed("patch text")
 def patch_news_text(session: requests.Session, news_url: str, new_html: str) -> None:
     if DRY_RUN:
         return
@@ -321,6 +498,7 @@ def patch_news_text(session: requests.Session, news_url: str, new_html: str) ->
     if r.status_code not in (200, 204):
         raise Exception(f"Erro dando PATCH no text: {r.status_code} {r.reason}\n{r.text}")
 
+@METRICS.timed("publicar")
 def publish_item(session: requests.Session, news_url: str, local: bool) -> None:
     transition = "show" if local else "publish"
     if DRY_RUN:
@@ -401,6 +579,76 @@ def image_size_from_bytes(data: bytes):
     except Exception:
         return (None, None)
 
+def image_size_from_url(session: requests.Session, url: str):
+    """Lê só o começo da imagem (Range + stream) até o PIL conseguir o tamanho."""
+    try:
+        r = session.get(url, headers={"Range": f"bytes=0-{IMAGE_HEADER_BYTES - 1}"},
+                        stream=True, timeout=TIMEOUT, verify=VERIFY_TLS)
+    except Exception:
+        return (None, None)
+    with r:
+        if r.status_code not in (200, 206):
+            return (None, None)
+        parser = ImageFile.Parser()
+        read = 0
+        try:
+            for chunk in r.iter_content(8192):
+                parser.feed(chunk)
+                if parser.image:
+                    return parser.image.size
+                read += len(chunk)
+                if read >= IMAGE_HEADER_BYTES:
+                    break
+        except Exception:
+            pass
+    return (None, None)
+
+_IMAGE_CACHE: "OrderedDict[str, bytes]" = OrderedDict()
+_IMAGE_CACHE_SIZE = 0
+_IMAGE_MISSES: set[str] = set()
+IMAGE_MISS_STATUS = (404, 410)  # ausência definitiva; 5xx/429/403... podem dar certo depois
+_IMAGE_LOCK = threading.Lock()
+
+def looks_like_image(resp: requests.Response) -> bool:
+    ctype = (resp.headers.get("Content-Type") or "").lower()
+    return ctype.startswith("image/") or resp.content[:4] in (b"\xff\xd8\xff\xe0", b"\x89PNG", b"GIF8")
+
+@METRICS.timed("download imagem")
+def fetch_image_once(session: requests.Session, url: str) -> Optional[bytes]:
+    """
+    Bytes da imagem em url, ou None se não for imagem. Resultado memorizado no run:
+    respostas definitivas (404/410, ou 200 que não é imagem) não são pedidas de novo
+    e os bytes ficam num LRU de IMAGE_CACHE_MB. Outras falhas (5xx, 429, rede) não
+    são memorizadas: a próxima notícia que usar a URL tenta de novo.
+    """
+    global _IMAGE_CACHE_SIZE
+    with _IMAGE_LOCK:
+        if url in _IMAGE_MISSES:
+            return None
+        if url in _IMAGE_CACHE:
+            _IMAGE_CACHE.move_to_end(url)
+            return _IMAGE_CACHE[url]
+
+    try:
+        rr = session.get(url, timeout=TIMEOUT, verify=VERIFY_TLS)
+    except Exception:
+        return None
+
+    with _IMAGE_LOCK:
+        if rr.status_code != 200 or not looks_like_image(rr):
+            if rr.status_code == 200 or rr.status_code in IMAGE_MISS_STATUS:
+                _IMAGE_MISSES.add(url)
+            return None
+        data = rr.content
+        limit = IMAGE_CACHE_MB * 1024 * 1024
+        if len(data) <= limit and url not in _IMAGE_CACHE:
+            _IMAGE_CACHE[url] = data
+            _IMAGE_CACHE_SIZE += len(data)
+            while _IMAGE_CACHE_SIZE > limit:
+                _old_url, old = _IMAGE_CACHE.popitem(last=False)
+                _IMAGE_CACHE_SIZE -= len(old)
+        return data
+
 SCALES = [
     ("large", 768),
     ("preview", 400),
@@ -435,9 +683,49 @@ def max_side_from_img_tag(img_tag) -> Optional[int]:
     if m2: vals.append(int(m2.group(1)))
     return max(vals) if vals else None
 
-def create_dx_image(session: requests.Session, parent_url: str, filename: str, data_bytes: bytes, source_url: str) -> str:
-    b64 = base64.b64encode(data_bytes).decode("utf-8")
-    image_id = unique_id_from_source(filename, source_url)
+def post_blob_payload(session: requests.Session, parent_url: str, payload: dict, field: str,
+                      data_bytes: bytes) -> requests.Response:
+    """
+    POST de Image/File: o base64 vai direto para o corpo JSON (sem string base64
+    intermediária nem json= do requests); blobs grandes são codificados numa
+    thread enquanto o corpo é enviado. Corpo novo a cada chamada (retentativas com outro id).
+    A partir de UPLOAD_TUS_MIN_BYTES o objeto é criado vazio e payload[field]
+    recebe os bytes crus por @tus-replace.
+    """
+    tus = use_tus(len(data_bytes), UPLOAD_TUS_MIN_BYTES)
+    with METRICS.phase("base64"):
+        body = json_body(payload, b"" if tus else data_bytes)
+    try:
+        r = session.post(parent_url, headers=HEADERS_JSON, auth=AUTH, data=body, timeout=TIMEOUT, verify=VERIFY_TLS)
+    finally:
+        close_body(body)
+    if tus and r.status_code in (200, 201):
+        with METRICS.phase("tus"):
+            tus_fill(session, r.json()["@id"], blob_chunks(data_bytes, UPLOAD_CHUNK_SIZE), len(data_bytes),
+                     payload[field]["filename"], payload[field]["content-type"], AUTH, TIMEOUT, VERIFY_TLS)
+    return r
+
+def reuse_taken_blob(session: requests.Session, obj_url: str, payload: dict, field: str, data_bytes: bytes) -> bool:
+    """
+    Id em uso: o id leva o hash da URL de origem, então o objeto é este mesmo asset
+    (retentativa da notícia ou run anterior) e é reaproveitado em vez de criar
+    outro com sufixo -vN. Vazio (queda entre a criação e o tus_fill): preenche.
+    False se não há objeto com esse campo ali (aí segue para o -vN).
+    """
+    size = blob_size(session, obj_url, field, AUTH, TIMEOUT, VERIFY_TLS)
+    if size is None:
+        return False
+    if size or not data_bytes:
+        return True
+    with METRICS.phase("tus"):
+        tus_fill(session, obj_url, blob_chunks(data_bytes, UPLOAD_CHUNK_SIZE), len(data_bytes),
+                 payload[field]["filename"], payload[field]["content-type"], AUTH, TIMEOUT, VERIFY_TLS)
+    return True
+
+@METRICS.timed("criar imagem")
+def create_dx_image(session: requests.Session, parent_url: str, filename: str, data_bytes: bytes, source_url: str,
+                    obj_id: Optional[str] = None) -> str:
+    image_id = obj_id or unique_id_from_source(filename, source_url)
 
     payload = {
         "@type": "Image",
@@ -446,7 +734,7 @@ def create_dx_image(session: requests.Session, parent_url: str, filename: str, d
         "image": {
             "filename": filename,
             "content-type": guess_mime(filename),
-            "data": b64,
+            "data": BASE64,
             "encoding": "base64",
         },
     }
@@ -454,22 +742,26 @@ def create_dx_image(session: requests.Session, parent_url: str, filename: str, d
     if DRY_RUN:
         return f"{parent_url.rstrip('/')}/{image_id}"
 
-    r = session.post(parent_url, headers=HEADERS_JSON, auth=AUTH, json=payload, timeout=TIMEOUT, verify=VERIFY_TLS)
+    r = post_blob_payload(session, parent_url, payload, "image", data_bytes)
     if r.status_code in (200, 201):
         return r.json().get("@id")
 
     if r.status_code == 400 and "already in use" in (r.text or ""):
         for i in range(2, 10):
+            taken = f"{parent_url.rstrip('/')}/{payload['id']}"
+            if reuse_taken_blob(session, taken, payload, "image", data_bytes):
+                return taken
             payload["id"] = f"{image_id}-v{i}"
-            rr = session.post(parent_url, headers=HEADERS_JSON, auth=AUTH, json=payload, timeout=TIMEOUT, verify=VERIFY_TLS)
+            rr = post_blob_payload(session, parent_url, payload, "image", data_bytes)
             if rr.status_code in (200, 201):
                 return rr.json().get("@id")
 
     raise Exception(f"Erro criando Image {filename}: {r.status_code} {r.reason}\n{r.text}")
 
-def create_dx_file(session: requests.Session, parent_url: str, filename: str, data_bytes: bytes, source_url: str) -> str:
-    b64 = base64.b64encode(data_bytes).decode("utf-8")
-    file_id = unique_id_from_source(filename, source_url)
+@METRICS.timed("criar arquivo")
+def create_dx_file(session: requests.Session, parent_url: str, filename: str, data_bytes: bytes, source_url: str,
+                    obj_id: Optional[str] = None) -> str:
+    file_id = obj_id or unique_id_from_source(filename, source_url)
 
     payload = {
         "@type": "File",
@@ -478,7 +770,7 @@ def create_dx_file(session: requests.Session, parent_url: str, filename: str, da
         "file": {
             "filename": filename,
             "content-type": guess_mime(filename),
-            "data": b64,
+            "data": BASE64,
             "encoding": "base64",
         },
     }
@@ -486,101 +778,289 @@ def create_dx_file(session: requests.Session, parent_url: str, filename: str, da
     if DRY_RUN:
         return f"{parent_url.rstrip('/')}/{file_id}"
 
-    r = session.post(parent_url, headers=HEADERS_JSON, auth=AUTH, json=payload, timeout=TIMEOUT, verify=VERIFY_TLS)
+    r = post_blob_payload(session, parent_url, payload, "file", data_bytes)
     if r.status_code in (200, 201):
         return r.json().get("@id")
 
     if r.status_code == 400 and "already in use" in (r.text or ""):
         for i in range(2, 10):
+            taken = f"{parent_url.rstrip('/')}/{payload['id']}"
+            if reuse_taken_blob(session, taken, payload, "file", data_bytes):
+                return taken
             payload["id"] = f"{file_id}-v{i}"
-            rr = session.post(parent_url, headers=HEADERS_JSON, auth=AUTH, json=payload, timeout=TIMEOUT, verify=VERIFY_TLS)
+            rr = post_blob_payload(session, parent_url, payload, "file", data_bytes)
             if rr.status_code in (200, 201):
                 return rr.json().get("@id")
 
     raise Exception(f"Erro criando File {filename}: {r.status_code} {r.reason}\n{r.text}")
 
-def migrate_embedded_assets(session: requests.Session, old_base_url: str, new_news_url: str, html: str) -> str:
-    soup = BeautifulSoup(html or "", "html.parser")
+ASSET_TAG_RE = re.compile(r"<(?:img|a)[\s/>]", re.I)
+
+class AssetTag:
+    """<img>/<a> achado por AssetRefScanner; on_img/on_a usam get() e tag["src"] = ... como num tag do bs4."""
+    __slots__ = ("name", "attrs", "changed", "start", "raw")
+
+    def __init__(self, name: str, attrs: list, start: int, raw: str):
+        self.name = name
+        self.attrs = {k: v for k, v in attrs}  # atributo repetido: vale o último, como no bs4
+        self.changed = False
+        self.start = start
+        self.raw = raw
+
+    def get(self, key, default=None):
+        return self.attrs.get(key, default)
+
+    def __getitem__(self, key):
+        return self.attrs[key]
+
+    def __setitem__(self, key, value) -> None:
+        self.attrs[key] = value
+        self.changed = True
 
+    def render(self) -> str:
+        parts = [f"<{self.name}"]
+        for k, v in self.attrs.items():
+            parts.append(f" {k}" if v is None else f' {k}="{html_escape(v, quote=True)}"')
+        parts.append(" />" if self.raw.endswith("/>") else ">")
+        return "".join(parts)
+
+class AssetRefScanner(HTMLParser):
+    """
+    Localiza <img>/<a> com o tokenizador do html.parser (o mesmo do BeautifulSoup
+    "html.parser": acha também os que estão dentro de <iframe>/<textarea>), sem
+    montar árvore, guardando a posição de cada tag no texto original.
+    """
+
+    def __init__(self, html: str):
+        super().__init__(convert_charrefs=True)
+        self.tags = []
+        self._line_starts = [0]
+        for m in re.finditer("\n", html):
+            self._line_starts.append(m.end())
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ("img", "a"):
+            line, col = self.getpos()
+            self.tags.append(AssetTag(tag, attrs, self._line_starts[line - 1] + col, self.get_starttag_text()))
+
+def scan_asset_tags(html: str) -> list:
+    if not html or not ASSET_TAG_RE.search(html):
+        return []
+    return AssetRefScanner(html).tags
+
+def collect_asset_refs(html: str) -> list[tuple[str, str]]:
+    """(tag, url) de cada <img src> e <a href>, em ordem, numa única passada."""
+    return [(t.name, t.get("src" if t.name == "img" else "href") or "") for t in scan_asset_tags(html)]
+
+def is_rewritable_ref(tag: str, url: str) -> bool:
+    """Mesmo filtro usado em migrate_embedded_assets para decidir se o asset migra."""
+    url = (url or "").strip()
+    if not url or not is_internal_or_local(url):
+        return False
+    return tag == "img" or looks_like_file_link(url)
+
+def rewrite_asset_refs(html: str, on_img, on_a) -> str:
+    """
+    Etapa de reescrita: percorre <img>/<a> UMA vez, em ordem de documento,
+    chamando on_img(tag) / on_a(tag) (que alteram src/href no próprio tag).
+
+    Só as tags alteradas são reescritas no texto original; o resto do HTML sai
+    byte a byte igual (o caminho antigo, str(soup), reserializava o documento
+    inteiro; bench/html_rewrite.py confere que é o mesmo documento depois de
+    normalizado pelo bs4). Sem nenhuma alteração, devolve o próprio html.
+    """
+    out, pos = [], 0
+    for tag in scan_asset_tags(html):
+        if tag.name == "img":
+            on_img(tag)
+        else:
+            on_a(tag)
+        if tag.changed:
+            out.append(html[pos:tag.start])
+            out.append(tag.render())
+            pos = tag.start + len(tag.raw)
+    if not out:
+        return html
+    out.append(html[pos:])
+    return "".join(out)
+
+CREATE_ASSET = {"Image": create_dx_image, "File": create_dx_file}
+
+@METRICS.timed("assets embutidos")
+def migrate_embedded_assets(session: requests.Session, old_base_url: str, new_news_url: str, html: str,
+                            deferred: Optional[list] = None, dest_session: Optional[requests.Session] = None,
+                            uploads: Optional[list] = None) -> str:
+    """
+    Migra imagens/arquivos internos do corpo para dentro de new_news_url e reescreve o HTML.
+
+    Downloads usam session (origem); criações no destino, dest_session (default: a mesma).
+    Com deferred (lista), nada é criado no destino: cada asset novo recebe a URL
+    prevista <new_news_url>/<id> e entra na lista para upload_deferred() depois
+    que a notícia existir (modo --single-write).
+    Cada asset criado entra em uploads (lista) como (tamanho, sha256), para o ledger.
+    """
+    dest_session = dest_session or session
     created_cache: dict[str, str] = {}
+    planned_ids: set[str] = set()
+    planned_by_sha: dict[tuple, dict] = {}
+
+    def put_asset(kind: str, index_url: str, filename: str, data: bytes, source_url: str, w=None, h=None) -> str:
+        size, digest = blob_digest(data)
+        sha = digest if ASSET_DEDUP else None
+        if sha and (kind, sha) in planned_by_sha:
+            entry = planned_by_sha[(kind, sha)]
+            entry["index"].append((index_url, w, h))
+            return entry["url"]
+        obj_url = ASSET_INDEX.by_sha(kind, sha) if sha else None
+        if not obj_url:
+            if deferred is None:
+                obj_url = CREATE_ASSET[kind](dest_session, new_news_url, filename, data, source_url)
+                if uploads is not None:
+                    uploads.append((size, digest))
+            else:
+                # mesmo esquema de id do create_dx_* (inclusive o sufixo -vN em colisão)
+                base_id = obj_id = unique_id_from_source(filename, source_url)
+                n = 1
+                while obj_id in planned_ids:
+                    n += 1
+                    obj_id = f"{base_id}-v{n}"
+                planned_ids.add(obj_id)
+                entry = {
+                    "kind": kind, "id": obj_id, "filename": filename, "data": data,
+                    "source_url": source_url, "url": f"{new_news_url.rstrip('/')}/{obj_id}",
+                    "sha": sha, "digest": (size, digest), "index": [(index_url, w, h)],
+                }
+                deferred.append(entry)
+                if sha:
+                    planned_by_sha[(kind, sha)] = entry
+                return entry["url"]
+        if sha:
+            ASSET_INDEX.add(index_url, kind, sha, obj_url, w, h)
+        return obj_url
 
     # Imagens
-    for img in soup.find_all("img"):
+    def migrate_img(img) -> None:
         src = (img.get("src") or "").strip()
         if not src or not is_internal_or_local(src):
-            continue
+            return
 
         abs_src = urljoin(old_base_url.rstrip("/") + "/", src)
         abs_original = original_image_url(abs_src)
 
-        # tenta baixar a imagem do jeito mais confiável:
-        # 1) se o src já é @@images/... (scale), isso normalmente já retorna bytes da imagem
-        # 2) tenta @@download/image no objeto base
-        # 3) por último tenta o src "base" (pode retornar HTML, então validamos content-type)
         max_side = max_side_from_img_tag(img)
-        if not max_side:
-            resp_scaled = session.get(abs_src, timeout=TIMEOUT, verify=VERIFY_TLS)
-            if resp_scaled.status_code == 200:
-                w_s, h_s = image_size_from_bytes(resp_scaled.content)
+
+        # Já enviada por outra notícia: reaproveita o objeto, sem baixar de novo
+        hit = ASSET_INDEX.by_url(abs_src, "Image") if ASSET_DEDUP else None
+        if hit:
+            if not max_side:
+                w_s, h_s = hit["width"], hit["height"]
+                if not (w_s and h_s):
+                    w_s, h_s = image_size_from_url(session, abs_src)
                 if w_s and h_s:
                     max_side = max(w_s, h_s)
+            img["src"] = f"{hit['dest_url'].rstrip('/')}/@@images/image/{pick_scale_for_max_side(max_side)}"
+            return
 
-        scale = pick_scale_for_max_side(max_side)
-
-        candidates = []
-        candidates.append(abs_src)
-
+        # tenta baixar a imagem do jeito mais confiável (cada URL no máximo uma vez):
+        # 1) se o src já é @@images/... (scale), isso normalmente já retorna bytes da imagem
+        # 2) tenta @@download/image no objeto base
+        # 3) por último tenta o src "base" (pode retornar HTML, então validamos content-type)
         base_obj = abs_src.split("/@@images/", 1)[0] if "/@@images/" in abs_src else abs_original
-        candidates.append(base_obj.rstrip("/") + "/@@download/image")
-        candidates.append(abs_original)
+        candidates = []
+        for cand in (abs_src, base_obj.rstrip("/") + "/@@download/image", abs_original):
+            if cand not in candidates:
+                candidates.append(cand)
 
         img_bytes = None
         chosen_url = None
         for cand in candidates:
-            try:
-                rr = session.get(cand, timeout=TIMEOUT, verify=VERIFY_TLS)
-            except Exception:
-                continue
-            if rr.status_code != 200:
-                continue
-            ctype = (rr.headers.get("Content-Type") or "").lower()
-            if ctype.startswith("image/") or rr.content[:4] in (b"\xff\xd8\xff\xe0", b"\x89PNG", b"GIF8"):
-                img_bytes = rr.content
+            img_bytes = fetch_image_once(session, cand)
+            if img_bytes:
                 chosen_url = cand
                 break
 
         if not img_bytes:
             print("Falha baixando img:", abs_src)
-            continue
+            return
+
+        # tamanho exibido = o do próprio src; mede a partir dos bytes já baixados
+        w_s = h_s = None
+        if chosen_url == abs_src:
+            w_s, h_s = image_size_from_bytes(img_bytes)
+            if not max_side and w_s and h_s:
+                max_side = max(w_s, h_s)
+
+        scale = pick_scale_for_max_side(max_side)
 
         filename = filename_from_any_url(base_obj, fallback_ext=".jpg")
-        img_obj_url = create_dx_image(session, new_news_url, filename, img_bytes, chosen_url or abs_src)
+        img_obj_url = put_asset("Image", abs_src, filename, img_bytes, chosen_url or abs_src, w_s, h_s)
 
         img["src"] = f"{img_obj_url.rstrip('/')}/@@images/image/{scale}"
 
     # Arquivos
-    for a in soup.find_all("a"):
+    def migrate_link(a) -> None:
         href = (a.get("href") or "").strip()
         if not href or not looks_like_file_link(href) or not is_internal_or_local(href):
-            continue
+            return
 
         abs_url = urljoin(old_base_url.rstrip("/") + "/", href)
         if abs_url in created_cache:
             a["href"] = created_cache[abs_url]
-            continue
+            return
 
-        resp = session.get(abs_url, timeout=TIMEOUT, verify=VERIFY_TLS)
+        hit = ASSET_INDEX.by_url(abs_url, "File") if ASSET_DEDUP else None
+        if hit:
+            created_cache[abs_url] = a["href"] = hit["dest_url"]
+            return
+
+        with METRICS.phase("download arquivo"):
+            resp = session.get(abs_url, timeout=TIMEOUT, verify=VERIFY_TLS)
         if resp.status_code != 200:
             print("Falha baixando arquivo:", abs_url, resp.status_code)
-            continue
+            return
 
         filename = filename_from_any_url(abs_url, fallback_ext=".bin")
-        file_obj_url = create_dx_file(session, new_news_url, filename, resp.content, abs_url)
+        file_obj_url = put_asset("File", abs_url, filename, resp.content, abs_url)
 
         created_cache[abs_url] = file_obj_url
         a["href"] = file_obj_url
 
-    return str(soup)
+    return rewrite_asset_refs(html, migrate_img, migrate_link)
+
+@METRICS.timed("assets adiados")
+def upload_deferred(session: requests.Session, predicted_news_url: str, news_url: str, deferred: list,
+                    uploads: Optional[list] = None) -> dict:
+    """
+    Cria no destino os assets planejados por migrate_embedded_assets(deferred=...).
+    Retorna {URL prevista: URL real} só para o que divergiu (id da notícia ou do
+    asset diferente do previsto). Cada asset criado entra em uploads, como lá.
+    """
+    moved = {}
+    if news_url.rstrip("/") != predicted_news_url.rstrip("/"):
+        moved[predicted_news_url.rstrip("/")] = news_url.rstrip("/")
+    for entry in deferred:
+        obj_url = CREATE_ASSET[entry["kind"]](
+            session, news_url, entry["filename"], entry["data"], entry["source_url"], obj_id=entry["id"]
+        )
+        if uploads is not None:
+            uploads.append(entry["digest"])
+        expected = f"{news_url.rstrip('/')}/{entry['id']}"
+        if obj_url.rstrip("/") != expected:
+            moved[entry["url"]] = obj_url.rstrip("/")
+        if entry["sha"]:
+            for index_url, w, h in entry["index"]:
+                ASSET_INDEX.add(index_url, entry["kind"], entry["sha"], obj_url, w, h)
+    return moved
+
+def replace_moved_urls(html: str, moved: dict) -> str:
+    """Troca URLs previstas pelas reais (só URL inteira ou seguida de /, aspas, ?, #)."""
+    if not moved:
+        return html
+    # alternativas mais longas primeiro; uma passada só, sem reprocessar o que já foi trocado
+    alts = "|".join(re.escape(u) for u in sorted(moved, key=len, reverse=True))
+    return re.sub(f"(?:{alts})" + r"(?=[/\"'?#\s<>]|$)", lambda m: moved[m.group(0)], html)
 
 # -------------------------
 # Origem: fetchers
@@ -632,7 +1112,7 @@ def fetch_imagem_principal(session: requests.Session, old_url: str) -> dict:
         return {
             "filename": filename or filename_from_any_url(img_url, ".jpg"),
             "caption": caption,
-            "data_b64": base64.b64encode(img_resp.content).decode("utf-8"),
+            "data": img_resp.content,  # base64 só na montagem do corpo (create_news_item)
         }
     except Exception:
         return {}
@@ -641,56 +1121,524 @@ def fetch_imagem_principal(session: requests.Session, old_url: str) -> dict:
 # Main
 # -------------------------
 
-def migrate_one(old_session: requests.Session, new_session: requests.Session, old_url: str, state: dict, idx: int, total: int) -> None:
+def is_done(key: str, state) -> bool:
+    return state.get(key) == "ok" or key in LEDGER_DONE
+
+@METRICS.timed("origem")
+def fetch_origin(old_session: requests.Session, old_url: str, pool: Optional[ThreadPoolExecutor] = None) -> dict:
+    """
+    Etapa de leitura: metadados, corpo e imagem principal da origem.
+    Com pool, corpo e imagem são buscados em paralelo aos metadados
+    (cada thread do pool usa a própria sessão).
+    """
+    if pool is None:
+        return {
+            "meta": fetch_metadados(old_session, old_url),
+            "corpo": fetch_corpo(old_session, old_url),
+            "img": fetch_imagem_principal(old_session, old_url),
+        }
+    corpo_f = pool.submit(lambda: fetch_corpo(thread_sessions()[0], old_url))
+    img_f = pool.submit(lambda: fetch_imagem_principal(thread_sessions()[0], old_url))
+    meta = fetch_metadados(old_session, old_url)
+    return {"meta": meta, "corpo": corpo_f.result(), "img": img_f.result()}
+
+def migrate_one(old_session: requests.Session, new_session: requests.Session, old_url: str, state, idx: int, total: int,
+                origin: Optional[dict] = None) -> None:
     key = old_url.strip()
-    if state.get(key) == "ok":
+    if is_done(key, state):
         return
 
-    meta = fetch_metadados(old_session, old_url)
-    corpo_html = fetch_corpo(old_session, old_url)
-    img_info = fetch_imagem_principal(old_session, old_url)
+    if origin is None:
+        origin = fetch_origin(old_session, old_url)
+    write_dest(old_session, new_session, old_url, origin, state, idx, total)
+
+@METRICS.timed("escrita")
+def write_dest(old_session: requests.Session, new_session: requests.Session, old_url: str, origin: dict,
+               state, idx: int, total: int) -> None:
+    """Etapa de escrita: pastas, criação, assets embutidos, PATCH, publicação e estado."""
+    key = old_url.strip()
+    meta = origin["meta"]
+    corpo_html = origin["corpo"]
+    img_info = origin["img"]
 
     caminho = meta.get("caminho", "")
     dest_path = destino_path_from_caminho(caminho)
-    container_url = ensure_path_folders(new_session, dest_path)
+    with container_lock(PLONE_URL + dest_path):
+        container_url = ensure_path_folders(new_session, dest_path)
 
     local_flag = is_true(meta.get("local", "False"))
 
-    # Cria notícia com HTML "cru" primeiro
-    created = create_news_item(new_session, container_url, meta, corpo_html, img_info)
-    new_url = created.get("@id") or ""
+    # blobs enviados (imagem principal + assets), para bytes/sha256 no ledger
+    uploads = [blob_digest(img_info["data"])] if img_info.get("filename") and img_info.get("data") else []
+
+    # Retentativa de uma notícia que falhou depois do POST: não cria de novo
+    # (daria 400 "already in use"); segue dos assets/PATCH/publicação
+    progress = {"news_url": resumed_news_url(new_session, state, key)}
+    if progress["news_url"]:
+        uploads = []
+        print(f"  [retomada] notícia já criada em {progress['news_url']}")
+    try:
+        if SINGLE_WRITE and meta.get("id"):
+            new_url = write_news_single(old_session, new_session, old_url, container_url, meta, corpo_html, img_info,
+                                        uploads, progress)
+        else:
+            new_url = progress["news_url"]
+            if not new_url:
+                # Cria notícia com HTML "cru" primeiro (serializado por container por causa dos ids)
+                with container_lock(container_url):
+                    created = create_news_item(new_session, container_url, meta, corpo_html, img_info)
+                new_url = progress["news_url"] = created.get("@id") or ""
+                if not new_url:
+                    raise RuntimeError("Resposta sem @id ao criar notícia")
+
+            # Migra assets embutidos e aplica PATCH no corpo
+            patched_html = migrate_embedded_assets(old_session, old_url, new_url, corpo_html,
+                                                   dest_session=new_session, uploads=uploads)
+            if patched_html != corpo_html:
+                patch_news_text(new_session, new_url, patched_html)
+
+        # Publica conforme local (ou enfileira para o lote do fim)
+        if PUBLISH_QUEUE is not None:
+            queue_publish(new_url, "show" if local_flag else "publish")
+        else:
+            publish_item(new_session, new_url, local_flag)
+    except Exception:
+        if progress["news_url"]:
+            set_state(state, resume_key(key), progress["news_url"])
+        raise
+
+    set_state(state, key, "ok")
+    ledger_record(key, "created", destino=container_url, dest_id=new_url, uploads=uploads)
+
+    print(f"[OK] ({idx}/{total}) {meta.get('id','')} -> {new_url}")
+
+def write_news_single(old_session: requests.Session, new_session: requests.Session, old_url: str,
+                      container_url: str, meta: dict, corpo_html: str, img_info: dict,
+                      uploads: Optional[list] = None, progress: Optional[dict] = None) -> str:
+    """
+    Modo --single-write: o HTML já vai reescrito no POST de criação. Os assets
+    são baixados antes, com URL prevista <container>/<id>/<asset_id>, e criados
+    logo depois da notícia. PATCH no text só se alguma URL real divergir da prevista.
+    progress["news_url"]: notícia já criada (retomada; pula o POST) e, na volta,
+    a criada agora.
+    """
+    progress = progress if progress is not None else {}
+    predicted_url = f"{container_url.rstrip('/')}/{meta['id']}"
+    deferred: list = []
+    final_html = migrate_embedded_assets(old_session, old_url, predicted_url, corpo_html, deferred, new_session)
+
+    new_url = progress.get("news_url") or ""
     if not new_url:
-        raise RuntimeError("Resposta sem @id ao criar notícia")
+        with container_lock(container_url):
+            created = create_news_item(new_session, container_url, meta, final_html, img_info)
+        new_url = progress["news_url"] = created.get("@id") or ""
+        if not new_url:
+            raise RuntimeError("Resposta sem @id ao criar notícia")
+
+    moved = upload_deferred(new_session, predicted_url, new_url, deferred, uploads)
+    if moved:
+        print(f"  [single-write] {len(moved)} URL(s) divergiram do previsto; corrigindo com PATCH")
+        patch_news_text(new_session, new_url, replace_moved_urls(final_html, moved))
+    return new_url
+
+def run_one(old_url: str, state, idx: int, total: int, origin_future=None) -> None:
+    old_session, new_session = thread_sessions()
+    try:
+        if SLEEP_BETWEEN and not THROTTLE:
+            time.sleep(SLEEP_BETWEEN)
+        origin = origin_future.result() if origin_future is not None else None
+        if origin_future is not None and origin is None:
+            return  # já concluída (a leitura foi pulada)
+        migrate_one(old_session, new_session, old_url, state, idx, total, origin)
+    except Exception as e:
+        print(f"[ERRO] ({idx}/{total}) {old_url}\n  {e}")
+        set_state(state, old_url.strip(), f"erro: {e}")
+        ledger_record(old_url.strip(), "error", erro=str(e))
+
+def export_one(old_url: str, state, idx: int, total: int) -> None:
+    """--snapshot-export: as mesmas leituras da origem da migração, sem tocar no destino."""
+    old_session, _new_session = thread_sessions()
+    try:
+        origin = fetch_origin(old_session, old_url)
+        # modo adiado (deferred) baixa os assets embutidos como a migração, sem criá-los
+        migrate_embedded_assets(old_session, old_url, "snapshot:", origin["corpo"], deferred=[])
+        print(f"[EXPORT] ({idx}/{total}) {old_url}")
+    except Exception as e:
+        print(f"[ERRO] ({idx}/{total}) {old_url}\n  {e}")
 
-    # Migra assets embutidos e aplica PATCH no corpo
-    patched_html = migrate_embedded_assets(old_session, old_url, new_url, corpo_html)
-    patch_news_text(new_session, new_url, patched_html)
+# -------------------------
+# Reprocessamento de falhas (--retry-failed)
+# -------------------------
 
-    # Publica conforme local
-    publish_item(new_session, new_url, local_flag)
+# Ordem importa: a primeira regra que casar define a classe
+ERROR_CLASSES = [
+    ("id-em-uso", re.compile(r"already in use", re.I)),
+    ("timeout", re.compile(r"timeout|timed out", re.I)),
+    ("conexao", re.compile(r"Max retries exceeded|NameResolution|ConnectionError|Connection (?:aborted|reset|refused)|RemoteDisconnected", re.I)),
+    ("5xx", re.compile(r":\s5\d\d\b|\b5\d\d Server Error")),
+    ("4xx", re.compile(r":\s4\d\d\b|\b4\d\d Client Error")),
+    ("parse", re.compile(r"Não foi possível identificar unidade|Resposta sem @id|Expecting value|JSONDecodeError", re.I)),
+]
+TRANSIENT_CLASSES = ("timeout", "conexao", "5xx")
 
-    state[key] = "ok"
-    save_state(state)
+def classify_error(msg: str) -> str:
+    for name, rx in ERROR_CLASSES:
+        if rx.search(msg or ""):
+            return name
+    return "outro"
 
-    print(f"[OK] ({idx}/{total}) {meta.get('id','')} -> {new_url}")
+def backoff_delay(attempt: int) -> float:
+    """Exponencial com "full jitter": uniforme em [0, min(max, base * 2^(n-1))]."""
+    return random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * (2 ** (attempt - 1))))
+
+def retry_one(old_url: str, state, idx: int, total: int, classes: tuple) -> None:
+    old_session, new_session = thread_sessions()
+    key = old_url.strip()
+    for attempt in range(1, RETRY_MAX_ATTEMPTS + 1):
+        try:
+            migrate_one(old_session, new_session, old_url, state, idx, total)
+            return
+        except Exception as e:
+            cls = classify_error(str(e))
+            if cls not in classes or attempt == RETRY_MAX_ATTEMPTS:
+                print(f"[ERRO] ({idx}/{total}) {old_url} [{cls}, tentativa {attempt}]\n  {e}")
+                set_state(state, key, f"erro: {e}")
+                ledger_record(key, "error", erro=str(e))
+                return
+            delay = backoff_delay(attempt)
+            print(f"[RETRY] ({idx}/{total}) {cls}, tentativa {attempt}; nova tentativa em {delay:.1f}s")
+            time.sleep(delay)
+
+def retry_failed(state, workers: int, classes: tuple) -> None:
+    failed = [(k, v) for k, v in state.items() if isinstance(v, str) and v.startswith("erro")]
+    by_class = Counter(classify_error(v) for _k, v in failed)
+
+    print(f"Falhas no estado: {len(failed)}")
+    for cls, n in by_class.most_common():
+        marca = "reprocessar" if cls in classes else "ignorar"
+        print(f"  {cls:<10} {n:>6}  ({marca})")
+
+    urls = [k for k, v in failed if classify_error(v) in classes]
+    run_urls(urls, state, workers, lambda u, st, i, t: retry_one(u, st, i, t, classes))
+
+def run_urls(urls: list[str], state, workers: int, fn=None) -> None:
+    fn = fn or run_one
+    total = len(urls)
+    if workers <= 1:
+        for i, old_url in enumerate(urls, start=1):
+            fn(old_url, state, i, total)
+        return
 
-def main():
-    old_session = requests.Session()
-    new_session = requests.Session()
+    print(f"Migrando {total} notícias com {workers} workers")
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for i, old_url in enumerate(urls, start=1):
+            pool.submit(fn, old_url, state, i, total)
 
-    state = load_state()
-    urls = fetch_lista(old_session)
+# -------------------------
+# Pipeline leitura (origem) -> escrita (destino)
+# -------------------------
 
+def prefetch_one(old_url: str, state, pool: ThreadPoolExecutor) -> Optional[dict]:
+    if is_done(old_url.strip(), state):
+        return None
+    old_session, _new_session = thread_sessions()
+    return fetch_origin(old_session, old_url, pool)
+
+def run_pipelined(urls: list[str], state, workers: int, prefetch: int) -> None:
+    """
+    Produtor/consumidor: até `prefetch` notícias à frente têm metadados/corpo/imagem
+    lidos da origem enquanto os `workers` escrevem no destino. A janela é limitada
+    por semáforo (no máximo prefetch + workers itens lidos e ainda não gravados),
+    então a memória não cresce com o tamanho da lista. Com 1 worker a ordem de
+    escrita é a da lista.
+    """
     total = len(urls)
-    for i, old_url in enumerate(urls, start=1):
+    slots = threading.BoundedSemaphore(prefetch + workers)
+
+    def write(old_url: str, idx: int, fut) -> None:
         try:
-            if SLEEP_BETWEEN:
-                time.sleep(SLEEP_BETWEEN)
-            migrate_one(old_session, new_session, old_url, state, i, total)
-        except Exception as e:
-            print(f"[ERRO] ({i}/{total}) {old_url}\n  {e}")
-            state[old_url.strip()] = f"erro: {e}"
-            save_state(state)
+            run_one(old_url, state, idx, total, fut)
+        finally:
+            slots.release()
+
+    print(f"Migrando {total} notícias com {workers} worker(s) e leitura antecipada de {prefetch}")
+    with ThreadPoolExecutor(max_workers=2 * prefetch, thread_name_prefix="origem-aux") as aux, \
+         ThreadPoolExecutor(max_workers=prefetch, thread_name_prefix="origem") as readers, \
+         ThreadPoolExecutor(max_workers=workers, thread_name_prefix="destino") as writers:
+        for i, old_url in enumerate(urls, start=1):
+            slots.acquire()
+            fut = readers.submit(prefetch_one, old_url, state, aux)
+            writers.submit(write, old_url, i, fut)
+
+# -------------------------
+# Publicação adiada (--defer-publish / --publish-pending)
+# -------------------------
+# Chave = URL da notícia no destino. Valor: "show"/"publish" (pendente), "ok" ou
+# "erro <transição>: ..." (volta a ser tentada no próximo lote).
+
+def open_publish_queue():
+    return open_state(PUBLISH_STATE_FILE, "journal", compact_every=STATE_COMPACT_EVERY, fsync=STATE_FSYNC)
+
+def queue_publish(news_url: str, transition: str) -> None:
+    PUBLISH_QUEUE.set(news_url, transition)
+
+def pending_transition(value: str) -> str:
+    """Transição ainda não aplicada ("" se já publicada)."""
+    if value in ("show", "publish"):
+        return value
+    m = re.match(r"erro (show|publish):", value or "")
+    return m.group(1) if m else ""
+
+def publish_one(news_url: str, transition: str) -> str:
+    _old_session, new_session = thread_sessions()
+    try:
+        publish_item(new_session, news_url, transition == "show")
+    except Exception as e:
+        PUBLISH_QUEUE.set(news_url, f"erro {transition}: {e}")
+        print(f"[ERRO] publicação {transition} {news_url}\n  {e}")
+        return "erro"
+    PUBLISH_QUEUE.set(news_url, "ok")
+    return "ok"
+
+def publish_pending(workers: int) -> None:
+    pending = [(url, pending_transition(v)) for url, v in PUBLISH_QUEUE.items() if pending_transition(v)]
+    if not pending:
+        print("Publicação: nada pendente")
+        return
+
+    print(f"Publicação: {len(pending)} transições pendentes, {workers} em paralelo")
+    t0 = time.time()
+    results = Counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = {pool.submit(publish_one, url, tr): tr for url, tr in pending}
+        for fut in futures:
+            results[(futures[fut], fut.result())] += 1
+
+    elapsed = time.time() - t0
+    print(f"Publicação concluída em {elapsed:.1f}s ({len(pending) / max(elapsed, 1e-9):.1f}/s)")
+    for tr in ("publish", "show"):
+        if results[(tr, "ok")] or results[(tr, "erro")]:
+            print(f"  {tr:<8} ok={results[(tr, 'ok')]:>6}  erro={results[(tr, 'erro')]:>6}")
+
+# -------------------------
+# Estimativa (--estimate): lista + amostra, sem gravar nada no destino
+# -------------------------
+
+def head_length(session: requests.Session, url: str) -> Optional[int]:
+    try:
+        r = session.head(url, timeout=TIMEOUT, verify=VERIFY_TLS, allow_redirects=True)
+    except requests.RequestException:
+        return None
+    length = r.headers.get("Content-Length") or ""
+    return int(length) if r.status_code == 200 and length.isdigit() else None
+
+def probe_news(old_url: str) -> dict:
+    """Metadados + corpo de uma notícia e HEAD dos assets migráveis (sem baixá-los)."""
+    old_session, _new_session = thread_sessions()
+    meta = fetch_metadados(old_session, old_url)
+    corpo = fetch_corpo(old_session, old_url)
+    try:
+        dest_path = destino_path_from_caminho(meta.get("caminho", ""))
+    except ValueError:
+        dest_path = ""
+
+    base = old_url.rstrip("/") + "/"
+    assets, seen = [], set()
+    for tag, url in collect_asset_refs(corpo):
+        abs_url = urljoin(base, url.strip())
+        if is_rewritable_ref(tag, url) and abs_url not in seen:  # repetidos na mesma notícia sobem uma vez
+            seen.add(abs_url)
+            assets.append(("Image" if tag == "img" else "File", abs_url, head_length(old_session, abs_url)))
+
+    lead = 0
+    r = old_session.get(join_v2_endpoint(old_url, "v2_getNoticiasImagem"), timeout=TIMEOUT, verify=False)
+    lines = [l.strip() for l in r.text.splitlines() if l.strip()] if r.status_code == 200 else []
+    if lines:
+        lead = head_length(old_session, lines[0]) or 0
+    return {"dest_path": dest_path, "assets": assets, "lead": lead, "body": len(corpo.encode("utf-8"))}
+
+def estimate(state, workers: int, sample: int) -> None:
+    old_session, _new_session = thread_sessions()
+    urls = fetch_lista(old_session)
+    pending = [u for u in urls if not is_done(u.strip(), state)]
+    probe = random.sample(pending, sample) if 0 < sample < len(pending) else pending
+
+    results, falhas = [], 0
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [pool.submit(probe_news, u) for u in probe]
+        for fut in futures:
+            try:
+                results.append(fut.result())
+            except Exception:
+                falhas += 1
+
+    n = len(results)
+    scale = len(pending) / n if n else 0.0
+    kinds = Counter(kind for r in results for kind, _u, _b in r["assets"])
+    unique = {u for r in results for _k, u, _b in r["assets"]}
+    asset_bytes = sum(b or 0 for r in results for _k, _u, b in r["assets"])
+    lead_bytes = sum(r["lead"] for r in results)
+    body_bytes = sum(r["body"] for r in results)
+    paths = {r["dest_path"] for r in results if r["dest_path"]}
+    new_paths = {p for p in paths if PLONE_URL + p not in PATH_CACHE}
+    with_refs = sum(1 for r in results if r["assets"])
+
+    # por notícia: metadados + corpo + imagem (+ download da principal) na origem;
+    # criação + assets + PATCH (se há refs e sem --single-write) + publicação no destino
+    n_assets = sum(kinds.values())
+    orig_reqs = (3 * n + sum(1 for r in results if r["lead"]) + n_assets) * scale
+    # TUS: POST + um PATCH por bloco além do POST de criação
+    tus_reqs = sum(1 + max(1, -(-b // UPLOAD_CHUNK_SIZE))
+                   for r in results for _k, _u, b in r["assets"] if b and use_tus(b, UPLOAD_TUS_MIN_BYTES))
+    dest_reqs = (2 * n + n_assets + tus_reqs + (0 if SINGLE_WRITE else with_refs)) * scale
+    down = (asset_bytes + lead_bytes + body_bytes) * scale
+    # assets a partir de UPLOAD_TUS_MIN_BYTES vão crus (TUS); os demais e a imagem principal, em base64
+    asset_up = sum((b if use_tus(b, UPLOAD_TUS_MIN_BYTES) else b * 4 / 3)
+                   for r in results for _k, _u, b in r["assets"] if b)
+    up = (asset_up + lead_bytes * 4 / 3 + body_bytes * (1 if SINGLE_WRITE else 2)) * scale
+
+    print("Estimativa (nada foi gravado no destino):")
+    print(f"  notícias na lista   : {len(urls)}  (já concluídas: {len(urls) - len(pending)}, pendentes: {len(pending)})")
+    print(f"  amostra             : {n} lidas" + (f", {falhas} com erro" if falhas else "")
+          + (f" (x{scale:.1f} para o total)" if scale > 1 else ""))
+    print(f"  imagens embutidas   : ~{kinds['Image'] * scale:.0f}")
+    print(f"  arquivos embutidos  : ~{kinds['File'] * scale:.0f}")
+    print(f"  assets repetidos    : {n_assets - len(unique)} de {n_assets} na amostra (ASSET_DEDUP evita)")
+    print(f"  containers destino  : {len(paths)} na amostra, {len(new_paths)} fora do cache de caminhos")
+    print(f"  bytes baixados      : ~{human_bytes(int(down))}")
+    print(f"  bytes enviados      : ~{human_bytes(int(up))} (base64"
+          + (f"; TUS a partir de {human_bytes(UPLOAD_TUS_MIN_BYTES)})" if UPLOAD_TUS_MIN_BYTES > 0 else ")"))
+    print(f"  requisições         : ~{orig_reqs:.0f} na origem + ~{dest_reqs:.0f} no destino "
+          f"(+ GET/POST de pastas fora do cache)")
+
+def parse_args(argv=None) -> argparse.Namespace:
+    ap = argparse.ArgumentParser(description="Migração de notícias V2 (Plone antigo -> Plone novo)")
+    ap.add_argument("--workers", type=int, default=WORKERS,
+                    help="notícias migradas em paralelo (default: env WORKERS ou 1)")
+    ap.add_argument("--prefetch", type=int, default=PREFETCH,
+                    help="notícias lidas da origem à frente da escrita no destino; 0 desliga "
+                         "(default: env PREFETCH ou 0)")
+    ap.add_argument("--single-write", action="store_true", default=SINGLE_WRITE,
+                    help="envia o corpo já reescrito no POST de criação (sem PATCH do text); "
+                         "default: env SINGLE_WRITE")
+    ap.add_argument("--defer-publish", action="store_true", default=DEFER_PUBLISH,
+                    help="enfileira as transições em PUBLISH_STATE_FILE e publica tudo em lote no fim "
+                         "(default: env DEFER_PUBLISH)")
+    ap.add_argument("--publish-pending", action="store_true",
+                    help="só executa as transições pendentes/falhas de PUBLISH_STATE_FILE e sai")
+    ap.add_argument("--publish-workers", type=int, default=PUBLISH_WORKERS,
+                    help="transições em paralelo no lote de publicação (default: env PUBLISH_WORKERS ou 4)")
+    ap.add_argument("--metrics-out", default=os.getenv("METRICS_OUT", ""), metavar="ARQUIVO",
+                    help="grava as métricas do run: .json ou texto Prometheus (outra extensão)")
+    ap.add_argument("--estimate", action="store_true",
+                    help="só planeja: lê a lista e uma amostra (metadados, corpo, HEAD dos assets) "
+                         "e estima itens, requisições e bytes, sem gravar no destino")
+    ap.add_argument("--sample", type=int, default=50,
+                    help="notícias lidas no --estimate (0 = todas as pendentes; default 50)")
+    ap.add_argument("--snapshot-export", default=SNAPSHOT_EXPORT, metavar="DIR",
+                    help="só lê a origem (lista, notícias e assets embutidos) e grava o snapshot em DIR; "
+                         "nada vai ao destino (default: env SNAPSHOT_EXPORT)")
+    ap.add_argument("--snapshot-import", default=SNAPSHOT_IMPORT, metavar="DIR",
+                    help="migra lendo a origem do snapshot em DIR, sem acessar o site antigo "
+                         "(default: env SNAPSHOT_IMPORT)")
+    ap.add_argument("--import-state", nargs="+", metavar="ARQUIVO_JSON",
+                    help="importa import_state*.json para o journal (STATE_BACKEND=journal) e sai")
+    ap.add_argument("--retry-failed", action="store_true",
+                    help="reprocessa só as entradas 'erro: ...' do estado, com backoff (não lê a lista)")
+    ap.add_argument("--retry-classes", default=",".join(TRANSIENT_CLASSES),
+                    help="classes de erro reprocessadas no --retry-failed "
+                         "(timeout, conexao, 5xx, 4xx, id-em-uso, parse, outro)")
+    return ap.parse_args(argv)
+
+def import_states(paths: list[str]) -> None:
+    if STATE_BACKEND.strip().lower() != "journal":
+        raise SystemExit("--import-state exige STATE_BACKEND=journal")
+    state = load_state()
+    try:
+        for path in paths:
+            n = state.import_json(path)
+            print(f"Estado: {n} entradas importadas de {path}")
+    finally:
+        state.close()
+    print(f"Estado: {len(state)} chaves em {STATE_JOURNAL_FILE}")
+
+def main(argv=None):
+    args = parse_args(argv)
+
+    if args.import_state:
+        import_states(args.import_state)
+        return
+
+    global SINGLE_WRITE, PUBLISH_QUEUE
+    SINGLE_WRITE = args.single_write
+
+    if args.publish_pending:
+        PUBLISH_QUEUE = open_publish_queue()
+        try:
+            publish_pending(args.publish_workers)
+        finally:
+            PUBLISH_QUEUE.close()
+        return
+
+    # antes de qualquer sessão: as da origem leem/gravam o snapshot
+    use_snapshot("", args.snapshot_export, args.snapshot_import)
+    old_session, _new_session = thread_sessions()
+
+    state = load_state()
+    if LEDGER:
+        LEDGER_DONE.update(LEDGER.done(LEDGER_SCRIPT))
+    if args.defer_publish:
+        PUBLISH_QUEUE = open_publish_queue()
+
+    workers = max(1, args.workers)
+    if args.estimate:
+        try:
+            estimate(state, workers, args.sample)
+        finally:
+            state.close()
+            if LEDGER:
+                LEDGER.close()
+        return
+
+    if args.snapshot_export:
+        try:
+            run_urls(fetch_lista(old_session), state, workers, fn=export_one)
+        finally:
+            state.close()
+            if LEDGER:
+                LEDGER.close()
+            print_connection_stats()
+            METRICS.report()
+            if args.metrics_out:
+                METRICS.export(args.metrics_out)
+        return
+
+    try:
+        if args.retry_failed:
+            classes = tuple(c.strip() for c in args.retry_classes.split(",") if c.strip())
+            retry_failed(state, workers, classes)
+        else:
+            urls = fetch_lista(old_session)
+            if args.prefetch > 0:
+                run_pipelined(urls, state, workers, args.prefetch)
+            else:
+                run_urls(urls, state, workers)
+
+        if PUBLISH_QUEUE is not None:
+            publish_pending(args.publish_workers)
+    finally:
+        PATH_CACHE.save()
+        ASSET_INDEX.close()
+        state.close()
+        if LEDGER:
+            LEDGER.close()
+        if PUBLISH_QUEUE is not None:
+            PUBLISH_QUEUE.close()
+        print_connection_stats()
+        print_throttle_stats()
+        METRICS.report()
+        if args.metrics_out:
+            METRICS.export(args.metrics_out)
 
 if __name__ == "__main__":
     main()
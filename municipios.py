@@ -2,15 +2,22 @@
 # -*- coding: utf-8 -*-
 
 import os
-import sys
 import csv
+import hashlib
 import json
 import time
-import base64
 import re
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from urllib.parse import urlparse
 
-import requests
+from http_client import make_session, print_connection_stats
+from ledger import open_ledger
+from payloads import BASE64, close_body, json_body
+from snapshot import use_snapshot
+from throttle import print_throttle_stats, throttle_enabled
+from uploads import blob_chunks, blob_size, tus_fill, tus_min_bytes, use_tus
 
 # =========================
 # CONFIG (env)
@@ -24,6 +31,9 @@ DEST_PASS = os.getenv("PLONE_DEST_PASS", "Q7!mR2@x#9Lp")
 
 TIMEOUT = int(os.getenv("PLONE_TIMEOUT", "60"))
 SLEEP_BETWEEN = float(os.getenv("PLONE_SLEEP_BETWEEN", "0.05"))
+# PLONE_THROTTLE=aimd: ritmo adaptativo no destino (throttle.py) no lugar do
+# sleep fixo acima; desligado por padrão (PLONE_THROTTLE=off usa PLONE_SLEEP_BETWEEN)
+THROTTLE = throttle_enabled("PLONE_")
 
 # Destino (backend REST que responde JSON)
 DEST_API_BASE = os.getenv("PLONE_DEST_API_BASE", "https://www-cdn.mpf.mp.br")
@@ -39,6 +49,23 @@ if SSL_VERIFY is False:
 
 JSON_HEADERS = {"Accept": "application/json", "Content-Type": "application/json"}
 
+# Imagens a partir deste tamanho vão por TUS (@tus-replace, com retomada); abaixo, base64 no JSON
+UPLOAD_TUS_MIN_BYTES = tus_min_bytes("PLONE_")
+UPLOAD_CHUNK_SIZE = int(os.getenv("PLONE_UPLOAD_CHUNK_SIZE", str(8 * 1024 * 1024)))
+
+# Ledger SQLite compartilhado (vazio = desligado)
+LEDGER_FILE = os.getenv("PLONE_LEDGER_FILE", "")
+LEDGER_SCRIPT = "municipios"
+
+# Municípios migrados em paralelo (cada thread com as próprias sessões); os seis
+# métodos da origem de cada município também são chamados em paralelo
+WORKERS = int(os.getenv("PLONE_WORKERS", "4"))
+
+# Snapshot da origem (snapshot.py): --snapshot-export só lê a origem e grava em
+# disco; --snapshot-import migra lendo a origem do disco
+SNAPSHOT_EXPORT = os.getenv("PLONE_SNAPSHOT_EXPORT", "")
+SNAPSHOT_IMPORT = os.getenv("PLONE_SNAPSHOT_IMPORT", "")
+
 # Métodos Zope na origem
 M_META = "v2_getMunicipioMetadados"
 M_BODY = "v2_getMunicipioCorpo"
@@ -47,10 +74,20 @@ M_END  = "v2_getMunicipioEndereco"
 M_LOC  = "v2_getMunicipioLocalizacao"
 M_IMG  = "v2_getMunicipioImagem"
 
+_THREAD_LOCAL = threading.local()
+_PRINT_LOCK = threading.Lock()
+
 # =========================
 # HELPERS
 # =========================
 
+def thread_sessions():
+    """Sessões (origem, destino) próprias de cada thread; requests.Session não é thread-safe."""
+    sessions = getattr(_THREAD_LOCAL, "sessions", None)
+    if sessions is None:
+        sessions = _THREAD_LOCAL.sessions = (make_session("orig", "PLONE_"), make_session("dest", "PLONE_"))
+    return sessions
+
 def auth(user, pwd):
     return (user, pwd) if user and pwd else None
 
@@ -128,34 +165,53 @@ def dest_exists(sess, api_url, a) -> bool:
         raise RuntimeError(f"DEST não é JSON: {api_url} ctype={ctype} body={r.text[:200]}")
     return True
 
-def dest_post(sess, parent_api_url, payload, a):
-    r = sess.post(
-        parent_api_url.rstrip("/"),
-        auth=a,
-        headers=JSON_HEADERS,
-        data=json.dumps(payload),
-        timeout=TIMEOUT,
-        verify=SSL_VERIFY,
-    )
+def dest_post(sess, parent_api_url, payload, a, blob=None):
+    # com blob, o payload traz BASE64 no campo do arquivo (payloads.json_body)
+    body = json.dumps(payload) if blob is None else json_body(payload, blob)
+    try:
+        r = sess.post(
+            parent_api_url.rstrip("/"),
+            auth=a,
+            headers=JSON_HEADERS,
+            data=body,
+            timeout=TIMEOUT,
+            verify=SSL_VERIFY,
+        )
+    finally:
+        close_body(body)
     r.raise_for_status()
     ctype = (r.headers.get("Content-Type") or "").lower()
     if "application/json" not in ctype:
         raise RuntimeError(f"POST não é JSON: {parent_api_url} ctype={ctype} body={r.text[:200]}")
     return r.json()
 
-def dest_create_image(sess, parent_api_url, image_id, title, blob, ctype, filename, a):
+def dest_create_image(sess, parent_api_url, image_id, title, blob, ctype, filename, a, info=None):
+    """Cria (ou completa) a imagem; com info, grava nele bytes/sha256 do que foi enviado."""
+    tus = use_tus(len(blob), UPLOAD_TUS_MIN_BYTES)
     payload = {
         "@type": "Image",
         "id": image_id,
         "title": title or image_id,
         "image": {
-            "data": base64.b64encode(blob).decode("ascii"),
+            "data": BASE64,
             "encoding": "base64",
             "filename": filename or (image_id + ".jpg"),
             "content-type": ctype or "image/jpeg",
         },
     }
-    dest_post(sess, parent_api_url, payload, a)
+    image_url = parent_api_url.rstrip("/") + "/" + image_id
+    size = blob_size(sess, image_url, "image", a, TIMEOUT, SSL_VERIFY)
+    if size or (size == 0 and not blob):
+        return  # já criada por um run anterior que parou antes do Document
+    if size is None:
+        image_url = dest_post(sess, parent_api_url, payload, a, blob=b"" if tus else blob)["@id"]
+    if tus or size == 0:
+        # criada vazia (agora ou num run que caiu antes do envio); os bytes vão crus
+        tus_fill(sess, image_url, blob_chunks(blob, UPLOAD_CHUNK_SIZE), len(blob),
+                 payload["image"]["filename"], payload["image"]["content-type"], a, TIMEOUT, SSL_VERIFY)
+    if info is not None:
+        info["bytes"] = len(blob)
+        info["sha256"] = hashlib.sha256(blob).hexdigest()
 
 def dest_create_document(sess, parent_api_url, doc_id, title, html, a):
     payload = {
@@ -170,47 +226,71 @@ def dest_create_document(sess, parent_api_url, doc_id, title, html, a):
 # MIGRATE
 # =========================
 
-def migrate_one(orig_sess, dest_sess, origem_url, destino_url, orig_auth, dest_auth):
+def fetch_image(sess, origem_url, a):
+    """
+    Imagem (2 linhas): url e filename. Só baixa se filename não for vazio;
+    devolve (blob, content-type, filename) ou None se não há imagem ou GET != 200.
+    """
+    img_lines = call_method_text(sess, origem_url, M_IMG, a).splitlines()
+    if len(img_lines) < 2:
+        return None
+    img_url = (img_lines[0] or "").strip()
+    img_filename = safe_filename((img_lines[1] or "").strip())
+    if not img_filename:
+        return None
+
+    rimg = sess.get(
+        img_url,
+        auth=a,
+        timeout=TIMEOUT,
+        allow_redirects=True,
+        verify=SSL_VERIFY,
+    )
+    if rimg.status_code != 200 or not rimg.content:
+        return None
+    return rimg.content, rimg.headers.get("Content-Type", "image/jpeg"), img_filename
+
+def fetch_origin(orig_sess, origem_url, a, pool=None) -> dict:
+    """
+    Os seis métodos da origem (e o download da imagem), independentes entre si.
+    Com pool, corpo/contato/endereço/localização/imagem vão para as threads do
+    pool (cada uma com a própria sessão) enquanto os metadados usam orig_sess:
+    a latência do município cai da soma para a da chamada mais lenta.
+    """
+    parts = {"corpo": M_BODY, "contatos": M_CONT, "endereco": M_END, "localizacao": M_LOC}
+    if pool is None:
+        out = {"meta": parse_meta(call_method_text(orig_sess, origem_url, M_META, a))}
+        out.update((k, call_method_text(orig_sess, origem_url, m, a)) for k, m in parts.items())
+        out["img"] = fetch_image(orig_sess, origem_url, a)
+        return out
+
+    futures = {k: pool.submit(lambda m=m: call_method_text(thread_sessions()[0], origem_url, m, a))
+               for k, m in parts.items()}
+    futures["img"] = pool.submit(lambda: fetch_image(thread_sessions()[0], origem_url, a))
+    out = {"meta": parse_meta(call_method_text(orig_sess, origem_url, M_META, a))}
+    out.update((k, f.result()) for k, f in futures.items())
+    return out
+
+def migrate_one(orig_sess, dest_sess, origem_url, destino_url, orig_auth, dest_auth, pool=None, info=None):
     destino_api = dest_api_url(destino_url)
 
     if dest_exists(dest_sess, destino_api, dest_auth):
         return "SKIP_EXISTS"
 
-    meta = parse_meta(call_method_text(orig_sess, origem_url, M_META, orig_auth))
-    titulo = meta.get("titulo", "") or destino_url.rstrip("/").split("/")[-1]
-
-    corpo = call_method_text(orig_sess, origem_url, M_BODY, orig_auth)
-    contatos = call_method_text(orig_sess, origem_url, M_CONT, orig_auth)
-    endereco = call_method_text(orig_sess, origem_url, M_END, orig_auth)
-    localizacao = call_method_text(orig_sess, origem_url, M_LOC, orig_auth)
+    origin = fetch_origin(orig_sess, origem_url, orig_auth, pool)
+    titulo = origin["meta"].get("titulo", "") or destino_url.rstrip("/").split("/")[-1]
 
     parent_api, doc_id = parent_and_id(destino_api)
 
-    # imagem (2 linhas): url e filename. Só sobe se filename não for vazio e se GET 200.
-    img_lines = call_method_text(orig_sess, origem_url, M_IMG, orig_auth).splitlines()
-
     image_rel = ""
-    if len(img_lines) >= 2:
-        img_url = (img_lines[0] or "").strip()
-        img_filename = safe_filename((img_lines[1] or "").strip())
-
-        if img_filename:
-            rimg = orig_sess.get(
-                img_url,
-                auth=orig_auth,
-                timeout=TIMEOUT,
-                allow_redirects=True,
-                verify=SSL_VERIFY,
-            )
-            if rimg.status_code == 200 and rimg.content:
-                blob = rimg.content
-                ctype = rimg.headers.get("Content-Type", "image/jpeg")
-
-                image_id = f"{doc_id}-imagem"
-                dest_create_image(dest_sess, parent_api, image_id, f"{titulo} - Imagem", blob, ctype, img_filename, dest_auth)
-                image_rel = f"{image_id}/@@images/image/large"
-
-    html = build_html(image_rel, corpo, contatos, endereco, localizacao)
+    if origin["img"]:
+        blob, ctype, img_filename = origin["img"]
+        image_id = f"{doc_id}-imagem"
+        dest_create_image(dest_sess, parent_api, image_id, f"{titulo} - Imagem", blob, ctype, img_filename, dest_auth,
+                          info)
+        image_rel = f"{image_id}/@@images/image/large"
+
+    html = build_html(image_rel, origin["corpo"], origin["contatos"], origin["endereco"], origin["localizacao"])
     dest_create_document(dest_sess, parent_api, doc_id, titulo, html, dest_auth)
 
     return "CREATED"
@@ -244,21 +324,77 @@ def read_pairs(path):
 # MAIN
 # =========================
 
-def main():
-    inp = sys.argv[1]
+def parse_args(argv=None):
+    ap = argparse.ArgumentParser(description="Migra páginas de municípios (origem -> destino)")
+    ap.add_argument("input", help="CSV ; (url_origem;url_destino) ou TXT com 'origem -> destino' por linha")
+    ap.add_argument("--workers", type=int, default=WORKERS,
+                    help="municípios migrados em paralelo (1 = um por vez, métodos da origem ainda em paralelo)")
+    ap.add_argument("--snapshot-export", default=SNAPSHOT_EXPORT, metavar="DIR",
+                    help="só lê a origem de cada município e grava o snapshot em DIR; nada vai ao destino")
+    ap.add_argument("--snapshot-import", default=SNAPSHOT_IMPORT, metavar="DIR",
+                    help="migra lendo a origem do snapshot em DIR, sem acessar o site antigo")
+    return ap.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    workers = max(1, args.workers)
+    use_snapshot("PLONE_", args.snapshot_export, args.snapshot_import)
 
     orig_auth = auth(ORIG_USER, ORIG_PASS)
     dest_auth = auth(DEST_USER, DEST_PASS)
 
-    orig_sess = requests.Session()
-    dest_sess = requests.Session()
-
-    pairs = read_pairs(inp)
-
-    for i, (uo, ud) in enumerate(pairs, start=1):
-        st = migrate_one(orig_sess, dest_sess, uo, ud, orig_auth, dest_auth)
-        print(f"[{i}/{len(pairs)}] {st} :: {ud}")
-        time.sleep(SLEEP_BETWEEN)
+    pairs = read_pairs(args.input)
+
+    ledger = open_ledger(LEDGER_FILE)
+    done = ledger.done(LEDGER_SCRIPT) if ledger else set()
+    # primeiro erro interrompe o run, como no modo sequencial: as tarefas ainda
+    # na fila desistem e o erro é relançado no fim
+    failed = threading.Event()
+
+    def export_one(i, uo, ud):
+        orig_sess, _dest_sess = thread_sessions()
+        fetch_origin(orig_sess, uo, orig_auth, pool=aux)
+        with _PRINT_LOCK:
+            print(f"[{i}/{len(pairs)}] EXPORT :: {uo}")
+
+    def run_one(i, uo, ud):
+        if failed.is_set():
+            return
+        if uo in done:
+            with _PRINT_LOCK:
+                print(f"[{i}/{len(pairs)}] SKIP_LEDGER :: {ud}")
+            return
+        orig_sess, dest_sess = thread_sessions()
+        info = {}
+        try:
+            st = migrate_one(orig_sess, dest_sess, uo, ud, orig_auth, dest_auth, pool=aux, info=info)
+        except Exception as e:
+            failed.set()
+            if ledger:
+                ledger.record(LEDGER_SCRIPT, uo, "error", destino=ud, tipo="Document", erro=str(e))
+            raise
+        if ledger:
+            status = "created" if st == "CREATED" else "exists"
+            ledger.record(LEDGER_SCRIPT, uo, status, destino=ud, dest_id=dest_api_url(ud), tipo="Document",
+                          bytes_=info.get("bytes"), sha256=info.get("sha256"))
+        with _PRINT_LOCK:
+            print(f"[{i}/{len(pairs)}] {st} :: {ud}")
+        if not THROTTLE:
+            time.sleep(SLEEP_BETWEEN)
+
+    try:
+        # 5 chamadas auxiliares por município em voo (corpo, contato, endereço, localização, imagem)
+        with ThreadPoolExecutor(max_workers=5 * workers, thread_name_prefix="origem-aux") as aux, \
+             ThreadPoolExecutor(max_workers=workers, thread_name_prefix="municipio") as pool:
+            fn = export_one if args.snapshot_export else run_one
+            futures = [pool.submit(fn, i, uo, ud) for i, (uo, ud) in enumerate(pairs, start=1)]
+            for f in futures:
+                f.result()
+    finally:
+        if ledger:
+            ledger.close()
+        print_connection_stats()
+        print_throttle_stats()
 
 if __name__ == "__main__":
     main()
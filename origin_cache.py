@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cache em disco das respostas GET da origem (portal antigo, congelado).
+
+Com o cache ligado, um re-run (ex.: depurando falhas no destino) lê metadados,
+corpos e assets do disco, sem nenhuma requisição à origem.
+
+- índice em SQLite (<dir>/index.sqlite): URL -> status, cabeçalhos, sha256, tamanho
+- corpos endereçados por conteúdo (<dir>/blobs/ab/abcd...): URLs com o mesmo
+  conteúdo dividem um arquivo
+- limite de tamanho (soma dos corpos) com descarte LRU pelo último uso
+- só GET/HEAD sem Range/If-*; guarda 200 e redirecionamentos. HEAD é
+  respondido a partir de um GET já guardado, nunca é gravado
+- o corpo guardado já vem decodificado (sem Content-Encoding)
+
+Plugado nas sessões "orig" de http_client (KeepAliveAdapter). Configuração
+por env, com o prefixo do script (vazio no migrar_noticias, "PLONE_" no
+bulk1/municipios):
+
+  <prefixo>ORIGIN_CACHE_DIR     diretório do cache (vazio = desligado)
+  <prefixo>ORIGIN_CACHE_MAX_MB  limite dos corpos em disco  (default 2048)
+"""
+
+import hashlib
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS responses (
+    url        TEXT PRIMARY KEY,
+    status     INTEGER NOT NULL,
+    headers    TEXT NOT NULL,
+    sha256     TEXT NOT NULL,
+    size       INTEGER NOT NULL,
+    last_used  REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS responses_lru ON responses (last_used);
+CREATE INDEX IF NOT EXISTS responses_sha256 ON responses (sha256);
+"""
+
+CACHEABLE_STATUS = (200, 301, 302, 303, 307, 308)
+BYPASS_HEADERS = ("Range", "If-None-Match", "If-Modified-Since", "If-Match", "If-Unmodified-Since")
+# não fazem sentido para um corpo relido do disco (o tamanho volta na leitura)
+DROP_HEADERS = frozenset({"content-encoding", "content-length", "transfer-encoding",
+                          "connection", "keep-alive", "set-cookie"})
+CHUNK_SIZE = 64 * 1024
+
+
+class OriginCache:
+    def __init__(self, directory: str, max_bytes: int):
+        self.dir = directory
+        self.max_bytes = int(max_bytes)
+        os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(directory, "tmp"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(os.path.join(directory, "index.sqlite"),
+                                     check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.executescript(SCHEMA)
+        self._total = self._conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM (SELECT MAX(size) AS size FROM responses GROUP BY sha256)"
+        ).fetchone()[0]
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.evicted = 0
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.dir, "blobs", sha256[:2], sha256)
+
+    def get(self, url: str):
+        """(status, cabeçalhos, caminho do corpo, tamanho) ou None."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT status, headers, sha256, size FROM responses WHERE url = ?", (url,)
+            ).fetchone()
+            if row is None or not os.path.exists(self.blob_path(row[2])):
+                self.misses += 1
+                return None
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE url = ?", (time.time(), url))
+            self.hits += 1
+        status, headers, sha256, size = row
+        return status, json.loads(headers), self.blob_path(sha256), size
+
+    def store(self, url: str, status: int, headers, chunks) -> tuple:
+        """
+        Grava o corpo (iterável de bytes) e indexa a URL.
+        Retorna (caminho do corpo, tamanho). Se a leitura falhar, nada é indexado.
+        """
+        tmp, sha256, size = spool_blob(os.path.join(self.dir, "tmp"), chunks)
+        kept = stored_headers(headers)
+
+        final = self.blob_path(sha256)
+        with self._lock:
+            if os.path.exists(final):
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(final), exist_ok=True)
+                os.replace(tmp, final)
+                self._total += size
+            old = self._conn.execute("SELECT sha256 FROM responses WHERE url = ?", (url,)).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses (url, status, headers, sha256, size, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (url, status, json.dumps(kept), sha256, size, time.time()),
+            )
+            if old and old[0] != sha256:
+                self._drop_blob_if_unused(old[0])
+            self.stored += 1
+            self._evict(keep=url)
+        return final, size
+
+    def _evict(self, keep: str) -> None:
+        # a entrada recém-gravada nunca sai (um corpo maior que o limite ainda é servido uma vez)
+        while self._total > self.max_bytes:
+            row = self._conn.execute(
+                "SELECT url, sha256 FROM responses WHERE url != ? ORDER BY last_used LIMIT 1", (keep,)
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM responses WHERE url = ?", (row[0],))
+            self.evicted += 1
+            self._drop_blob_if_unused(row[1])
+
+    def _drop_blob_if_unused(self, sha256: str) -> None:
+        if self._conn.execute("SELECT 1 FROM responses WHERE sha256 = ? LIMIT 1", (sha256,)).fetchone():
+            return
+        path = self.blob_path(sha256)
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            return
+        self._total -= size
+
+    def summary(self) -> str:
+        return (f"{self.hits} acertos, {self.misses} faltas, {self.stored} gravadas, "
+                f"{self.evicted} descartadas (LRU); {self._total / (1024 * 1024):.1f} MB em {self.dir}")
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+def spool_blob(tmp_dir: str, chunks) -> tuple:
+    """Grava os blocos num temporário de tmp_dir: (caminho, sha256, tamanho). Remove o arquivo se a leitura falhar."""
+    h = hashlib.sha256()
+    size = 0
+    fd, tmp = tempfile.mkstemp(dir=tmp_dir)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            for chunk in chunks:
+                h.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+    except BaseException:
+        os.remove(tmp)
+        raise
+    return tmp, h.hexdigest(), size
+
+
+def stored_headers(headers) -> dict:
+    return {k: v for k, v in headers.items() if k.lower() not in DROP_HEADERS}
+
+
+def cacheable_request(request) -> bool:
+    return request.method in ("GET", "HEAD") and not any(h in request.headers for h in BYPASS_HEADERS)
+
+
+_CACHES = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def shared_origin_cache(prefix: str = ""):
+    """Cache único por diretório (todas as sessões/threads da origem dividem); None se desligado."""
+    directory = (os.getenv(f"{prefix}ORIGIN_CACHE_DIR", "") or "").strip()
+    if not directory:
+        return None
+    with _CACHES_LOCK:
+        cache = _CACHES.get(directory)
+        if cache is None:
+            max_mb = float(os.getenv(f"{prefix}ORIGIN_CACHE_MAX_MB", "2048"))
+            cache = _CACHES[directory] = OriginCache(directory, int(max_mb * 1024 * 1024))
+        return cache
+
+
+def print_cache_stats() -> None:
+    with _CACHES_LOCK:
+        caches = list(_CACHES.values())
+    for cache in caches:
+        print(f"\nCache da origem: {cache.summary()}")
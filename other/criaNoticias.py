@@ -2,7 +2,11 @@
 import base64
 import json
 import os
-import requests
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from http_client import make_session
 
 PLONE_URL = "http://170.187.151.174:8080/mpf2026"      # site
 CONTAINER_PATH = "/noticias"                           # pasta onde criar
@@ -18,6 +22,10 @@ HEADERS = {
 
 AUTH = (USERNAME, PASSWORD)
 
+# Uma sessão só: reaproveita a conexão (keep-alive) entre o POST e o PATCH.
+# Mesmo pool/retry/keep-alive do destino do migrar_noticias_unificado (HTTP_DEST_*).
+SESSION = make_session("dest")
+
 
 def create_news_item(item):
     """
@@ -65,7 +73,7 @@ def create_news_item(item):
             "encoding": "base64",
         }
 
-    r = requests.post(API_BASE, headers=HEADERS, auth=AUTH, data=json.dumps(payload))
+    r = SESSION.post(API_BASE, headers=HEADERS, auth=AUTH, data=json.dumps(payload))
 
     if r.status_code not in (200, 201):
         raise Exception("Erro criando noticia: {} {}\n{}".format(r.status_code, r.reason, r.text))
@@ -109,7 +117,7 @@ if __name__ == "__main__":
       "modified": "2025-12-15T15:02:39-03:00",
     }
 
-    r = requests.patch(obj_url, headers=HEADERS, auth=AUTH, data=json.dumps(patch))
+    r = SESSION.patch(obj_url, headers=HEADERS, auth=AUTH, data=json.dumps(patch))
     data = r.content
 
     print(data)
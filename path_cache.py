@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+"""
+Cache de existência de caminhos (pastas) no destino.
+
+Guarda as URLs de pastas que já se sabe que existem (GET 200 ou criadas por nós),
+para que ensure_path_folders / ensure_dest_folder_chain não repitam um GET por
+segmento a cada item.
+
+- Só guarda resultados POSITIVOS.
+- invalidate(url) remove a URL e todos os descendentes (usar quando um POST
+  num container "conhecido" volta 404/409 inesperado).
+- Persistência opcional em JSON (lista de URLs), gravada em save().
+"""
+
+import json
+import os
+import threading
+
+
+class PathCache:
+    def __init__(self, path: str = ""):
+        self.path = (path or "").strip()
+        self._known = set()
+        self._lock = threading.Lock()
+        self._dirty = False
+        if self.path and os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                self._known = {self._norm(u) for u in json.load(f)}
+
+    @staticmethod
+    def _norm(url: str) -> str:
+        return (url or "").strip().rstrip("/")
+
+    def __contains__(self, url: str) -> bool:
+        with self._lock:
+            return self._norm(url) in self._known
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def add(self, url: str) -> None:
+        url = self._norm(url)
+        with self._lock:
+            if url not in self._known:
+                self._known.add(url)
+                self._dirty = True
+
+    def invalidate(self, url: str) -> None:
+        url = self._norm(url)
+        prefix = url + "/"
+        with self._lock:
+            gone = {u for u in self._known if u == url or u.startswith(prefix)}
+            if gone:
+                self._known -= gone
+                self._dirty = True
+
+    def save(self) -> None:
+        if not self.path or not self._dirty:
+            return
+        with self._lock:
+            data = sorted(self._known)
+            self._dirty = False
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=0)
+        os.replace(tmp, self.path)
@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+
+"""
+Corpo JSON com um campo base64 (Image/File do plone.restapi) sem materializar
+o base64 nem o JSON inteiro.
+
+    body = json_body({"@type": "File", "file": {"data": BASE64, ...}}, blob)
+    session.post(url, data=body, headers=HEADERS_JSON, ...)
+
+- o payload é serializado uma vez, com o marcador BASE64 no lugar do campo;
+  o texto antes e depois do marcador vira prefixo/sufixo do corpo
+- blob pode ser bytes, memoryview ou mmap: é fatiado por memoryview, sem cópia
+- corpos grandes (>= STREAM_MIN_BYTES) são lidos pelo requests/urllib3 como
+  arquivo, com Content-Length exato; uma thread codifica os próximos blocos
+  enquanto o anterior está sendo escrito no socket (o envio solta o GIL), então
+  CPU de base64 e I/O de rede se sobrepõem
+- corpos pequenos saem como bytes (uma única junção, sem thread)
+
+Cada chamada a json_body() gera um corpo novo: para reenviar (ex.: outro id
+depois de "already in use"), monte outro. Depois do envio (ou da falha), feche
+com close_body(): a thread de codificação para e o blob é solto.
+"""
+
+import base64
+import json
+import queue
+import threading
+
+RAW_CHUNK = 3 * 256 * 1024       # múltiplo de 3: os blocos base64 se concatenam sem padding no meio
+AHEAD = 2                        # blocos codificados à frente do envio
+STREAM_MIN_BYTES = 1024 * 1024
+IDLE_TIMEOUT = 300.0             # encoder desiste se o envio parar de consumir (conexão morta)
+
+_MARKER = "@@payloads-base64@@"
+
+
+class _Base64Marker:
+    def __repr__(self) -> str:
+        return "BASE64"
+
+
+BASE64 = _Base64Marker()
+
+
+def _split(payload: dict) -> tuple:
+    def default(obj):
+        if obj is BASE64:
+            return _MARKER
+        raise TypeError(f"{type(obj).__name__} não é serializável em JSON")
+
+    text = json.dumps(payload, default=default).encode("utf-8")
+    quoted = f'"{_MARKER}"'.encode("ascii")
+    if text.count(quoted) != 1:
+        raise ValueError("payload precisa ter exatamente um campo BASE64")
+    prefix, suffix = text.split(quoted)
+    return prefix + b'"', b'"' + suffix
+
+
+def b64_length(n: int) -> int:
+    return 4 * ((n + 2) // 3)
+
+
+class Base64JSONBody:
+    """Corpo JSON em stream: prefixo + base64(blob) codificado sob demanda + sufixo."""
+
+    def __init__(self, prefix: bytes, data, suffix: bytes):
+        self._view = memoryview(data).cast("B")
+        self.length = len(prefix) + b64_length(len(self._view)) + len(suffix)
+        self._prefix = prefix
+        self._suffix = suffix
+        self._queue = queue.Queue(maxsize=AHEAD)
+        self._closed = threading.Event()
+        self._encoder = None
+        self._buf = memoryview(prefix)
+        self._done = False
+
+    def __len__(self) -> int:
+        return self.length
+
+    def _encode(self) -> None:
+        view = self._view
+        try:
+            for off in range(0, len(view), RAW_CHUNK):
+                block = base64.b64encode(view[off:off + RAW_CHUNK])
+                if not self._put(block):
+                    return
+        finally:
+            view.release()  # solta o blob (um mmap pode ser fechado em seguida)
+        self._put(self._suffix)
+        self._put(None)
+
+    def _put(self, item) -> bool:
+        waited = 0.0
+        while not self._closed.is_set():
+            try:
+                self._queue.put(item, timeout=1.0)
+                return True
+            except queue.Full:
+                waited += 1.0
+                if waited >= IDLE_TIMEOUT:
+                    return False
+        return False
+
+    def read(self, size: int = -1) -> bytes:
+        if self._encoder is None:
+            self._encoder = threading.Thread(target=self._encode, name="base64", daemon=True)
+            self._encoder.start()
+        out = []
+        want = size if size is not None and size >= 0 else self.length
+        while want > 0:
+            if not len(self._buf):
+                if self._done:
+                    break
+                item = self._queue.get()
+                if item is None:
+                    self._done = True
+                    self._closed.set()
+                    break
+                self._buf = memoryview(item)
+            piece = self._buf[:want]
+            out.append(piece)
+            self._buf = self._buf[len(piece):]
+            want -= len(piece)
+        return b"".join(out)
+
+    def __iter__(self):
+        while True:
+            chunk = self.read(RAW_CHUNK)
+            if not chunk:
+                return
+            yield chunk
+
+    def close(self) -> None:
+        """Interrompe a codificação (envio falhou/abandonado) e solta o blob."""
+        self._closed.set()
+        if self._encoder is not None:
+            self._encoder.join()
+        self._view.release()
+
+
+def close_body(body) -> None:
+    """Fecha um corpo de json_body() (no-op para bytes). Chamar em finally após o envio."""
+    if isinstance(body, Base64JSONBody):
+        body.close()
+
+
+def json_body(payload: dict, data, stream: bool = True):
+    """
+    Corpo pronto para data= do requests: bytes (pequeno ou stream=False) ou
+    Base64JSONBody (grande). stream=False serve a quem não aceita um corpo
+    síncrono em stream (httpx.AsyncClient): chamar via asyncio.to_thread.
+    """
+    prefix, suffix = _split(payload)
+    if not stream or len(memoryview(data).cast("B")) < STREAM_MIN_BYTES:
+        return b"".join((prefix, base64.b64encode(data), suffix))
+    return Base64JSONBody(prefix, data, suffix)
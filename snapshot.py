@@ -0,0 +1,141 @@
+# -*- coding: utf-8 -*-
+
+"""
+Snapshot da origem: migração em duas fases, com origem e destino fora do ar
+em momentos diferentes.
+
+1) exportação (--snapshot-export DIR): o script só faz as leituras da origem
+   (lista/CSV, metadados, corpos, imagens, arquivos e assets embutidos) e
+   grava cada resposta GET no arquivo; nada vai ao destino
+2) importação (--snapshot-import DIR): as sessões da origem respondem a partir
+   do arquivo, sem rede; a escrita no destino roda sem esperar a origem
+
+Formato do diretório:
+  items.jsonl      uma linha por URL: status, cabeçalhos, sha256 e tamanho do corpo
+  blobs/ab/abcd..  corpos endereçados por conteúdo (URLs iguais dividem o arquivo)
+
+Na importação os corpos são lidos por mmap (o SO pagina sob demanda, sem cópia
+para o heap do processo). Exportação interrompida continua de onde parou: URLs
+já gravadas são servidas do arquivo. Range/If-* na exportação vão direto à
+origem sem gravar (respostas parciais/304 não servem para a importação); na
+importação a URL é servida inteira (200).
+"""
+
+import json
+import mmap
+import os
+import threading
+
+from origin_cache import BYPASS_HEADERS, spool_blob, stored_headers
+
+MODES = ("export", "import")
+
+
+class Snapshot:
+    def __init__(self, directory: str, mode: str):
+        if mode not in MODES:
+            raise ValueError(f"modo de snapshot inválido: {mode}")
+        self.dir = directory
+        self.mode = mode
+        self.importing = mode == "import"
+        self._lock = threading.Lock()
+        self._index = {}
+        self.hits = 0
+        self.recorded = 0
+
+        items = os.path.join(directory, "items.jsonl")
+        if self.importing and not os.path.exists(items):
+            raise SystemExit(f"Snapshot sem items.jsonl: {directory}")
+        if os.path.exists(items):
+            with open(items, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue  # última linha truncada por uma exportação interrompida
+                    self._index[entry["url"]] = entry
+
+        self._out = None
+        if not self.importing:
+            os.makedirs(os.path.join(directory, "blobs"), exist_ok=True)
+            os.makedirs(os.path.join(directory, "tmp"), exist_ok=True)
+            self._out = open(items, "a", encoding="utf-8")
+
+    def blob_path(self, sha256: str) -> str:
+        return os.path.join(self.dir, "blobs", sha256[:2], sha256)
+
+    def get(self, url: str):
+        with self._lock:
+            entry = self._index.get(url)
+            if entry is not None:
+                self.hits += 1
+        return entry
+
+    def open_body(self, entry: dict):
+        """Corpo da entrada como mmap somente leitura (b"" se vazio)."""
+        if not entry["size"]:
+            return b""
+        with open(self.blob_path(entry["sha256"]), "rb") as f:
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def record(self, url: str, status: int, headers, chunks) -> dict:
+        tmp, sha256, size = spool_blob(os.path.join(self.dir, "tmp"), chunks)
+        entry = {"url": url, "status": status, "headers": stored_headers(headers), "sha256": sha256, "size": size}
+        final = self.blob_path(sha256)
+        with self._lock:
+            if os.path.exists(final):
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(final), exist_ok=True)
+                os.replace(tmp, final)
+            self._out.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            self._out.flush()
+            self._index[url] = entry
+            self.recorded += 1
+        return entry
+
+    def summary(self) -> str:
+        verb = "importação" if self.importing else "exportação"
+        return (f"{verb} em {self.dir}: {len(self._index)} URLs no arquivo, "
+                f"{self.hits} servidas dele, {self.recorded} gravadas agora")
+
+    def close(self) -> None:
+        with self._lock:
+            if self._out is not None:
+                self._out.close()
+                self._out = None
+
+
+def recordable_request(request) -> bool:
+    return request.method == "GET" and not any(h in request.headers for h in BYPASS_HEADERS)
+
+
+_SNAPSHOTS = {}
+_SNAPSHOTS_LOCK = threading.Lock()
+
+
+def use_snapshot(prefix: str, export_dir: str = "", import_dir: str = ""):
+    """
+    Liga o snapshot para as sessões "orig" do prefixo criadas daqui em diante.
+    Chamado no começo do main(), a partir de --snapshot-export/--snapshot-import.
+    """
+    if export_dir and import_dir:
+        raise SystemExit("--snapshot-export e --snapshot-import são exclusivos")
+    if not (export_dir or import_dir):
+        return None
+    snap = Snapshot(export_dir or import_dir, "export" if export_dir else "import")
+    with _SNAPSHOTS_LOCK:
+        _SNAPSHOTS[prefix] = snap
+    return snap
+
+
+def active_snapshot(prefix: str = ""):
+    with _SNAPSHOTS_LOCK:
+        return _SNAPSHOTS.get(prefix)
+
+
+def print_snapshot_stats() -> None:
+    with _SNAPSHOTS_LOCK:
+        snaps = list(_SNAPSHOTS.values())
+    for snap in snaps:
+        print(f"\nSnapshot da origem ({snap.summary()})")
@@ -0,0 +1,151 @@
+# -*- coding: utf-8 -*-
+
+"""
+Armazenamento do estado da migração (chave = URL de origem, valor = "ok" ou "erro: ...").
+
+Backends:
+- "json"    : dict inteiro regravado a cada item (comportamento original, O(n) por gravação)
+- "journal" : JSONL append-only, uma linha {"k": ..., "v": ...} por gravação (O(1));
+              compactado periodicamente (uma linha por chave viva)
+
+Na carga do journal a última linha de cada chave vale; uma linha final truncada
+(queda no meio da escrita) é ignorada.
+"""
+
+import json
+import os
+import threading
+
+
+class JsonStateStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        self._data = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def __len__(self):
+        return len(self._data)
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = value
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, ensure_ascii=False, indent=2)
+            os.replace(tmp, self.path)
+
+    def close(self) -> None:
+        pass
+
+
+class JournalStateStore:
+    def __init__(self, path: str, compact_every: int = 5000, fsync: bool = False):
+        self.path = path
+        self.compact_every = max(1, int(compact_every))
+        self.fsync = fsync
+        self._lock = threading.Lock()
+        self._data = {}
+        self._lines = 0
+        self._since_compact = 0
+        self._load()
+        if self._lines > 2 * max(1, len(self._data)):
+            self._compact()
+        self._fh = open(self.path, "a", encoding="utf-8")
+
+    def _load(self) -> None:
+        if not os.path.exists(self.path):
+            return
+        complete = 0  # fim da última linha terminada em "\n"
+        with open(self.path, "rb") as f:
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # última linha cortada por uma queda no meio da escrita
+                complete += len(raw)
+                line = raw.strip()
+                if not line:
+                    continue
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    continue
+                self._data[rec["k"]] = rec["v"]
+                self._lines += 1
+        if complete < os.path.getsize(self.path):
+            # corta o lixo: senão a próxima gravação (modo "a") emenda nele e se perde
+            with open(self.path, "r+b") as f:
+                f.truncate(complete)
+
+    def _compact(self) -> None:
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            for k, v in self._data.items():
+                f.write(json.dumps({"k": k, "v": v}, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+        self._lines = len(self._data)
+        self._since_compact = 0
+
+    def get(self, key, default=None):
+        return self._data.get(key, default)
+
+    def items(self):
+        with self._lock:
+            return list(self._data.items())
+
+    def __len__(self):
+        return len(self._data)
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            self._data[key] = value
+            self._fh.write(json.dumps({"k": key, "v": value}, ensure_ascii=False) + "\n")
+            self._fh.flush()
+            if self.fsync:
+                os.fsync(self._fh.fileno())
+            self._lines += 1
+            self._since_compact += 1
+            if self._since_compact >= self.compact_every:
+                self._fh.close()
+                self._compact()
+                self._fh = open(self.path, "a", encoding="utf-8")
+
+    def import_json(self, path: str) -> int:
+        """
+        Importa um import_state*.json antigo. "ok" nunca é sobrescrito por erro.
+        Retorna quantas chaves foram gravadas.
+        """
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        n = 0
+        for k, v in data.items():
+            if self.get(k) == "ok" or self.get(k) == v:
+                continue
+            self.set(k, v)
+            n += 1
+        return n
+
+    def close(self) -> None:
+        with self._lock:
+            self._fh.close()
+            if self._lines > len(self._data):
+                self._compact()
+
+
+def open_state(path: str, backend: str = "json", **kw):
+    backend = (backend or "json").strip().lower()
+    if backend == "json":
+        return JsonStateStore(path)
+    if backend == "journal":
+        return JournalStateStore(path, **kw)
+    raise ValueError(f"STATE_BACKEND desconhecido: {backend}")
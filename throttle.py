@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+
+"""
+Limitador adaptativo de requisições ao destino (substitui o sleep fixo SLEEP_BETWEEN).
+
+Token bucket cuja taxa (req/s) segue AIMD:
+- início rápido ("slow start"): até o primeiro corte, cada resposta saudável
+  soma THROTTLE_STEP à taxa, que assim cresce proporcionalmente ao fluxo
+- depois, aumento aditivo de ~THROTTLE_STEP req/s por segundo em regime
+- corte multiplicativo em 429/503/504, timeout/erro de conexão ou latência
+  acima de 2x o alvo (no máximo um corte por janela, para N threads que
+  falham juntas não derrubarem a taxa N vezes). A latência de requisições com
+  corpo grande (base64 no JSON, blocos TUS) mede a transferência, não a carga
+  do servidor: para elas só status/erro contam
+- Retry-After (429/503) pausa o bucket inteiro pelo tempo pedido
+
+Configuração por env (prefixo do script, como em http_client):
+
+  <prefixo>THROTTLE             "off" (default: SLEEP_BETWEEN fixo) ou "aimd"
+  <prefixo>THROTTLE_RATE        taxa inicial, req/s       (default 20)
+  <prefixo>THROTTLE_STEP        aumento aditivo, req/s/s  (default 2)
+  <prefixo>THROTTLE_MIN_RATE    piso                      (default 0.5)
+  <prefixo>THROTTLE_MAX_RATE    teto                      (default 100)
+  <prefixo>THROTTLE_TARGET_MS   latência alvo do destino  (default 1500)
+"""
+
+import os
+import threading
+import time
+
+BACKOFF_STATUS = (429, 503, 504)
+# acima disto o corpo enviado domina o tempo da requisição; a latência não é sinal de carga
+LATENCY_MAX_BODY = 64 * 1024
+
+
+class AdaptiveThrottle:
+    def __init__(self, rate: float = 10.0, min_rate: float = 0.5, max_rate: float = 100.0,
+                 target_latency: float = 1.5, increase: float = 1.0, decrease: float = 0.5,
+                 cooldown: float = 1.0):
+        self.rate = float(rate)
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        self.target_latency = float(target_latency)
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.cooldown = float(cooldown)
+        self._lock = threading.Lock()
+        self._tokens = 1.0
+        self._last_fill = time.monotonic()
+        self._last_cut = 0.0
+        self._paused_until = 0.0
+        self._slow_start = True
+        self.requests = 0
+        self.cuts = 0
+        self.peak_rate = self.rate
+
+    def acquire(self) -> None:
+        """Bloqueia até haver uma ficha no bucket."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                else:
+                    # capacidade de 1s de rajada
+                    self._tokens = min(max(1.0, self.rate), self._tokens + (now - self._last_fill) * self.rate)
+                    self._last_fill = now
+                    if self._tokens >= 1.0:
+                        self._tokens -= 1.0
+                        self.requests += 1
+                        return
+                    wait = (1.0 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def observe(self, latency: float, status: int = 0, failed: bool = False, retry_after: float = 0.0,
+                bytes_sent: int = 0) -> None:
+        """Ajusta a taxa a partir do resultado de uma requisição."""
+        if bytes_sent > LATENCY_MAX_BODY:
+            latency = 0.0  # upload grande: decide só por status/erro
+        with self._lock:
+            now = time.monotonic()
+            if retry_after > 0:
+                self._paused_until = max(self._paused_until, now + retry_after)
+            if failed or status in BACKOFF_STATUS or latency > 2 * self.target_latency:
+                if now - self._last_cut >= self.cooldown:
+                    self.rate = max(self.min_rate, self.rate * self.decrease)
+                    self._tokens = min(self._tokens, 1.0)
+                    self._last_cut = now
+                    self._slow_start = False
+                    self.cuts += 1
+            elif latency <= self.target_latency:
+                # slow start: +increase por resposta; depois +increase a cada ~rate respostas
+                step = self.increase if self._slow_start else self.increase / max(self.rate, 1.0)
+                self.rate = min(self.max_rate, self.rate + step)
+                self.peak_rate = max(self.peak_rate, self.rate)
+
+    def summary(self) -> str:
+        return (f"taxa final {self.rate:.1f} req/s (pico {self.peak_rate:.1f}), "
+                f"{self.requests} requisições, {self.cuts} cortes")
+
+
+_THROTTLES = {}
+_THROTTLES_LOCK = threading.Lock()
+
+
+def throttle_enabled(prefix: str = "") -> bool:
+    # desligado por padrão: contra um destino saudável o bucket só freia os workers
+    return os.getenv(f"{prefix}THROTTLE", "off").strip().lower() not in ("off", "0", "false", "no", "")
+
+
+def shared_throttle(prefix: str = ""):
+    """Throttle único por prefixo (todas as sessões/threads do script dividem o bucket); None se desligado."""
+    if not throttle_enabled(prefix):
+        return None
+    with _THROTTLES_LOCK:
+        t = _THROTTLES.get(prefix)
+        if t is None:
+            t = _THROTTLES[prefix] = AdaptiveThrottle(
+                rate=float(os.getenv(f"{prefix}THROTTLE_RATE", "20")),
+                min_rate=float(os.getenv(f"{prefix}THROTTLE_MIN_RATE", "0.5")),
+                max_rate=float(os.getenv(f"{prefix}THROTTLE_MAX_RATE", "100")),
+                target_latency=float(os.getenv(f"{prefix}THROTTLE_TARGET_MS", "1500")) / 1000.0,
+                increase=float(os.getenv(f"{prefix}THROTTLE_STEP", "2")),
+            )
+        return t
+
+
+def retry_after_seconds(value) -> float:
+    """Retry-After em segundos (a forma com data HTTP é ignorada)."""
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def print_throttle_stats() -> None:
+    with _THROTTLES_LOCK:
+        items = list(_THROTTLES.items())
+    for prefix, t in items:
+        print(f"\nThrottle do destino ({prefix or 'default'}): {t.summary()}")
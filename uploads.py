@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+
+"""
+Upload em partes (TUS 1.0.0) para o plone.restapi.
+
+Endpoints usados:
+- <container>/@tus-upload  -> cria um objeto novo ao final do upload
+- <objeto>/@tus-replace    -> substitui o arquivo de um objeto existente
+
+Fluxo: POST (Upload-Length + Upload-Metadata) devolve Location; em seguida um
+PATCH por bloco com Upload-Offset. Só um bloco fica em memória por vez.
+
+Retomada: se a conexão cai (ou o destino responde 409/502/503/504) no meio de
+um PATCH, um HEAD no Location diz até onde o servidor gravou (Upload-Offset) e
+o envio continua dali, sem recomeçar o arquivo.
+
+Estratégia por tamanho (os três migradores): abaixo de <prefixo>UPLOAD_TUS_MIN_MB
+o blob vai em base64 no JSON de criação; a partir dele o objeto é criado vazio
+(mesmo id/título) e o conteúdo vai em bytes crus por <objeto>/@tus-replace.
+Se o processo cai entre as duas etapas, o objeto fica vazio (blob_size() == 0):
+no run seguinte os migradores o preenchem em vez de tratá-lo como existente.
+"""
+
+import base64
+import os
+import time
+
+import requests
+
+TUS_VERSION = "1.0.0"
+TUS_CONTENT_TYPE = "application/offset+octet-stream"
+RESUMABLE_STATUS = (409, 502, 503, 504)
+RESUME_ATTEMPTS = 5
+RESUME_BACKOFF = 0.5
+
+
+def tus_metadata(filename: str, content_type: str) -> str:
+    def b64(v: str) -> str:
+        return base64.b64encode((v or "").encode("utf-8")).decode("ascii")
+    return f"filename {b64(filename)},content-type {b64(content_type)}"
+
+
+def tus_create(sess, endpoint_url: str, length: int, filename: str, content_type: str,
+               auth, timeout: int, verify) -> str:
+    """POST no endpoint TUS. Retorna a URL (Location) do upload."""
+    r = sess.post(
+        endpoint_url,
+        auth=auth,
+        headers={
+            "Accept": "application/json",
+            "Tus-Resumable": TUS_VERSION,
+            "Upload-Length": str(length),
+            "Upload-Metadata": tus_metadata(filename, content_type),
+        },
+        timeout=timeout,
+        verify=verify,
+    )
+    if r.status_code != 201 or not r.headers.get("Location"):
+        raise RuntimeError(f"TUS POST {endpoint_url} -> {r.status_code} {r.text}")
+    return r.headers["Location"]
+
+
+def tus_offset(sess, location: str, auth, timeout: int, verify) -> int:
+    """HEAD no upload: quantos bytes o servidor já gravou."""
+    r = sess.head(location, auth=auth, headers={"Tus-Resumable": TUS_VERSION}, timeout=timeout, verify=verify)
+    offset = r.headers.get("Upload-Offset") or ""
+    if r.status_code not in (200, 204) or not offset.isdigit():
+        raise RuntimeError(f"TUS HEAD {location} -> {r.status_code} {r.text}")
+    return int(offset)
+
+
+def tus_send(sess, location: str, chunks, offset: int, auth, timeout: int, verify,
+             resume_attempts: int = RESUME_ATTEMPTS):
+    """
+    Envia os blocos a partir de offset. Retorna (offset final, última resposta).
+    Falha transitória num PATCH: HEAD para saber o offset do servidor e reenvia
+    só o resto do bloco (até resume_attempts falhas seguidas, sem PATCH aceito entre elas).
+    """
+    last = None
+    failures = 0
+    for chunk in chunks:
+        if not chunk:
+            continue
+        start = offset
+        end = start + len(chunk)
+        while offset < end:
+            part = chunk[offset - start:] if offset > start else chunk
+            try:
+                last = sess.patch(
+                    location,
+                    auth=auth,
+                    headers={
+                        "Accept": "application/json",
+                        "Tus-Resumable": TUS_VERSION,
+                        "Upload-Offset": str(offset),
+                        "Content-Type": TUS_CONTENT_TYPE,
+                    },
+                    data=part,
+                    timeout=timeout,
+                    verify=verify,
+                )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                last, error = None, str(e)
+            else:
+                if last.status_code in (200, 204):
+                    offset = int(last.headers.get("Upload-Offset") or offset + len(part))
+                    failures = 0
+                    continue
+                error = f"{last.status_code} {last.text}"
+                if last.status_code not in RESUMABLE_STATUS:
+                    raise RuntimeError(f"TUS PATCH {location} offset={offset} -> {error}")
+
+            failures += 1
+            if failures > resume_attempts:
+                raise RuntimeError(f"TUS PATCH {location} offset={offset}: desistindo após {failures - 1} retomadas seguidas ({error})")
+            time.sleep(min(RESUME_BACKOFF * 2 ** (failures - 1), 30.0))
+            try:
+                offset = tus_offset(sess, location, auth, timeout, verify)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                continue  # tenta o mesmo offset de novo; conta como outra falha se cair
+            if not start <= offset <= end:
+                raise RuntimeError(f"TUS {location}: servidor em {offset}, fora do bloco {start}-{end}")
+            print(f"    [tus] retomando {location} em {offset} bytes")
+    return offset, last
+
+
+def tus_upload(sess, endpoint_url: str, chunks, length: int, filename: str, content_type: str,
+               auth, timeout: int, verify) -> str:
+    """Upload completo. Retorna o Location da última resposta (objeto criado), se houver."""
+    location = tus_create(sess, endpoint_url, length, filename, content_type, auth, timeout, verify)
+    offset, last = tus_send(sess, location, chunks, 0, auth, timeout, verify)
+    if offset != length:
+        raise RuntimeError(f"TUS {location}: enviados {offset} de {length} bytes")
+    return (last.headers.get("Location") if last is not None else "") or ""
+
+
+def use_tus(length, min_bytes: int) -> bool:
+    """Blob de length bytes vai por TUS? (min_bytes <= 0 desliga; tamanho desconhecido = não)."""
+    return min_bytes > 0 and length is not None and length >= min_bytes
+
+
+def tus_min_bytes(prefix: str = "") -> int:
+    """<prefixo>UPLOAD_TUS_MIN_MB em bytes (default 10 MB; 0 = sempre base64 no JSON)."""
+    return int(float(os.getenv(f"{prefix}UPLOAD_TUS_MIN_MB", "10")) * 1024 * 1024)
+
+
+def blob_chunks(blob, chunk_size: int):
+    """Blocos de um blob em memória (bytes ou mmap), um por vez."""
+    view = memoryview(blob).cast("B")
+    for off in range(0, len(view), chunk_size):
+        yield bytes(view[off:off + chunk_size])
+
+
+BLOB_TYPES = {"file": "File", "image": "Image"}
+
+
+def blob_size(sess, obj_url: str, field: str, auth, timeout: int, verify):
+    """
+    Tamanho do campo de arquivo (file/image) de um objeto no destino; None se
+    não há ali um objeto do tipo do campo (File/Image). 0 = criado vazio e nunca
+    preenchido (o processo caiu entre a criação e o tus_fill): quem chama
+    preenche de novo em vez de dar "existe".
+    """
+    r = sess.get(obj_url.rstrip("/"), auth=auth, headers={"Accept": "application/json"},
+                 timeout=timeout, verify=verify)
+    if r.status_code != 200 or "application/json" not in (r.headers.get("Content-Type") or "").lower():
+        return None
+    data = r.json()
+    if data.get("@type") != BLOB_TYPES[field]:
+        return None
+    return int((data.get(field) or {}).get("size") or 0)
+
+
+def tus_fill(sess, obj_url: str, chunks, length: int, filename: str, content_type: str,
+             auth, timeout: int, verify) -> None:
+    """
+    Envia o conteúdo de um objeto recém-criado vazio por <objeto>/@tus-replace.
+    Se o upload falhar de vez, remove o objeto para que um novo run não o ache "existente".
+    """
+    obj_url = obj_url.rstrip("/")
+    try:
+        tus_upload(sess, obj_url + "/@tus-replace", chunks, length, filename, content_type,
+                   auth, timeout, verify)
+    except Exception:
+        sess.delete(obj_url, auth=auth, headers={"Accept": "application/json"}, timeout=timeout, verify=verify)
+        raise